@@ -1,12 +1,25 @@
 import pygame
+import os
 import sys
 import random
 import json
 import math
+import logging
 import datetime
+import numpy as np
+from array import array
+from collections import deque
+from itertools import chain, islice
 from pygame.locals import *
 from pygame import gfxdraw
 
+# Debug output is off unless NEON_SNAKE_DEBUG=1, so the game loop does no I/O
+logging.basicConfig(
+    level=logging.DEBUG if os.getenv("NEON_SNAKE_DEBUG", "0") == "1" else logging.WARNING,
+    format="[%(levelname)s] %(message)s"
+)
+log = logging.getLogger("neon_snake")
+
 pygame.init()
 pygame.mixer.init()
 
@@ -16,7 +29,16 @@ pygame.mixer.init()
 WIDTH = 1280
 HEIGHT = 720
 CELL_SIZE = 24
+# The playfield is the whole cells that fit on screen; the snake wraps around it
+GRID_COLS = WIDTH // CELL_SIZE
+GRID_ROWS = HEIGHT // CELL_SIZE
 FPS = 60
+# The snake is simulated in fixed steps of 1/speed seconds, as many per frame
+# as the elapsed time calls for. A stalled frame counts as at most
+# MAX_FRAME_TIME, and at most MAX_SIM_STEPS run per frame, so a slow
+# machine drops time instead of falling further and further behind.
+MAX_FRAME_TIME = 0.25
+MAX_SIM_STEPS = 5
 lore_timer = 0
 lore_alpha = 0
 lore_rain_particles = []
@@ -68,7 +90,7 @@ try:
     powerup_sound = pygame.mixer.Sound(get_resource_path("resources/power_up.mp3"))
 
 except Exception as e:
-    print(f"Missing assets: {e}")
+    log.warning("Missing assets: %s", e)
     font = pygame.font.SysFont("arial", 24)
     title_font = pygame.font.SysFont("impact", 72)
     eat_sound = pygame.mixer.Sound(None)
@@ -121,51 +143,153 @@ for _ in range(100):
     })
 
 # ----------------------------------------------------------------------------------
-# PARTICLE CLASS
+# PARTICLE SYSTEM
 # ----------------------------------------------------------------------------------
-class Particle:
-    def __init__(self, position, color, velocity, lifespan, size=4, glow=True):
-        self.position = list(position)
-        self.color = color
-        self.velocity = list(velocity)
-        self.lifespan = lifespan
-        self.age = 0
-        self.size = size
-        self.glow = glow
+PARTICLE_CAPACITY = 512
+PARTICLE_DAMPING = 0.98
+# Fade steps pre-rendered per sprite; particles pick the nearest one
+PARTICLE_ALPHA_LEVELS = 16
+
+class ParticleSystem:
+    """ All particles in fixed-size NumPy arrays, one per attribute.
+
+    Dead slots go on a free list and are reused by the next emit, so
+    nothing is allocated per particle. A frame's update is one vectorized
+    step over the arrays, and drawing is a single blits() call of glow
+    sprites rendered once per color, size and fade level.
+    """
+    def __init__(self, capacity=PARTICLE_CAPACITY):
+        self.position = np.zeros((capacity, 2), dtype=np.float32)
+        self.velocity = np.zeros((capacity, 2), dtype=np.float32)
+        self.age = np.zeros(capacity, dtype=np.int32)
+        self.lifespan = np.ones(capacity, dtype=np.int32)
+        self.size = np.zeros(capacity, dtype=np.int32)
+        self.color = np.zeros(capacity, dtype=np.int32)
+        self.glow = np.zeros(capacity, dtype=bool)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.free = list(range(capacity - 1, -1, -1))
+        self.colors = []
+        self.color_index = {}
+        self.sprites = {}
+
+    def clear(self):
+        self.alive[:] = False
+        self.free = list(range(len(self.alive) - 1, -1, -1))
+
+    def emit(self, position, count, spread, lifespan, size=4, glow=True, colors=PARTICLE_COLORS):
+        """ count particles at position, each with a random color from colors,
+        velocity within +/-spread and lifespan within the (min, max) frames.
+        Particles that do not fit in the free slots are dropped. """
+        count = min(count, len(self.free))
+        if count == 0:
+            return
+        slots = self.free[-count:]
+        del self.free[-count:]
+        for color in colors:
+            if color not in self.color_index:
+                self.color_index[color] = len(self.colors)
+                self.colors.append(color)
+        palette = [self.color_index[color] for color in colors]
+        self.position[slots] = position
+        self.velocity[slots] = np.random.uniform(-spread, spread, (count, 2))
+        self.age[slots] = 0
+        self.lifespan[slots] = np.random.randint(lifespan[0], lifespan[1] + 1, count)
+        self.size[slots] = size
+        self.color[slots] = np.random.choice(palette, count)
+        self.glow[slots] = glow
+        self.alive[slots] = True
 
     def update(self):
-        self.position[0] += self.velocity[0]
-        self.position[1] += self.velocity[1]
-        self.velocity[0] *= 0.98
-        self.velocity[1] *= 0.98
-        self.age += 1
+        # Dead slots are integrated too; it is cheaper than masking them out
+        self.position += self.velocity
+        self.velocity *= PARTICLE_DAMPING
+        self.age += self.alive
+        expired = self.alive & (self.age >= self.lifespan)
+        if expired.any():
+            self.alive &= ~expired
+            self.free.extend(np.flatnonzero(expired).tolist())
+
+    def sprite(self, color, size, glow, level):
+        key = (color, size, glow, level)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            # The same rings the old per-particle gfxdraw calls drew, at this fade level
+            alpha = 255 * level / (PARTICLE_ALPHA_LEVELS - 1)
+            radius = size + 6 if glow else size
+            rings = [(size + i * 2, int(alpha // (i + 1))) for i in range(3, 0, -1)] if glow else []
+            rings.append((size, int(alpha)))
+            sprite = pygame.Surface((2 * radius + 1, 2 * radius + 1), pygame.SRCALPHA)
+            for ring_radius, ring_alpha in rings:
+                ring = pygame.Surface(sprite.get_size(), pygame.SRCALPHA)
+                pygame.draw.circle(ring, (*self.colors[color], ring_alpha), (radius, radius), ring_radius)
+                sprite.blit(ring, (0, 0))
+            self.sprites[key] = sprite
+        return sprite
 
     def draw(self, surface):
-        alpha = 255 * (1 - self.age / self.lifespan)
-        if alpha < 0:
-            alpha = 0
+        slots = np.flatnonzero(self.alive)
+        if slots.size == 0:
+            return
+        fade = 1 - self.age[slots] / self.lifespan[slots]
+        levels = np.rint(fade * (PARTICLE_ALPHA_LEVELS - 1)).astype(np.int32)
+        xs, ys = self.position[slots].astype(np.int32).T
+        blits = []
+        for x, y, color, size, glow, level in zip(
+            xs.tolist(), ys.tolist(), self.color[slots].tolist(),
+            self.size[slots].tolist(), self.glow[slots].tolist(), levels.tolist()
+        ):
+            if level > 0:
+                sprite = self.sprite(color, size, glow, level)
+                radius = sprite.get_width() // 2
+                blits.append((sprite, (x - radius, y - radius)))
+        surface.blits(blits, doreturn=False)
 
-        if self.glow:
-            for i in range(3, 0, -1):
-                radius = self.size + i * 2
-                gfxdraw.filled_circle(
-                    surface,
-                    int(self.position[0]),
-                    int(self.position[1]),
-                    radius,
-                    (*self.color, int(alpha // (i + 1)))
-                )
+# ----------------------------------------------------------------------------------
+# FREE-CELL INDEX
+# ----------------------------------------------------------------------------------
+def cell_index(position):
+    return (position[1] // CELL_SIZE) * GRID_COLS + position[0] // CELL_SIZE
 
-        gfxdraw.filled_circle(
-            surface,
-            int(self.position[0]),
-            int(self.position[1]),
-            self.size,
-            (*self.color, int(alpha))
-        )
+def cell_position(index):
+    return ((index % GRID_COLS) * CELL_SIZE, (index // GRID_COLS) * CELL_SIZE)
+
+class FreeCells:
+    """ The cells not covered by the snake, with O(1) add, remove and random pick.
+
+    cells[:size] are the free cell indices in no particular order and slot
+    maps each cell to where it sits in cells, so removing one swaps it with
+    the last free entry and adding one swaps it back in.
+    """
+    def __init__(self, count):
+        self.cells = array('H', range(count))
+        self.slot = array('H', range(count))
+        self.size = count
+
+    def __contains__(self, index):
+        return self.slot[index] < self.size
+
+    def _swap(self, a, b):
+        cell_a, cell_b = self.cells[a], self.cells[b]
+        self.cells[a], self.cells[b] = cell_b, cell_a
+        self.slot[cell_a], self.slot[cell_b] = b, a
+
+    def remove(self, index):
+        if index in self:
+            self.size -= 1
+            self._swap(self.slot[index], self.size)
+
+    def add(self, index):
+        if index not in self:
+            self._swap(self.slot[index], self.size)
+            self.size += 1
+
+    def choice(self):
+        if self.size == 0:
+            return None
+        return self.cells[random.randrange(self.size)]
 
 # ----------------------------------------------------------------------------------
-# SNAKE (with sub-step movement)
+# SNAKE (cell-stepping movement)
 # ----------------------------------------------------------------------------------
 class Snake:
     def __init__(self):
@@ -174,7 +298,16 @@ class Snake:
     def reset(self):
         start_x = (WIDTH // CELL_SIZE // 2) * CELL_SIZE
         start_y = (HEIGHT // CELL_SIZE // 2) * CELL_SIZE
-        self.body = [(start_x, start_y)]
+        # Head first. The occupancy grid counts body segments per cell and,
+        # with the free-cell index, is kept in step with every head push and
+        # tail pop, so collisions and spawning never rescan the body.
+        self.body = deque()
+        self.occupancy = array('H', bytes(2 * GRID_COLS * GRID_ROWS))
+        self.overlaps = 0  # cells holding more than one segment
+        self.free = FreeCells(GRID_COLS * GRID_ROWS)
+        self.push_head((start_x, start_y))
+        # Cell the tail left on the last step, drawn from when interpolating
+        self.prev_tail = None
         
         self.direction = (0, 0)
         self.next_direction = (0, 0)
@@ -185,10 +318,31 @@ class Snake:
         self.power_up = None
         self.power_up_timer = 0
         self.shield = False
-        self.trail_particles = []
+
+    def push_head(self, position):
+        self.body.appendleft(position)
+        i = cell_index(position)
+        self.occupancy[i] += 1
+        if self.occupancy[i] == 1:
+            self.free.remove(i)
+        elif self.occupancy[i] == 2:
+            self.overlaps += 1
+
+    def pop_tail(self):
+        position = self.body.pop()
+        i = cell_index(position)
+        self.occupancy[i] -= 1
+        if self.occupancy[i] == 0:
+            self.free.add(i)
+        elif self.occupancy[i] == 1:
+            self.overlaps -= 1
+        return position
+
+    def is_occupied(self, position):
+        return self.occupancy[cell_index(position)] > 0
         
     def move(self, game):
-        """ Move the snake one cell (CELL_SIZE) in sub-steps of 1 pixel each. """
+        """ Move the snake one cell, wrapping around the playfield. """
         if self.power_up_timer > 0:
             self.power_up_timer -= 1
             if self.power_up_timer == 0:
@@ -201,48 +355,39 @@ class Snake:
         if dx == 0 and dy == 0:
             return
 
-        steps = CELL_SIZE
-        dx_pixel = dx
-        dy_pixel = dy
-        current_x = old_x
-        current_y = old_y
-
-        for _ in range(steps):
-            # Move 1 pixel
-            new_x = (current_x + dx_pixel) % WIDTH
-            new_y = (current_y + dy_pixel) % HEIGHT
-            current_x, current_y = new_x, new_y
-
-            # Check for food at each pixel step
-            game.check_food_collision_at(current_x, current_y)
-
-        # Snap final position to the grid
-        final_x = (current_x // CELL_SIZE) * CELL_SIZE
-        final_y = (current_y // CELL_SIZE) * CELL_SIZE
-        self.body.insert(0, (final_x, final_y))
-
-        # Debug print final head
-        print(f"[DEBUG] Snake final head = {self.body[0]}  (sub-steps from ({old_x},{old_y}))")
+        # Step straight to the next cell; food and power-ups are resolved
+        # once for the cell entered
+        col = (old_x // CELL_SIZE + dx) % GRID_COLS
+        row = (old_y // CELL_SIZE + dy) % GRID_ROWS
+        head = (col * CELL_SIZE, row * CELL_SIZE)
+        self.push_head(head)
+        game.enter_cell(head)
+        log.debug("Snake head = %s (from (%d,%d))", head, old_x, old_y)
 
         # Particle trail from old position
-        for _ in range(3):
-            self.trail_particles.append(
-                Particle(
-                    (old_x + CELL_SIZE // 2, old_y + CELL_SIZE // 2),
-                    random.choice(PARTICLE_COLORS),
-                    (random.uniform(-1, 1), random.uniform(-1, 1)),
-                    random.randint(15, 25),
-                    size=2,
-                    glow=True
-                )
-            )
+        game.particles.emit((old_x + CELL_SIZE // 2, old_y + CELL_SIZE // 2), 3, 1, (15, 25), size=2)
 
+        self.prev_tail = None
         if len(self.body) > self.length:
-            self.body.pop()
+            self.prev_tail = self.pop_tail()
+
+    def render_positions(self, alpha):
+        """ Segment positions alpha (0..1) of the way from the previous step to this one. """
+        # Each segment moved from where the one behind it is now, and the tail
+        # from the cell it left (or nowhere, if the snake grew)
+        body = self.body
+        previous = chain(islice(body, 1, None), [self.prev_tail or body[-1]])
+        for (x, y), (px, py) in zip(body, previous):
+            # No sliding across the screen when wrapping around an edge
+            if abs(x - px) > CELL_SIZE or abs(y - py) > CELL_SIZE:
+                yield x, y
+            else:
+                yield px + (x - px) * alpha, py + (y - py) * alpha
             
     def check_collision(self):
+        # Segments may overlap while shielded; they count once the shield is gone
         if not self.shield:
-            return len(self.body) != len(set(self.body))
+            return self.overlaps > 0
         return False
     
     def apply_power_up(self, power_type):
@@ -276,20 +421,18 @@ class Snake:
 # ----------------------------------------------------------------------------------
 class Food:
     def __init__(self):
-        self.position = (0, 0)
+        self.position = None  # None while no cell is free
         self.color = NEON_GREEN
         self.animation_time = 0
-        self.spawn()
         
-    def spawn(self):
-        self.position = (
-            random.randint(0, (WIDTH - CELL_SIZE) // CELL_SIZE) * CELL_SIZE,
-            random.randint(0, (HEIGHT - CELL_SIZE) // CELL_SIZE) * CELL_SIZE
-        )
+    def spawn(self, position):
+        self.position = position
         self.animation_time = 0
-        print(f"[DEBUG] Food spawned at {self.position}")
+        log.debug("Food spawned at %s", self.position)
         
     def draw(self, surface):
+        if self.position is None:
+            return
         self.animation_time += 1
         size = CELL_SIZE + math.sin(self.animation_time / 10) * 5
         center = (self.position[0] + CELL_SIZE // 2, self.position[1] + CELL_SIZE // 2)
@@ -306,19 +449,12 @@ class Food:
 # POWERUP
 # ----------------------------------------------------------------------------------
 class PowerUp:
-    def __init__(self):
-        self.position = (0, 0)
+    def __init__(self, position):
+        self.position = position
         self.type = random.choice([SPEED_BOOST, SLOW_DOWN, REVERSE_CONTROLS, EXTRA_POINTS, SHIELD])
         self.animation_time = 0
-        self.spawn()
         self.timer = 600
         
-    def spawn(self):
-        self.position = (
-            random.randint(0, (WIDTH - CELL_SIZE) // CELL_SIZE) * CELL_SIZE,
-            random.randint(0, (HEIGHT - CELL_SIZE) // CELL_SIZE) * CELL_SIZE
-        )
-        
     def get_color(self):
         colors = {
             SPEED_BOOST: NEON_BLUE,
@@ -350,8 +486,9 @@ class Game:
         self.snake = Snake()
         self.food = Food()
         self.power_ups = []
+        self.spawn_food()
         self.high_scores = self.load_high_scores()
-        self.particles = []
+        self.particles = ParticleSystem()  # food bursts and the snake's trail
         self.screen_shake = 0
         
         self.coins = 300
@@ -375,9 +512,26 @@ class Game:
             
     def reset(self):
         self.snake.reset()
-        self.food.spawn()
         self.power_ups = []
-        self.particles = []
+        self.particles.clear()
+        self.spawn_food()
+
+    def free_cell(self):
+        """A uniformly random cell clear of the snake and of food and power-ups, or None."""
+        # Items are few, so they are taken out of the snake's free-cell index
+        # for the draw and put straight back
+        free = self.snake.free
+        taken = [cell_index(item.position) for item in [self.food] + self.power_ups
+                 if item.position is not None and cell_index(item.position) in free]
+        for i in taken:
+            free.remove(i)
+        i = free.choice()
+        for i_taken in taken:
+            free.add(i_taken)
+        return cell_position(i) if i is not None else None
+
+    def spawn_food(self):
+        self.food.spawn(self.free_cell())
         
     def draw_inventory_hud(self):
         """Draw a small panel listing how many items we have: Shield, Speed, Extra Life."""
@@ -414,20 +568,14 @@ class Game:
             SCANLINE_Y = 0
         pygame.draw.line(screen, (255, 255, 255, 25), (0, SCANLINE_Y), (WIDTH, SCANLINE_Y))
         
-    def draw(self):
+    def draw(self, alpha=1.0):
         self.draw_background()
-        for p in self.particles:
-            p.update()
-            p.draw(screen)
-        self.particles = [p for p in self.particles if p.age < p.lifespan]
-
-        for p in self.snake.trail_particles:
-            p.update()
-            p.draw(screen)
-        self.snake.trail_particles = [p for p in self.snake.trail_particles if p.age < p.lifespan]
+        self.particles.update()
+        self.particles.draw(screen)
         
         # Snake
-        for (x, y) in self.snake.body:
+        for (x, y) in self.snake.render_positions(alpha):
+            x, y = int(x), int(y)
             color = NEON_GREEN if not self.snake.shield else (0, 255, 255)
             for j in range(3):
                 gfxdraw.filled_circle(
@@ -466,37 +614,31 @@ class Game:
         pygame.draw.rect(shape, (255, 255, 255, 30), (0, 0, w, h), 2, border_radius=radius)
         screen.blit(shape, (x, y))
 
-    def check_food_collision_at(self, px, py):
-        """Called every sub-step from snake.move. If (px,py) hits the food's cell, eat it."""
-        cell_x = (px // CELL_SIZE) * CELL_SIZE
-        cell_y = (py // CELL_SIZE) * CELL_SIZE
+    def enter_cell(self, position):
+        """Called by snake.move once the head has entered a new cell."""
+        self.check_food_collision(position)
+        self.check_power_up_collision(position)
 
-        if (cell_x, cell_y) == self.food.position:
+    def check_food_collision(self, position):
+        if position == self.food.position:
+            cell_x, cell_y = position
             self.snake.length += 1
             self.snake.score += 10
-            self.food.spawn()
+            self.spawn_food()
             if eat_sound:
                 eat_sound.play()
             self.screen_shake = 5
 
             center = (cell_x + CELL_SIZE // 2, cell_y + CELL_SIZE // 2)
-            for _ in range(20):
-                self.particles.append(
-                    Particle(
-                        center,
-                        random.choice(PARTICLE_COLORS),
-                        (random.uniform(-3, 3), random.uniform(-3, 3)),
-                        random.randint(20, 30),
-                        size=3,
-                        glow=True
-                    )
-                )
+            self.particles.emit(center, 20, 3, (20, 30), size=3)
             if random.random() < 0.3 and len(self.power_ups) < 2:
-                self.power_ups.append(PowerUp())
+                position = self.free_cell()
+                if position is not None:
+                    self.power_ups.append(PowerUp(position))
 
-    def check_power_up_collision(self):
+    def check_power_up_collision(self, position):
         for pu in self.power_ups[:]:
-            if self.snake.body[0] == pu.position:
+            if position == pu.position:
                 self.snake.apply_power_up(pu.type)
                 if pu.type == EXTRA_POINTS:
                     self.snake.score += 50
@@ -1146,8 +1288,7 @@ def main():
     # We'll do: fade in (0->1s), hold (1->2s), fade out(2->3s)
 
     while True:
-        dt = clock.tick(TARGET_FPS) / 1000.0
-        snake_time_accumulator += dt
+        dt = min(clock.tick(TARGET_FPS) / 1000.0, MAX_FRAME_TIME)
 
         # ========== EVENT HANDLING ==========
         for event in pygame.event.get():
@@ -1359,18 +1500,28 @@ def main():
                 if selected_package:
                     game.coins+=selected_package["coins"]
 
-        # If playing, sub-step move
+        # If playing, run the fixed steps this frame's time calls for
+        step_alpha = 1.0
         if current_state==PLAYING:
-            time_per_cell=1.0/game.snake.speed
-            if snake_time_accumulator>=time_per_cell:
+            snake_time_accumulator += dt
+            steps = 0
+            time_per_cell = 1.0/game.snake.speed
+            while snake_time_accumulator>=time_per_cell and steps<MAX_SIM_STEPS:
                 snake_time_accumulator-=time_per_cell
+                steps += 1
                 game.snake.move(game)
-                # no single-step check
-                game.check_power_up_collision()
                 if game.snake.check_collision():
                     if game_over_sound:
                         game_over_sound.play()
                     current_state=GAME_OVER
+                    snake_time_accumulator = 0.0
+                    break
+                # Power-ups change the speed from the next step on
+                time_per_cell = 1.0/game.snake.speed
+            if snake_time_accumulator>=time_per_cell:
+                # Still behind after MAX_SIM_STEPS: drop the backlog
+                snake_time_accumulator %= time_per_cell
+            step_alpha = snake_time_accumulator/time_per_cell
 
         # DRAW
         screen.fill(DARK_BG)
@@ -1411,7 +1562,7 @@ def main():
         if current_state==MENU:
             draw_menu()
         elif current_state==PLAYING:
-            game.draw()
+            game.draw(step_alpha)
         elif current_state==GAME_OVER:
             overlay=pygame.Surface((WIDTH,HEIGHT), pygame.SRCALPHA)
             overlay.fill((0,0,0,200))
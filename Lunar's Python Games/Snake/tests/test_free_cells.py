@@ -0,0 +1,84 @@
+import random
+from collections import Counter
+
+import pytest
+
+from main import GRID_COLS, GRID_ROWS, FreeCells, Game, PowerUp, cell_index, cell_position
+
+@pytest.fixture
+def game():
+    random.seed(3)
+    return Game()
+
+def free_set(free):
+    return set(free.cells[:free.size])
+
+def test_add_and_remove_keep_the_index_consistent():
+    random.seed(1)
+    free = FreeCells(50)
+    expected = set(range(50))
+    for _ in range(2000):
+        i = random.randrange(50)
+        if random.random() < 0.5:
+            free.remove(i)
+            expected.discard(i)
+        else:
+            free.add(i)
+            expected.add(i)
+        assert free.size == len(expected)
+        assert free_set(free) == expected
+        assert all(free.slot[cell] == slot for slot, cell in enumerate(free.cells))
+        assert all((i in free) == (i in expected) for i in range(50))
+
+def test_choice_only_picks_free_cells():
+    random.seed(2)
+    free = FreeCells(10)
+    for i in range(0, 10, 2):
+        free.remove(i)
+    picks = Counter(free.choice() for _ in range(5000))
+    assert set(picks) == {1, 3, 5, 7, 9}
+    # Uniform over what is left
+    assert min(picks.values()) > 800
+    for i in range(1, 10, 2):
+        free.remove(i)
+    assert free.choice() is None
+
+def test_free_cell_avoids_the_snake_and_items(game):
+    snake = game.snake
+    game.power_ups = [PowerUp(cell_position(5)), PowerUp(cell_position(6))]
+    before = free_set(snake.free)
+    items = {cell_index(item.position) for item in [game.food] + game.power_ups}
+    for _ in range(500):
+        position = game.free_cell()
+        assert not snake.is_occupied(position)
+        assert cell_index(position) not in items
+    # Items are only taken out of the index for the draw
+    assert free_set(snake.free) == before
+
+def test_free_cell_on_a_nearly_full_board(game):
+    snake = game.snake
+    game.power_ups = []
+    cells = GRID_COLS * GRID_ROWS
+    head = cell_index(snake.body[0])
+    left = [i for i in range(cells) if i != head][-3:]
+    for i in range(cells):
+        if i != head and i not in left:
+            snake.push_head(cell_position(i))
+    game.food.position = cell_position(left[0])
+    seen = {game.free_cell() for _ in range(200)}
+    assert seen == {cell_position(i) for i in left[1:]}
+    for i in left[1:]:
+        snake.push_head(cell_position(i))
+    assert game.free_cell() is None
+
+def test_spawned_food_never_lands_on_the_snake(game):
+    snake = game.snake
+    snake.next_direction = (1, 0)
+    snake.length = 200
+    directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+    for step in range(1500):
+        if step % 9 == 0:
+            snake.next_direction = random.choice(directions)
+        snake.move(game)
+        game.spawn_food()
+        assert not snake.is_occupied(game.food.position)
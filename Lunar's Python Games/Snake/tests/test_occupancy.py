@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+from main import CELL_SIZE, GRID_COLS, GRID_ROWS, Game, Snake, cell_index, cell_position
+
+@pytest.fixture
+def game():
+    random.seed(7)
+    return Game()
+
+def assert_consistent(snake):
+    """ The occupancy grid, overlap count and free-cell index agree with the body. """
+    counts = {}
+    for position in snake.body:
+        counts[cell_index(position)] = counts.get(cell_index(position), 0) + 1
+    for i in range(GRID_COLS * GRID_ROWS):
+        assert snake.occupancy[i] == counts.get(i, 0)
+    assert snake.overlaps == sum(1 for count in counts.values() if count > 1)
+    free = set(snake.free.cells[:snake.free.size])
+    assert free == set(range(GRID_COLS * GRID_ROWS)) - set(counts)
+
+def test_cell_index_round_trip():
+    for i in (0, 1, GRID_COLS - 1, GRID_COLS, GRID_COLS * GRID_ROWS - 1):
+        assert cell_index(cell_position(i)) == i
+    assert cell_index((CELL_SIZE * 2 + 5, CELL_SIZE + 23)) == GRID_COLS + 2
+
+def test_new_snake_occupies_one_cell():
+    snake = Snake()
+    assert len(snake.body) == 1
+    assert snake.is_occupied(snake.body[0])
+    assert_consistent(snake)
+
+def test_push_and_pop_track_overlaps():
+    snake = Snake()
+    head = snake.body[0]
+    other = cell_position(cell_index(head) + 1)
+    snake.push_head(other)
+    snake.push_head(head)
+    assert snake.overlaps == 1
+    assert snake.check_collision()
+    assert_consistent(snake)
+    snake.shield = True
+    assert not snake.check_collision()
+    snake.shield = False
+    assert snake.pop_tail() == head
+    assert snake.overlaps == 0
+    assert not snake.check_collision()
+    assert_consistent(snake)
+    snake.pop_tail()
+    assert not snake.is_occupied(other)
+    assert snake.is_occupied(head)
+    assert_consistent(snake)
+
+def test_random_walk_keeps_the_grid_in_step(game):
+    snake = game.snake
+    directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+    for step in range(3000):
+        if step % 7 == 0:
+            snake.next_direction = random.choice(directions)
+        if step % 5 == 0:
+            snake.length += 1
+        snake.move(game)
+        # Overlaps are exactly the self-collisions a body scan would find
+        body = list(snake.body)
+        assert (len(body) != len(set(body))) == (snake.overlaps > 0)
+        if step % 100 == 0:
+            assert_consistent(snake)
+    assert_consistent(snake)
+    assert all(0 <= x < GRID_COLS * CELL_SIZE and 0 <= y < GRID_ROWS * CELL_SIZE for x, y in snake.body)
+
+def test_reset_clears_the_grid(game):
+    snake = game.snake
+    snake.next_direction = (1, 0)
+    snake.length = 10
+    for _ in range(20):
+        snake.move(game)
+    snake.reset()
+    assert len(snake.body) == 1
+    assert sum(snake.occupancy) == 1
+    assert_consistent(snake)
+
+def test_wraps_around_the_edges(game):
+    snake = game.snake
+    snake.pop_tail()
+    snake.push_head(cell_position(GRID_COLS - 1))
+    snake.next_direction = (1, 0)
+    snake.move(game)
+    assert snake.body[0] == (0, 0)
+    snake.next_direction = (0, -1)
+    snake.move(game)
+    assert snake.body[0] == (0, (GRID_ROWS - 1) * CELL_SIZE)
@@ -1,12 +1,128 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Request, render_template, request, jsonify, Response, stream_with_context
+from werkzeug.exceptions import HTTPException
 from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
 import os
 from dotenv import load_dotenv
+from cache import make_cache
+from conversations import ConversationStore, parse_messages, parse_turn, parse_title
+from budget import make_budget
+from batch import parse_items, parse_timeout, run_batch
+from metrics import Trace, cache_lines, render as render_metrics
+from limiter import AdmissionTimeout
+from assets import Assets
+from router import make_router
+from prompt import make_prompt, normalize_messages
+from lifecycle import lifecycle
+from transport import make_transport
+from attachments import make_attachments, AttachmentTooLarge
+from ledger import make_ledger, QuotaExceeded
+from pipeline import make_pipeline
 
 load_dotenv()
 
+class PayloadRequest(Request):
+    # request.json also accepts MessagePack and compressed bodies
+    def get_json(self, force=False, silent=False, cache=True):
+        try:
+            return transport.decode(
+                self.get_data(cache=cache),
+                self.mimetype,
+                self.headers.get('Content-Encoding', ''),
+                force
+            )
+        except HTTPException:
+            if silent:
+                return None
+            raise
+
+transport = make_transport()
 app = Flask(__name__)
-client = OpenAI()
+app.request_class = PayloadRequest
+# The body as sent is held to the same cap as the decompressed one
+app.config['MAX_CONTENT_LENGTH'] = transport.max_body
+assets = Assets(os.path.join(app.static_folder, 'src'))
+cache = make_cache()
+store = ConversationStore(os.getenv('CONVERSATION_DB', 'conversations.sqlite3'))
+router = make_router()
+attachments = make_attachments()
+ledger = make_ledger()
+# Retries are handled by the admission gate
+pipeline = make_pipeline(OpenAI(max_retries=0), cache, make_budget(), router, make_prompt(), ledger)
+lifecycle.on_fork(store.close, store.connect)
+lifecycle.on_fork(attachments.close, attachments.connect)
+if cache:
+    lifecycle.on_fork(cache.close, cache.connect)
+if ledger:
+    lifecycle.on_fork(ledger.close, ledger.connect)
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', '16'))
+BATCH_TIMEOUT = float(os.getenv('BATCH_TIMEOUT', '120'))
+BATCH_MAX_TIMEOUT = float(os.getenv('BATCH_MAX_TIMEOUT', '600'))
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '500'))
+batch_pool = ThreadPoolExecutor(max_workers=BATCH_WORKERS)
+
+def event_stream(events):
+    return Response(
+        stream_with_context(lifecycle.stream(events)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def current_account():
+    if not ledger:
+        return None
+    return ledger.account(request.headers, request.remote_addr)
+
+# Endpoints that call upstream; the caller's quota is checked before any work
+METERED_ENDPOINTS = {'chat', 'chat_stream', 'chat_batch', 'conversation_chat', 'conversation_chat_stream'}
+
+@app.before_request
+def check_quota():
+    if ledger and request.endpoint in METERED_ENDPOINTS:
+        ledger.check(current_account())
+
+@app.errorhandler(QuotaExceeded)
+def quota_exceeded(e):
+    body = {'error': str(e), 'window': e.window, 'limit': e.limit, 'retry_after': e.retry_after}
+    return jsonify(body), 429, {'Retry-After': str(e.retry_after)}
+
+def not_found():
+    return jsonify({'error': 'Conversation not found'}), 404
+
+@app.after_request
+def encode_response(response):
+    # Streams and responses that are already encoded (assets) pass through
+    if response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    body, headers, vary = transport.encode(
+        response.get_data(),
+        response.mimetype,
+        request.headers.get('Accept', ''),
+        request.headers.get('Accept-Encoding', '')
+    )
+    response.set_data(body)
+    response.headers.update(headers)
+    for header in vary:
+        response.vary.add(header)
+    return response
+
+@app.context_processor
+def asset_helpers():
+    return {'asset_url': assets.url}
+
+@app.route('/assets/<filename>')
+def asset(filename):
+    found = assets.respond(
+        filename,
+        request.headers.get('Accept-Encoding', ''),
+        request.headers.get('If-None-Match', '')
+    )
+    if found is None:
+        return jsonify({'error': 'Not found'}), 404
+    status, headers, body = found
+    return Response(body, status=status, headers=headers)
 
 @app.route('/')
 def home():
@@ -15,30 +131,203 @@ def home():
 @app.route('/chat', methods=['POST'])
 def chat():
     data = request.json
-    messages = data.get('messages', [])
-    
-    try:
-        response = client.chat.completions.create(
-            model="o3-mini",
-            messages=messages
-        )
-        
-        # Convert CompletionTokensDetails to dictionary
-        completion_tokens_details = {
-            'reasoning_tokens': response.usage.completion_tokens_details.reasoning_tokens,
-            'accepted_prediction_tokens': response.usage.completion_tokens_details.accepted_prediction_tokens,
-            'rejected_prediction_tokens': response.usage.completion_tokens_details.rejected_prediction_tokens
-        }
-        
-        return jsonify({
-            'response': response.choices[0].message.content,
-            'usage': {
-                'total_tokens': response.usage.total_tokens,
-                'completion_tokens_details': completion_tokens_details
-            }
-        })
+    
+    try:
+        messages = normalize_messages(data.get('messages', []))
+        model = router.resolve(data.get('model'))
+        messages = attachments.inject(messages, attachments.resolve(data.get('attachments')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify(pipeline.traced_complete('/chat', messages, model, current_account()))
+    except AdmissionTimeout as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    data = request.json
+    try:
+        messages = normalize_messages(data.get('messages', []))
+        model = router.resolve(data.get('model'))
+        messages = attachments.inject(messages, attachments.resolve(data.get('attachments')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return event_stream(pipeline.stream_completion(messages, Trace('/chat/stream'), model=model, account=current_account()))
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    data = request.json
+    try:
+        items = [(item_id, normalize_messages(messages)) for item_id, messages in parse_items(data, BATCH_MAX_ITEMS)]
+        model = router.resolve(data.get('model'))
+        timeout = parse_timeout(data.get('timeout'), BATCH_TIMEOUT, BATCH_MAX_TIMEOUT)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    account = current_account()
+    
+    def complete(messages):
+        # The quota is checked again per conversation, so a large batch
+        # stops at the limit instead of spending past it
+        if ledger:
+            ledger.check(account)
+        return pipeline.traced_complete('/chat/batch', messages, model, account)
+    
+    lines = run_batch(items, complete, batch_pool, timeout)
+    
+    # Results are written in completion order as NDJSON
+    return Response(
+        stream_with_context(lines),
+        mimetype='application/x-ndjson'
+    )
+
+@app.route('/conversations', methods=['GET'])
+def list_conversations():
+    # Malformed values are ignored rather than rejected
+    limit = request.args.get('limit', type=int)
+    before = request.args.get('before', type=float)
+    if limit is not None:
+        limit = max(1, min(limit, 200))
+    return jsonify(store.list(limit, before, request.args.get('before_id', '')))
+
+@app.route('/conversations', methods=['POST'])
+def create_conversation():
+    data = request.json or {}
+    try:
+        messages = parse_messages(data.get('messages', []))
+        title = parse_title(data.get('title'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(store.create(title, messages)), 201
+
+@app.route('/conversations/<conversation_id>', methods=['GET'])
+def get_conversation(conversation_id):
+    conversation = store.get(conversation_id)
+    if conversation is None:
+        return not_found()
+    return jsonify(conversation)
+
+@app.route('/conversations/<conversation_id>', methods=['PATCH'])
+def rename_conversation(conversation_id):
+    try:
+        title = parse_title((request.json or {}).get('title'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not store.rename(conversation_id, title):
+        return not_found()
+    return jsonify({'ok': True})
+
+@app.route('/conversations/<conversation_id>', methods=['DELETE'])
+def delete_conversation(conversation_id):
+    if not store.delete(conversation_id):
+        return not_found()
+    attachments.unlink(conversation_id)
+    return jsonify({'ok': True})
+
+@app.route('/conversations/<conversation_id>/chat', methods=['POST'])
+def conversation_chat(conversation_id):
+    # Only the new user turn is sent; the history comes from the store
+    history = store.messages(conversation_id)
+    if history is None:
+        return not_found()
+    data = request.json
+    
+    try:
+        turn = parse_turn(data.get('content', ''))
+        model = router.resolve(data.get('model'))
+        attachments.link(conversation_id, attachments.resolve(data.get('attachments')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # Only the turn being sent carries attachment excerpts; the stored one doesn't
+    messages = attachments.inject(history + [turn], attachments.linked(conversation_id))
+    try:
+        result = pipeline.traced_complete('/conversations/chat', messages, model, current_account())
+    except AdmissionTimeout as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    
+    store.append(
+        conversation_id,
+        [turn, {'role': 'assistant', 'content': result['response']}],
+        result['usage']
+    )
+    return jsonify(result)
+
+@app.route('/conversations/<conversation_id>/chat/stream', methods=['POST'])
+def conversation_chat_stream(conversation_id):
+    history = store.messages(conversation_id)
+    if history is None:
+        return not_found()
+    data = request.json
+    try:
+        turn = parse_turn(data.get('content', ''))
+        model = router.resolve(data.get('model'))
+        attachments.link(conversation_id, attachments.resolve(data.get('attachments')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    messages = attachments.inject(history + [turn], attachments.linked(conversation_id))
+    
+    def save(reply, usage):
+        store.append(conversation_id, [turn, {'role': 'assistant', 'content': reply}], usage)
+    
+    return event_stream(pipeline.stream_completion(messages, Trace('/conversations/chat/stream'), on_complete=save, model=model, account=current_account()))
+
+@app.route('/attachments', methods=['POST'])
+def upload_attachment():
+    # The raw file is the body, parsed as it arrives: ?name=notes.md
+    parser = attachments.parser(request.args.get('name', ''))
+    try:
+        while True:
+            data = request.stream.read(65536)
+            if not data:
+                break
+            parser.feed(data)
+        return jsonify(attachments.save(parser)), 201
+    except AttachmentTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/attachments/<attachment_id>', methods=['GET'])
+def get_attachment(attachment_id):
+    attachment = attachments.get(attachment_id)
+    if attachment is None:
+        return jsonify({'error': 'Attachment not found'}), 404
+    return jsonify(attachment)
+
+@app.route('/conversations/<conversation_id>/attachments', methods=['GET'])
+def conversation_attachments(conversation_id):
+    return jsonify([attachments.get(attachment_id) for attachment_id in attachments.linked(conversation_id)])
+
+@app.route('/usage')
+def usage():
+    # The caller's spend per rolling window, and in total
+    if not ledger:
+        return jsonify({'error': 'Usage accounting is off'}), 404
+    return jsonify(ledger.usage(current_account()))
+
+@app.route('/models')
+def models():
+    return jsonify(router.describe())
+
+@app.route('/healthz')
+def healthz():
+    # Readiness: 503 while a dependency is down or the worker is draining
+    ready, body = lifecycle.health(store=store.ping)
+    return jsonify(body), 200 if ready else 503
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(cache.stats() if cache else {'backend': None})
+
+@app.route('/metrics')
+def metrics():
+    body = render_metrics(cache_lines(cache.stats()) if cache else ())
+    return Response(body, mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Development server; see gunicorn.conf.py for production
+    app.run(debug=os.getenv('APP_DEBUG', '0') == '1')
@@ -0,0 +1,371 @@
+# Async serving mode: run with `uvicorn asgi:app` (or `hypercorn asgi:app`).
+# Each in-flight completion is a coroutine on the event loop instead of a
+# blocked thread, and all requests share one upstream connection pool.
+from quart import Quart, Request, render_template, request, jsonify, Response
+from quart.wrappers.response import DataBody
+from werkzeug.exceptions import HTTPException
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+import httpx
+import asyncio
+import os
+from dotenv import load_dotenv
+from cache import make_cache
+from conversations import ConversationStore, parse_messages, parse_turn, parse_title
+from budget import make_budget
+from batch import parse_items, parse_timeout, arun_batch
+from metrics import Trace, cache_lines, render as render_metrics
+from limiter import AdmissionTimeout
+from assets import Assets
+from router import make_router
+from prompt import make_prompt, normalize_messages
+from lifecycle import lifecycle
+from transport import make_transport
+from attachments import make_attachments, AttachmentTooLarge
+from ledger import make_ledger, QuotaExceeded
+from pipeline import make_pipeline
+
+load_dotenv()
+
+MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '200'))
+MAX_KEEPALIVE = int(os.getenv('OPENAI_MAX_KEEPALIVE', '50'))
+
+class PayloadRequest(Request):
+    # request.json also accepts MessagePack and compressed bodies
+    async def get_json(self, force=False, silent=False, cache=True):
+        try:
+            return transport.decode(
+                await self.get_data(cache=cache),
+                self.mimetype,
+                self.headers.get('Content-Encoding', ''),
+                force
+            )
+        except HTTPException:
+            if silent:
+                return None
+            raise
+
+transport = make_transport()
+app = Quart(__name__)
+app.request_class = PayloadRequest
+# The body as sent is held to the same cap as the decompressed one
+app.config['MAX_CONTENT_LENGTH'] = transport.max_body
+assets = Assets(os.path.join(app.static_folder, 'src'))
+cache = make_cache()
+store = ConversationStore(os.getenv('CONVERSATION_DB', 'conversations.sqlite3'))
+router = make_router()
+attachments = make_attachments()
+ledger = make_ledger()
+# The client is opened once the event loop is running
+pipeline = make_pipeline(None, cache, make_budget(), router, make_prompt(), ledger, asynchronous=True)
+lifecycle.on_fork(store.close, store.connect)
+lifecycle.on_fork(attachments.close, attachments.connect)
+if cache:
+    lifecycle.on_fork(cache.close, cache.connect)
+if ledger:
+    lifecycle.on_fork(ledger.close, ledger.connect)
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', '16'))
+BATCH_TIMEOUT = float(os.getenv('BATCH_TIMEOUT', '120'))
+BATCH_MAX_TIMEOUT = float(os.getenv('BATCH_MAX_TIMEOUT', '600'))
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '500'))
+batch_slots = None
+
+@app.before_serving
+async def open_client():
+    global batch_slots
+    batch_slots = asyncio.Semaphore(BATCH_WORKERS)
+    # Retries are handled by the admission gate
+    pipeline.client = AsyncOpenAI(
+        max_retries=0,
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE
+            )
+        )
+    )
+
+@app.after_serving
+async def close_client():
+    await pipeline.client.close()
+
+def event_stream(events):
+    return Response(
+        lifecycle.astream(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+async def current_account():
+    if not ledger:
+        return None
+    return await asyncio.to_thread(ledger.account, request.headers, request.remote_addr)
+
+# Endpoints that call upstream; the caller's quota is checked before any work
+METERED_ENDPOINTS = {'chat', 'chat_stream', 'chat_batch', 'conversation_chat', 'conversation_chat_stream'}
+
+@app.before_request
+async def check_quota():
+    if ledger and request.endpoint in METERED_ENDPOINTS:
+        await asyncio.to_thread(ledger.check, await current_account())
+
+@app.errorhandler(QuotaExceeded)
+async def quota_exceeded(e):
+    body = {'error': str(e), 'window': e.window, 'limit': e.limit, 'retry_after': e.retry_after}
+    return jsonify(body), 429, {'Retry-After': str(e.retry_after)}
+
+# Attachment lookups hit SQLite and excerpt selection scores every chunk
+# with BM25, so the routes run these on a worker thread
+def attach(messages, requested):
+    return attachments.inject(messages, attachments.resolve(requested))
+
+def link_attachments(conversation_id, requested):
+    attachments.link(conversation_id, attachments.resolve(requested))
+
+def attach_linked(messages, conversation_id):
+    return attachments.inject(messages, attachments.linked(conversation_id))
+
+def not_found():
+    return jsonify({'error': 'Conversation not found'}), 404
+
+@app.after_request
+async def encode_response(response):
+    # Streams and responses that are already encoded (assets) pass through
+    if not isinstance(response.response, DataBody) or 'Content-Encoding' in response.headers:
+        return response
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    body, headers, vary = transport.encode(
+        await response.get_data(),
+        response.mimetype,
+        request.headers.get('Accept', ''),
+        request.headers.get('Accept-Encoding', '')
+    )
+    response.set_data(body)
+    response.headers.update(headers)
+    for header in vary:
+        response.vary.add(header)
+    return response
+
+@app.context_processor
+async def asset_helpers():
+    return {'asset_url': assets.url}
+
+@app.route('/assets/<filename>')
+async def asset(filename):
+    found = assets.respond(
+        filename,
+        request.headers.get('Accept-Encoding', ''),
+        request.headers.get('If-None-Match', '')
+    )
+    if found is None:
+        return jsonify({'error': 'Not found'}), 404
+    status, headers, body = found
+    return Response(body, status=status, headers=headers)
+
+@app.route('/')
+async def home():
+    return await render_template('index.html')
+
+@app.route('/chat', methods=['POST'])
+async def chat():
+    data = await request.get_json()
+    
+    try:
+        messages = normalize_messages(data.get('messages', []))
+        model = router.resolve(data.get('model'))
+        messages = await asyncio.to_thread(attach, messages, data.get('attachments'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify(await pipeline.traced_complete('/chat', messages, model, await current_account()))
+    except AdmissionTimeout as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/chat/stream', methods=['POST'])
+async def chat_stream():
+    data = await request.get_json()
+    try:
+        messages = normalize_messages(data.get('messages', []))
+        model = router.resolve(data.get('model'))
+        messages = await asyncio.to_thread(attach, messages, data.get('attachments'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return event_stream(pipeline.stream_completion(messages, Trace('/chat/stream'), model=model, account=await current_account()))
+
+@app.route('/chat/batch', methods=['POST'])
+async def chat_batch():
+    data = await request.get_json()
+    try:
+        items = [(item_id, normalize_messages(messages)) for item_id, messages in parse_items(data, BATCH_MAX_ITEMS)]
+        model = router.resolve(data.get('model'))
+        timeout = parse_timeout(data.get('timeout'), BATCH_TIMEOUT, BATCH_MAX_TIMEOUT)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    account = await current_account()
+    
+    async def complete(messages):
+        # The quota is checked again per conversation, so a large batch
+        # stops at the limit instead of spending past it
+        if ledger:
+            await asyncio.to_thread(ledger.check, account)
+        return await pipeline.traced_complete('/chat/batch', messages, model, account)
+    
+    lines = arun_batch(items, complete, batch_slots, timeout)
+    
+    return Response(
+        lines,
+        mimetype='application/x-ndjson'
+    )
+
+@app.route('/conversations', methods=['GET'])
+async def list_conversations():
+    # Malformed values are ignored rather than rejected
+    limit = request.args.get('limit', type=int)
+    before = request.args.get('before', type=float)
+    if limit is not None:
+        limit = max(1, min(limit, 200))
+    return jsonify(await asyncio.to_thread(store.list, limit, before, request.args.get('before_id', '')))
+
+@app.route('/conversations', methods=['POST'])
+async def create_conversation():
+    data = await request.get_json() or {}
+    try:
+        messages = parse_messages(data.get('messages', []))
+        title = parse_title(data.get('title'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(await asyncio.to_thread(store.create, title, messages)), 201
+
+@app.route('/conversations/<conversation_id>', methods=['GET'])
+async def get_conversation(conversation_id):
+    conversation = await asyncio.to_thread(store.get, conversation_id)
+    if conversation is None:
+        return not_found()
+    return jsonify(conversation)
+
+@app.route('/conversations/<conversation_id>', methods=['PATCH'])
+async def rename_conversation(conversation_id):
+    data = await request.get_json() or {}
+    try:
+        title = parse_title(data.get('title'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not await asyncio.to_thread(store.rename, conversation_id, title):
+        return not_found()
+    return jsonify({'ok': True})
+
+@app.route('/conversations/<conversation_id>', methods=['DELETE'])
+async def delete_conversation(conversation_id):
+    if not await asyncio.to_thread(store.delete, conversation_id):
+        return not_found()
+    await asyncio.to_thread(attachments.unlink, conversation_id)
+    return jsonify({'ok': True})
+
+@app.route('/conversations/<conversation_id>/chat', methods=['POST'])
+async def conversation_chat(conversation_id):
+    history = await asyncio.to_thread(store.messages, conversation_id)
+    if history is None:
+        return not_found()
+    data = await request.get_json()
+    
+    try:
+        turn = parse_turn(data.get('content', ''))
+        model = router.resolve(data.get('model'))
+        await asyncio.to_thread(link_attachments, conversation_id, data.get('attachments'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # Only the turn being sent carries attachment excerpts; the stored one doesn't
+    messages = await asyncio.to_thread(attach_linked, history + [turn], conversation_id)
+    try:
+        result = await pipeline.traced_complete('/conversations/chat', messages, model, await current_account())
+    except AdmissionTimeout as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    await asyncio.to_thread(
+        store.append,
+        conversation_id,
+        [turn, {'role': 'assistant', 'content': result['response']}],
+        result['usage']
+    )
+    return jsonify(result)
+
+@app.route('/conversations/<conversation_id>/chat/stream', methods=['POST'])
+async def conversation_chat_stream(conversation_id):
+    history = await asyncio.to_thread(store.messages, conversation_id)
+    if history is None:
+        return not_found()
+    data = await request.get_json()
+    try:
+        turn = parse_turn(data.get('content', ''))
+        model = router.resolve(data.get('model'))
+        await asyncio.to_thread(link_attachments, conversation_id, data.get('attachments'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    messages = await asyncio.to_thread(attach_linked, history + [turn], conversation_id)
+    
+    def save(reply, usage):
+        store.append(conversation_id, [turn, {'role': 'assistant', 'content': reply}], usage)
+    
+    return event_stream(pipeline.stream_completion(messages, Trace('/conversations/chat/stream'), on_complete=save, model=model, account=await current_account()))
+
+@app.route('/attachments', methods=['POST'])
+async def upload_attachment():
+    # The raw file is the body, parsed as it arrives: ?name=notes.md
+    parser = attachments.parser(request.args.get('name', ''))
+    try:
+        # Chunking, tokenizing and indexing run off the event loop
+        async for data in request.body:
+            await asyncio.to_thread(parser.feed, data)
+        return jsonify(await asyncio.to_thread(attachments.save, parser)), 201
+    except AttachmentTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/attachments/<attachment_id>', methods=['GET'])
+async def get_attachment(attachment_id):
+    attachment = await asyncio.to_thread(attachments.get, attachment_id)
+    if attachment is None:
+        return jsonify({'error': 'Attachment not found'}), 404
+    return jsonify(attachment)
+
+@app.route('/conversations/<conversation_id>/attachments', methods=['GET'])
+async def conversation_attachments(conversation_id):
+    return jsonify(await asyncio.to_thread(
+        lambda: [attachments.get(attachment_id) for attachment_id in attachments.linked(conversation_id)]
+    ))
+
+@app.route('/usage')
+async def usage():
+    # The caller's spend per rolling window, and in total
+    if not ledger:
+        return jsonify({'error': 'Usage accounting is off'}), 404
+    return jsonify(await asyncio.to_thread(ledger.usage, await current_account()))
+
+@app.route('/models')
+async def models():
+    return jsonify(router.describe())
+
+@app.route('/healthz')
+async def healthz():
+    # Readiness: 503 while a dependency is down or the worker is draining
+    ready, body = await asyncio.to_thread(lifecycle.health, store=store.ping, client=lambda: pipeline.client is not None)
+    return jsonify(body), 200 if ready else 503
+
+@app.route('/cache/stats')
+async def cache_stats():
+    return jsonify(cache.stats() if cache else {'backend': None})
+
+@app.route('/metrics')
+async def metrics():
+    body = render_metrics(cache_lines(cache.stats()) if cache else ())
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+if __name__ == '__main__':
+    # Development server; see gunicorn.conf.py for production
+    app.run(debug=os.getenv('APP_DEBUG', '0') == '1')
@@ -0,0 +1,163 @@
+import gzip
+import hashlib
+import os
+import sys
+import threading
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Front-end bundles. The sources in static/src are concatenated, minified
+# when rjsmin/rcssmin are installed, named after a hash of their content
+# and precompressed. They are served from memory at /assets/<name> and
+# can be cached forever, since any change produces a new URL.
+
+BUNDLES = {
+    'app.css': ['highlight.css', 'app.css'],
+    'app.js': ['highlight.js', 'particles.js', 'message-list.js', 'formatter.js', 'history-db.js', 'app.js'],
+    'format-worker.js': ['highlight.js', 'markdown.js', 'format-worker.js']
+}
+
+CONTENT_TYPES = {
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'text/javascript; charset=utf-8'
+}
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Preferred first when the client accepts several
+ENCODINGS = ('br', 'gzip', 'identity')
+
+def minify(name, text):
+    if name.endswith('.js') and rjsmin:
+        return rjsmin.jsmin(text)
+    if name.endswith('.css') and rcssmin:
+        return rcssmin.cssmin(text)
+    return text
+
+def accepted_encodings(header):
+    accepted = {'identity'}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q=') and quality[2:].strip() in ('0', '0.0', '0.00', '0.000'):
+            continue
+        if coding == '*':
+            accepted.update(ENCODINGS)
+        elif coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+class Bundle:
+    def __init__(self, name, body):
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        self.filename = f'{stem}.{digest}{ext}'
+        # Weak, because the same ETag covers every encoding of the body
+        self.etag = f'W/"{digest}"'
+        self.content_type = CONTENT_TYPES.get(ext, 'application/octet-stream')
+        self.variants = {'identity': body}
+        compressed = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli:
+            compressed['br'] = brotli.compress(body, quality=11)
+        for encoding, data in compressed.items():
+            if len(data) < len(body):
+                self.variants[encoding] = data
+
+class Assets:
+    def __init__(self, source_dir, bundles=BUNDLES):
+        self.source_dir = source_dir
+        self.bundles = bundles
+        self.current = {}
+        # Every filename ever built stays servable, so a page rendered
+        # before a rebuild can still load its bundles
+        self.by_filename = {}
+        self.signature = None
+        self.lock = threading.Lock()
+        self.refresh()
+
+    def paths(self, name):
+        return [os.path.join(self.source_dir, source) for source in self.bundles[name]]
+
+    def source_signature(self):
+        return tuple(
+            os.stat(path).st_mtime_ns
+            for name in self.bundles
+            for path in self.paths(name)
+        )
+
+    def build(self, name):
+        parts = []
+        for path in self.paths(name):
+            with open(path, encoding='utf-8') as f:
+                parts.append(f.read())
+        # The semicolon keeps concatenated scripts from running together
+        separator = ';\n' if name.endswith('.js') else '\n'
+        return Bundle(name, minify(name, separator.join(parts)).encode('utf-8'))
+
+    def refresh(self):
+        # A few stat() calls per page render, so edits to static/src show up
+        # without a restart
+        signature = self.source_signature()
+        if signature == self.signature:
+            return
+        with self.lock:
+            if signature == self.signature:
+                return
+            for name in self.bundles:
+                bundle = self.build(name)
+                self.current[name] = bundle
+                self.by_filename[bundle.filename] = bundle
+            self.signature = signature
+
+    def url(self, name):
+        self.refresh()
+        return '/assets/' + self.current[name].filename
+
+    def respond(self, filename, accept_encoding='', if_none_match=''):
+        # Returns (status, headers, body), or None for an unknown file
+        bundle = self.by_filename.get(filename)
+        if bundle is None:
+            return None
+        headers = {
+            'Cache-Control': IMMUTABLE,
+            'ETag': bundle.etag,
+            'Vary': 'Accept-Encoding'
+        }
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        if '*' in tags or bundle.etag in tags or bundle.etag[2:] in tags:
+            return 304, headers, b''
+        accepted = accepted_encodings(accept_encoding)
+        encoding = next(e for e in ENCODINGS if e in accepted and e in bundle.variants)
+        headers['Content-Type'] = bundle.content_type
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return 200, headers, bundle.variants[encoding]
+
+    def write(self, out_dir):
+        # Writes the bundles and their .gz/.br variants for a front proxy
+        # that serves static files itself
+        os.makedirs(out_dir, exist_ok=True)
+        suffixes = {'identity': '', 'gzip': '.gz', 'br': '.br'}
+        for bundle in self.current.values():
+            for encoding, data in bundle.variants.items():
+                with open(os.path.join(out_dir, bundle.filename + suffixes[encoding]), 'wb') as f:
+                    f.write(data)
+            print(bundle.filename, {encoding: len(data) for encoding, data in bundle.variants.items()})
+
+if __name__ == '__main__':
+    here = os.path.dirname(os.path.abspath(__file__))
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(here, 'static', 'dist')
+    Assets(os.path.join(here, 'static', 'src')).write(out_dir)
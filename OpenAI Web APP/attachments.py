@@ -0,0 +1,404 @@
+import codecs
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from budget import count_tokens
+
+# File attachments (text, code, CSV). An upload is parsed while it streams
+# in: decoded incrementally, split on line boundaries into chunks of about
+# chunk_tokens (CSV chunks repeat the header row so each stands alone) and
+# hashed. Files are stored once per content hash and chunks once per chunk
+# hash, so a re-upload or boilerplate shared between files costs nothing.
+# Each turn then carries only the chunks that best match the user's
+# message (BM25 over the chunks' terms), within context_tokens, however
+# large the files are.
+
+CSV_DELIMITERS = {'.csv': ',', '.tsv': '\t'}
+CODE_EXTENSIONS = {
+    '.py', '.js', '.mjs', '.ts', '.tsx', '.jsx', '.java', '.c', '.h', '.cpp', '.hpp', '.cc',
+    '.cs', '.go', '.rs', '.rb', '.php', '.swift', '.kt', '.scala', '.sh', '.bash', '.ps1',
+    '.sql', '.html', '.css', '.scss', '.json', '.yaml', '.yml', '.toml', '.ini', '.xml', '.lua'
+}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+CAMEL = re.compile(r'([a-z0-9])([A-Z])')
+WORD = re.compile(r'[^\W_]+')
+
+def terms(text):
+    # Words, with snake_case and camelCase identifiers split into parts
+    return [t for t in WORD.findall(CAMEL.sub(r'\1 \2', text).lower()) if len(t) > 1]
+
+class AttachmentTooLarge(ValueError):
+    pass
+
+class ChunkParser:
+    def __init__(self, name, chunk_tokens=250, max_bytes=10 * 1024 * 1024):
+        self.name = os.path.basename(name)[:200] or 'attachment.txt'
+        ext = os.path.splitext(self.name)[1].lower()
+        self.kind = 'csv' if ext in CSV_DELIMITERS else 'code' if ext in CODE_EXTENSIONS else 'text'
+        self.chunk_tokens = chunk_tokens
+        self.max_bytes = max_bytes
+        self.decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.pending = ''
+        self.line_no = 0
+        self.record = []
+        self.header = None
+        self.header_tokens = 0
+        self.lines = []
+        self.tokens = 0
+        self.start = self.end = 0
+        self.chunks = []
+
+    def feed(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise AttachmentTooLarge(f'attachments are limited to {self.max_bytes} bytes')
+        if b'\0' in data:
+            raise ValueError('only text attachments are supported')
+        self.digest.update(data)
+        try:
+            text = self.decoder.decode(data)
+        except UnicodeDecodeError:
+            raise ValueError('attachments must be UTF-8 text')
+        self._split(text)
+
+    def finish(self):
+        try:
+            self._split(self.decoder.decode(b'', final=True))
+        except UnicodeDecodeError:
+            raise ValueError('attachments must be UTF-8 text')
+        if self.pending:
+            self._line(self.pending.rstrip('\r'))
+        if self.record:
+            # An unterminated quoted field; keep what there is
+            self._row('\n'.join(self.record))
+        self._flush()
+        if not self.chunks:
+            raise ValueError('attachment is empty')
+        return self.chunks
+
+    @property
+    def id(self):
+        return self.digest.hexdigest()
+
+    def _split(self, text):
+        lines = (self.pending + text).split('\n')
+        self.pending = lines.pop()
+        for line in lines:
+            self._line(line.rstrip('\r'))
+
+    def _line(self, line):
+        self.line_no += 1
+        if self.kind != 'csv':
+            self._row(line)
+            return
+        # A quoted field may span lines; the row ends when the quotes balance
+        self.record.append(line)
+        if sum(part.count('"') for part in self.record) % 2 == 0:
+            row = '\n'.join(self.record)
+            self.record = []
+            if self.header is None:
+                self.header = row
+                self.header_tokens = self.tokens = count_tokens(row) + 1
+            else:
+                self._row(row)
+
+    def _boundary(self, line):
+        # Blank lines, and top-level statements in code, are good places to cut
+        return not line.strip() or (self.kind == 'code' and not line[:1].isspace())
+
+    def _row(self, line):
+        tokens = count_tokens(line) + 1
+        if tokens > self.chunk_tokens:
+            # Minified code and the like: cut the line itself
+            self._flush()
+            width = self.chunk_tokens * 3
+            for i in range(0, len(line), width):
+                self._add(line[i:i + width], self.chunk_tokens)
+                self._flush()
+            return
+        if self.lines and self.tokens >= self.chunk_tokens // 2 and self._boundary(line):
+            self._flush()
+        elif self.tokens + tokens > self.chunk_tokens:
+            self._flush()
+        self._add(line, tokens)
+
+    def _add(self, line, tokens):
+        if not self.lines and not line.strip():
+            return
+        if not self.lines:
+            self.start = self.line_no - line.count('\n')
+        self.lines.append(line)
+        self.tokens += tokens
+        self.end = self.line_no
+
+    def _flush(self):
+        body = '\n'.join(self.lines).strip('\n')
+        if body.strip():
+            text = body if self.header is None else self.header + '\n' + body
+            self.chunks.append((self.start, self.end, text))
+        self.lines = []
+        self.tokens = self.header_tokens
+
+class AttachmentStore:
+    def __init__(self, path='attachments.sqlite3', chunk_tokens=250, max_bytes=10 * 1024 * 1024,
+                 context_tokens=2000, max_per_request=20, index_cache_size=16):
+        self.path = path
+        self.chunk_tokens = chunk_tokens
+        self.max_bytes = max_bytes
+        self.context_tokens = context_tokens
+        self.max_per_request = max_per_request
+        # Parsed term statistics of recently used attachments
+        self.indexes = OrderedDict()
+        self.index_cache_size = index_cache_size
+        self.db = None
+        self.lock = threading.Lock()
+        self.connect()
+
+    def connect(self):
+        with self.lock:
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+            self.db.executescript('''
+                PRAGMA journal_mode = WAL;
+                CREATE TABLE IF NOT EXISTS attachments (
+                    id TEXT PRIMARY KEY,
+                    name TEXT,
+                    kind TEXT,
+                    size INTEGER,
+                    tokens INTEGER,
+                    chunks INTEGER,
+                    created_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS chunks (
+                    hash TEXT PRIMARY KEY,
+                    text TEXT,
+                    tokens INTEGER,
+                    length INTEGER,
+                    terms TEXT
+                );
+                CREATE TABLE IF NOT EXISTS attachment_chunks (
+                    attachment_id TEXT,
+                    seq INTEGER,
+                    chunk_hash TEXT,
+                    start_line INTEGER,
+                    end_line INTEGER,
+                    PRIMARY KEY (attachment_id, seq)
+                );
+                CREATE TABLE IF NOT EXISTS conversation_attachments (
+                    conversation_id TEXT,
+                    attachment_id TEXT,
+                    added_at REAL,
+                    PRIMARY KEY (conversation_id, attachment_id)
+                );
+            ''')
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+    def parser(self, name):
+        return ChunkParser(name, self.chunk_tokens, self.max_bytes)
+
+    def save(self, parser):
+        chunks = parser.finish()
+        attachment_id = parser.id
+        existing = self.get(attachment_id)
+        if existing:
+            return dict(existing, deduplicated=True)
+        # Chunk rows are built outside the lock; tokenizing is the slow part
+        rows = []
+        refs = []
+        seen = set()
+        for start, end, text in chunks:
+            chunk_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+            if chunk_hash in seen:
+                continue
+            seen.add(chunk_hash)
+            counts = Counter(terms(text))
+            rows.append((chunk_hash, text, count_tokens(text), sum(counts.values()), json.dumps(counts)))
+            refs.append((attachment_id, len(refs), chunk_hash, start, end))
+        tokens = sum(row[2] for row in rows)
+        with self.lock:
+            self.db.executemany('INSERT OR IGNORE INTO chunks (hash, text, tokens, length, terms) VALUES (?, ?, ?, ?, ?)', rows)
+            self.db.executemany(
+                'INSERT OR IGNORE INTO attachment_chunks (attachment_id, seq, chunk_hash, start_line, end_line) VALUES (?, ?, ?, ?, ?)',
+                refs
+            )
+            self.db.execute(
+                'INSERT OR IGNORE INTO attachments (id, name, kind, size, tokens, chunks, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (attachment_id, parser.name, parser.kind, parser.size, tokens, len(refs), time.time())
+            )
+            self.db.commit()
+        return dict(self.get(attachment_id), deduplicated=False)
+
+    def get(self, attachment_id):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT id, name, kind, size, tokens, chunks, created_at FROM attachments WHERE id = ?',
+                (attachment_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('id', 'name', 'kind', 'size', 'tokens', 'chunks', 'created_at'), row))
+
+    def resolve(self, attachment_ids):
+        # Validates the attachment ids of a request
+        if attachment_ids is None:
+            return []
+        if not isinstance(attachment_ids, list) or not all(isinstance(i, str) for i in attachment_ids):
+            raise ValueError('attachments must be a list of attachment ids')
+        attachment_ids = list(dict.fromkeys(attachment_ids))
+        if len(attachment_ids) > self.max_per_request:
+            raise ValueError(f'at most {self.max_per_request} attachments per request')
+        for attachment_id in attachment_ids:
+            if self.get(attachment_id) is None:
+                raise ValueError(f'unknown attachment {attachment_id!r}')
+        return attachment_ids
+
+    def link(self, conversation_id, attachment_ids):
+        now = time.time()
+        with self.lock:
+            self.db.executemany(
+                'INSERT OR IGNORE INTO conversation_attachments (conversation_id, attachment_id, added_at) VALUES (?, ?, ?)',
+                [(conversation_id, attachment_id, now) for attachment_id in attachment_ids]
+            )
+            self.db.commit()
+
+    def linked(self, conversation_id):
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT attachment_id FROM conversation_attachments WHERE conversation_id = ? ORDER BY added_at, attachment_id',
+                (conversation_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def unlink(self, conversation_id):
+        with self.lock:
+            self.db.execute('DELETE FROM conversation_attachments WHERE conversation_id = ?', (conversation_id,))
+            self.db.commit()
+
+    def index(self, attachment_id):
+        # (name, chunks, document frequencies) for one attachment
+        with self.lock:
+            if attachment_id in self.indexes:
+                self.indexes.move_to_end(attachment_id)
+                return self.indexes[attachment_id]
+            row = self.db.execute('SELECT name FROM attachments WHERE id = ?', (attachment_id,)).fetchone()
+            rows = self.db.execute(
+                'SELECT ac.chunk_hash, ac.start_line, ac.end_line, c.tokens, c.length, c.terms '
+                'FROM attachment_chunks ac JOIN chunks c ON c.hash = ac.chunk_hash '
+                'WHERE ac.attachment_id = ? ORDER BY ac.seq',
+                (attachment_id,)
+            ).fetchall()
+        if row is None:
+            return None
+        chunks = []
+        frequencies = Counter()
+        for chunk_hash, start, end, tokens, length, counts in rows:
+            counts = json.loads(counts)
+            frequencies.update(counts.keys())
+            chunks.append({'hash': chunk_hash, 'start': start, 'end': end, 'tokens': tokens, 'length': length, 'terms': counts})
+        index = (row[0], chunks, frequencies)
+        with self.lock:
+            self.indexes[attachment_id] = index
+            while len(self.indexes) > self.index_cache_size:
+                self.indexes.popitem(last=False)
+        return index
+
+    def select(self, attachment_ids, query, budget):
+        # Chunks to send, best BM25 matches first, until the budget is spent.
+        # Files that fit the budget whole are sent whole.
+        candidates = []
+        frequencies = Counter()
+        for order, attachment_id in enumerate(attachment_ids):
+            index = self.index(attachment_id)
+            if index is None:
+                continue
+            name, chunks, counts = index
+            frequencies.update(counts)
+            candidates.extend((order, seq, name, chunk) for seq, chunk in enumerate(chunks))
+        if not candidates:
+            return []
+        if sum(c[3]['tokens'] for c in candidates) > budget:
+            count = len(candidates)
+            average = sum(c[3]['length'] for c in candidates) / count or 1
+            query_terms = set(terms(query))
+            idf = {t: math.log(1 + (count - frequencies[t] + 0.5) / (frequencies[t] + 0.5)) for t in query_terms if frequencies[t]}
+
+            def score(candidate):
+                chunk = candidate[3]
+                norm = K1 * (1 - B + B * chunk['length'] / average)
+                return sum(
+                    weight * chunk['terms'].get(t, 0) * (K1 + 1) / (chunk['terms'].get(t, 0) + norm)
+                    for t, weight in idf.items()
+                )
+
+            scored = [(score(c), c) for c in candidates]
+            # Nothing matches (a follow-up like "go on"): the start of the files
+            if any(s > 0 for s, _ in scored):
+                candidates = [c for s, c in sorted(scored, key=lambda sc: -sc[0]) if s > 0]
+        chosen = []
+        seen = set()
+        spent = 0
+        for candidate in candidates:
+            chunk = candidate[3]
+            if chunk['hash'] in seen or spent + chunk['tokens'] > budget:
+                continue
+            seen.add(chunk['hash'])
+            spent += chunk['tokens']
+            chosen.append(candidate)
+        return sorted(chosen, key=lambda c: (c[0], c[1]))
+
+    def excerpts(self, attachment_ids, query, budget=None):
+        chosen = self.select(attachment_ids, query, self.context_tokens if budget is None else budget)
+        hashes = [c[3]['hash'] for c in chosen]
+        with self.lock:
+            texts = dict(self.db.execute(
+                f"SELECT hash, text FROM chunks WHERE hash IN ({','.join('?' * len(hashes))})",
+                hashes
+            ).fetchall()) if hashes else {}
+        return [(name, chunk['start'], chunk['end'], texts[chunk['hash']]) for _, _, name, chunk in chosen]
+
+    def inject(self, messages, attachment_ids):
+        # Prepends the relevant excerpts to the last user message. Earlier
+        # turns are left as they were, so the prompt prefix stays cacheable.
+        if not attachment_ids:
+            return messages
+        # Malformed entries are left for prompt.assemble to normalize
+        users = [i for i, m in enumerate(messages) if isinstance(m, dict) and m.get('role') == 'user']
+        if not users:
+            return messages
+        last = users[-1]
+        # The previous question helps with short follow-ups
+        query = '\n'.join(str(messages[i].get('content') or '') for i in users[-2:])
+        excerpts = self.excerpts(attachment_ids, query)
+        if not excerpts:
+            return messages
+        blocks = '\n\n'.join(f'--- {name}, lines {start}-{end} ---\n{text}' for name, start, end, text in excerpts)
+        content = (
+            'Excerpts from the attached files (the parts most relevant to this message):\n\n'
+            f'{blocks}\n\n--- end of excerpts ---\n\n{messages[last].get("content") or ""}'
+        )
+        return messages[:last] + [dict(messages[last], content=content)] + messages[last + 1:]
+
+def make_attachments():
+    return AttachmentStore(
+        path=os.getenv('ATTACHMENT_DB', 'attachments.sqlite3'),
+        chunk_tokens=int(os.getenv('ATTACHMENT_CHUNK_TOKENS', '250')),
+        max_bytes=int(os.getenv('ATTACHMENT_MAX_BYTES', str(10 * 1024 * 1024))),
+        context_tokens=int(os.getenv('ATTACHMENT_CONTEXT_TOKENS', '2000'))
+    )
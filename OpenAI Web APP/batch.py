@@ -0,0 +1,138 @@
+import asyncio
+import json
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+
+# Helpers for /chat/batch: run many conversations concurrently and emit
+# one NDJSON line per conversation in completion order, followed by a
+# summary line with the batch totals.
+
+def parse_items(data, max_items):
+    # Each conversation is either a messages list or {"id": ..., "messages": [...]}
+    conversations = data.get('conversations')
+    if not isinstance(conversations, list) or not conversations:
+        raise ValueError('conversations must be a non-empty list')
+    if len(conversations) > max_items:
+        raise ValueError(f'at most {max_items} conversations per batch')
+    items = []
+    for index, conversation in enumerate(conversations):
+        if isinstance(conversation, dict):
+            items.append((conversation.get('id', index), conversation.get('messages', [])))
+        else:
+            items.append((index, conversation))
+    return items
+
+def parse_timeout(value, default, maximum):
+    # Seconds per conversation; NaN fails the range check too
+    if value is None:
+        return default
+    try:
+        timeout = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('timeout must be a number of seconds')
+    if not 0 < timeout <= maximum:
+        raise ValueError(f'timeout must be more than 0 and at most {maximum} seconds')
+    return timeout
+
+def ndjson(obj):
+    return json.dumps(obj) + '\n'
+
+class BatchTotals:
+    def __init__(self):
+        self.completed = 0
+        self.failed = 0
+        self.total_tokens = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens_details = {
+            'reasoning_tokens': 0,
+            'accepted_prediction_tokens': 0,
+            'rejected_prediction_tokens': 0
+        }
+        self.started = time.monotonic()
+
+    def line(self, index, item_id, result=None, error=None):
+        if error is not None:
+            self.failed += 1
+            return ndjson({'index': index, 'id': item_id, 'error': error})
+        self.completed += 1
+        usage = result['usage']
+        self.total_tokens += usage['total_tokens']
+        for name, count in usage['completion_tokens_details'].items():
+            self.completion_tokens_details[name] = self.completion_tokens_details.get(name, 0) + (count or 0)
+        # Results cached before prompt details were recorded lack them
+        self.prompt_tokens += usage.get('prompt_tokens', 0)
+        self.cached_tokens += usage.get('prompt_tokens_details', {}).get('cached_tokens', 0)
+        return ndjson(dict(result, index=index, id=item_id))
+
+    def summary(self):
+        return ndjson({
+            'done': True,
+            'completed': self.completed,
+            'failed': self.failed,
+            'elapsed': round(time.monotonic() - self.started, 3),
+            'usage': {
+                'total_tokens': self.total_tokens,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens_details': self.completion_tokens_details,
+                'prompt_tokens_details': {'cached_tokens': self.cached_tokens}
+            }
+        })
+
+def run_batch(items, complete, pool, timeout):
+    # The timeout counts from when an item starts running, not while it is
+    # queued behind the pool. A timed-out item is reported at once; its
+    # worker thread is freed when the upstream call returns.
+    totals = BatchTotals()
+    started = {}
+
+    def run(index, messages):
+        started[index] = time.monotonic()
+        return complete(messages)
+
+    futures = {pool.submit(run, index, messages): index for index, (_, messages) in enumerate(items)}
+    pending = set(futures)
+    try:
+        while pending:
+            now = time.monotonic()
+            deadlines = [started[futures[f]] + timeout for f in pending if futures[f] in started]
+            wait_for = min(deadlines) - now if deadlines else 1.0
+            done, pending = wait(pending, timeout=max(0.0, min(wait_for, 1.0)), return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures[future]
+                try:
+                    yield totals.line(index, items[index][0], result=future.result())
+                except Exception as e:
+                    yield totals.line(index, items[index][0], error=str(e))
+            now = time.monotonic()
+            for future in [f for f in pending if futures[f] in started and now - started[futures[f]] >= timeout]:
+                pending.discard(future)
+                index = futures[future]
+                yield totals.line(index, items[index][0], error=f'timed out after {timeout}s')
+    finally:
+        # The client went away: drop the conversations that have not started
+        for future in pending:
+            future.cancel()
+    yield totals.summary()
+
+async def arun_batch(items, complete, semaphore, timeout):
+    totals = BatchTotals()
+
+    async def run(index, messages):
+        async with semaphore:
+            try:
+                result = await asyncio.wait_for(complete(messages), timeout)
+                return totals.line(index, items[index][0], result=result)
+            except asyncio.TimeoutError:
+                return totals.line(index, items[index][0], error=f'timed out after {timeout}s')
+            except Exception as e:
+                return totals.line(index, items[index][0], error=str(e))
+
+    tasks = [asyncio.ensure_future(run(index, messages)) for index, (_, messages) in enumerate(items)]
+    try:
+        for next_line in asyncio.as_completed(tasks):
+            yield await next_line
+    finally:
+        for task in tasks:
+            task.cancel()
+    yield totals.summary()
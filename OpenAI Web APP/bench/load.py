@@ -0,0 +1,131 @@
+# Closed-loop load generator for the chat service. Each concurrency level
+# runs --requests requests from that many workers and reports throughput,
+# latency percentiles and time-to-first-token (for /chat/stream).
+#
+#   python bench/load.py --url http://127.0.0.1:5000 --endpoint stream \
+#       --concurrency 1 8 32 128 --history 2 20 100 --requests 200
+#
+# Conversations are unique per request unless --repeat is given, so the
+# response cache and request coalescing don't hide the upstream cost.
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import httpx
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def conversation(history, words, repeat):
+    messages = []
+    for i in range(history - 1):
+        role = 'user' if i % 2 == 0 else 'assistant'
+        messages.append({'role': role, 'content': ' '.join(['lorem'] * words)})
+    nonce = '' if repeat else f' [{uuid.uuid4().hex}]'
+    messages.append({'role': 'user', 'content': 'Benchmark question' + nonce})
+    return messages
+
+async def blocking_request(client, url, messages):
+    response = await client.post(url + '/chat', json={'messages': messages})
+    response.raise_for_status()
+    response.json()
+    return None
+
+async def streaming_request(client, url, messages):
+    first_token = None
+    started = time.perf_counter()
+    async with client.stream('POST', url + '/chat/stream', json={'messages': messages}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith('event: delta') and first_token is None:
+                first_token = time.perf_counter() - started
+            elif line.startswith('event: error'):
+                raise RuntimeError('stream reported an error')
+    return first_token
+
+async def run_level(args, concurrency, history):
+    send = streaming_request if args.endpoint == 'stream' else blocking_request
+    latencies = []
+    first_tokens = []
+    errors = 0
+    remaining = args.requests
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                messages = conversation(history, args.words, args.repeat)
+                started = time.perf_counter()
+                try:
+                    first_token = await send(client, args.url, messages)
+                except Exception:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                if first_token is not None:
+                    first_tokens.append(first_token)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        'endpoint': args.endpoint,
+        'concurrency': concurrency,
+        'history': history,
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'throughput_rps': len(latencies) / elapsed if elapsed else 0.0,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p95': percentile(latencies, 95),
+        'latency_p99': percentile(latencies, 99),
+        'ttft_p50': percentile(first_tokens, 50),
+        'ttft_p95': percentile(first_tokens, 95),
+        'ttft_p99': percentile(first_tokens, 99)
+    }
+
+def format_row(result):
+    def ms(value):
+        return '-' if value is None else f'{value * 1000:.0f}'
+    return (
+        f"{result['concurrency']:>5} {result['history']:>7} {result['requests']:>6} {result['errors']:>6} "
+        f"{result['throughput_rps']:>8.1f} {ms(result['latency_p50']):>8} {ms(result['latency_p95']):>8} "
+        f"{ms(result['latency_p99']):>8} {ms(result['ttft_p50']):>8} {ms(result['ttft_p95']):>8} {ms(result['ttft_p99']):>8}"
+    )
+
+async def main():
+    parser = argparse.ArgumentParser(description='Load test the chat service')
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--endpoint', choices=['chat', 'stream'], default='chat')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--history', type=int, nargs='+', default=[2, 20], help='messages per conversation')
+    parser.add_argument('--words', type=int, default=50, help='words per history message')
+    parser.add_argument('--requests', type=int, default=100, help='requests per concurrency level')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--repeat', action='store_true', help='send identical conversations')
+    parser.add_argument('--json', help='write raw results to this file')
+    args = parser.parse_args()
+
+    print(f"{'conc':>5} {'history':>7} {'reqs':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'ttft50':>8} {'ttft95':>8} {'ttft99':>8}")
+    results = []
+    for history in args.history:
+        for concurrency in args.concurrency:
+            result = await run_level(args, concurrency, history)
+            results.append(result)
+            print(format_row(result), flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    asyncio.run(main())
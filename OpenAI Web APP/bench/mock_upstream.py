@@ -0,0 +1,142 @@
+# Local stand-in for the OpenAI chat-completions endpoint, for benchmarks
+# that must not touch the network. Point the app at it with:
+#
+#   python bench/mock_upstream.py --port 8900 --latency 0.8 --chunks 40
+#   OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=bench python app.py
+#
+# Blocking requests wait --latency seconds and return one completion.
+# Streaming requests wait --ttft seconds, then send --chunks deltas every
+# --chunk-interval seconds, and finish with a usage chunk when asked for.
+import argparse
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def usage(args, messages):
+    prompt_chars = sum(len(m.get('content') or '') for m in messages)
+    prompt_tokens = prompt_chars // 4 + 3 * len(messages)
+    completion_tokens = args.completion_tokens + args.reasoning_tokens
+    return {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+        'prompt_tokens_details': {'cached_tokens': 0, 'audio_tokens': 0},
+        'completion_tokens_details': {
+            'reasoning_tokens': args.reasoning_tokens,
+            'accepted_prediction_tokens': 0,
+            'rejected_prediction_tokens': 0,
+            'audio_tokens': 0
+        }
+    }
+
+def jittered(args, seconds):
+    return max(0.0, seconds * (1 + random.uniform(-args.jitter, args.jitter)))
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    args = None
+
+    def log_message(self, format, *log_args):
+        if self.args.verbose:
+            super().log_message(format, *log_args)
+
+    def do_POST(self):
+        if not self.path.endswith('/chat/completions'):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if random.random() < self.args.error_rate:
+            self.send_json(429, {'error': {'message': 'Mock rate limit', 'type': 'rate_limit_error'}})
+            return
+        if body.get('stream'):
+            self.stream(body)
+        else:
+            self.complete(body)
+
+    def base(self, body):
+        return {
+            'id': 'chatcmpl-' + uuid.uuid4().hex,
+            'created': int(time.time()),
+            'model': body.get('model', 'mock'),
+            'system_fingerprint': 'mock'
+        }
+
+    def complete(self, body):
+        time.sleep(jittered(self.args, self.args.latency))
+        words = ' '.join(['token'] * self.args.completion_tokens)
+        self.send_json(200, dict(
+            self.base(body),
+            object='chat.completion',
+            choices=[{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': words}
+            }],
+            usage=usage(self.args, body.get('messages', []))
+        ))
+
+    def stream(self, body):
+        time.sleep(jittered(self.args, self.args.ttft))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        # No Content-Length: the body ends when the connection closes
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        chunk = dict(self.base(body), object='chat.completion.chunk')
+        per_chunk = max(1, self.args.completion_tokens // self.args.chunks)
+        for i in range(self.args.chunks):
+            delta = {'content': 'token ' * per_chunk}
+            if i == 0:
+                delta['role'] = 'assistant'
+            self.send_event(dict(chunk, choices=[{'index': 0, 'delta': delta, 'finish_reason': None}]))
+            time.sleep(jittered(self.args, self.args.chunk_interval))
+        self.send_event(dict(chunk, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]))
+        if (body.get('stream_options') or {}).get('include_usage'):
+            self.send_event(dict(chunk, choices=[], usage=usage(self.args, body.get('messages', []))))
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.wfile.flush()
+
+    def send_event(self, data):
+        self.wfile.write(f'data: {json.dumps(data)}\n\n'.encode('utf-8'))
+        self.wfile.flush()
+
+    def send_json(self, status, data):
+        payload = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock OpenAI chat-completions server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=1.0, help='seconds before a blocking reply')
+    parser.add_argument('--ttft', type=float, default=0.3, help='seconds before the first streamed chunk')
+    parser.add_argument('--chunks', type=int, default=40, help='streamed content chunks per reply')
+    parser.add_argument('--chunk-interval', type=float, default=0.02, help='seconds between streamed chunks')
+    parser.add_argument('--completion-tokens', type=int, default=200)
+    parser.add_argument('--reasoning-tokens', type=int, default=300)
+    parser.add_argument('--jitter', type=float, default=0.1, help='relative +/- jitter on every delay')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 429')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    Handler.args = args
+    server = Server((args.host, args.port), Handler)
+    print(f'Mock upstream on http://{args.host}:{args.port}/v1')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('o200k_base')
+except Exception:
+    _encoding = None
+
+# Per-message framing tokens added by the chat format, and the tokens
+# that prime the assistant reply
+MESSAGE_OVERHEAD = 3
+REPLY_OVERHEAD = 3
+
+SUMMARY_PROMPT = (
+    "Summarize the earlier part of this conversation for your own future "
+    "reference. Keep facts, decisions, names, code identifiers and open "
+    "questions. Be concise and do not add commentary."
+)
+
+def count_tokens(text):
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    # Rough fallback when tiktoken is not installed
+    return (len(text) + 3) // 4
+
+def message_tokens(message):
+    return MESSAGE_OVERHEAD + count_tokens(message.get('role', '')) + count_tokens(message.get('content') or '')
+
+def prompt_tokens(messages):
+    return sum(message_tokens(m) for m in messages) + REPLY_OVERHEAD
+
+class ContextBudget:
+    # Strategies:
+    #   drop_oldest - drop the oldest non-system turns until under budget
+    #   last_n      - keep the system messages plus the last keep_turns turns
+    #   summarize   - replace turns older than the last keep_turns with a
+    #                 rolling summary, cached per conversation prefix
+    def __init__(self, max_tokens=16000, strategy='drop_oldest', keep_turns=10, summary_cache_size=256):
+        self.max_tokens = max_tokens
+        self.strategy = strategy
+        self.keep_turns = keep_turns
+        self.summaries = OrderedDict()
+        self.summary_cache_size = summary_cache_size
+        self.lock = threading.Lock()
+
+    def fit(self, messages, summarize=None):
+        before = prompt_tokens(messages)
+        if before <= self.max_tokens:
+            return messages, self._report(None, before, before)
+        if self.strategy == 'summarize' and summarize:
+            plan = self._summary_plan(messages)
+            if plan:
+                summary = plan['summary'] or summarize(plan['request'])
+                return self._finish_summary(messages, plan, summary, before)
+        return self._trim(messages, before)
+
+    async def afit(self, messages, summarize=None):
+        before = prompt_tokens(messages)
+        if before <= self.max_tokens:
+            return messages, self._report(None, before, before)
+        if self.strategy == 'summarize' and summarize:
+            plan = self._summary_plan(messages)
+            if plan:
+                summary = plan['summary'] or await summarize(plan['request'])
+                return self._finish_summary(messages, plan, summary, before)
+        return self._trim(messages, before)
+
+    def _trim(self, messages, before):
+        system, turns = split_system(messages)
+        strategy = 'drop_oldest'
+        if self.strategy == 'last_n':
+            strategy = 'last_n'
+            turns = turns[-self.keep_turns:]
+        kept = keep_in_order(messages, system + self._fit_turns(messages, system, turns))
+        return kept, self._report(strategy, before, prompt_tokens(kept))
+
+    def _fit_turns(self, messages, system, turns, extra=()):
+        # Indexes of the turns drop_oldest keeps
+        kept = drop_oldest(
+            [messages[i] for i in system] + list(extra),
+            [messages[i] for i in turns],
+            self.max_tokens
+        )
+        return turns[len(turns) - len(kept):]
+
+    def _summary_plan(self, messages):
+        system, turns = split_system(messages)
+        older, recent = turns[:-self.keep_turns], turns[-self.keep_turns:]
+        if not older:
+            return None
+        # Hash every prefix of the older turns so a summary cached for an
+        # earlier prefix can be extended instead of recomputed
+        digest = hashlib.sha256()
+        prefix_keys = []
+        for message in (messages[i] for i in older):
+            digest.update(json.dumps(message, sort_keys=True).encode('utf-8'))
+            prefix_keys.append(digest.hexdigest())
+        key = prefix_keys[-1]
+        with self.lock:
+            if key in self.summaries:
+                self.summaries.move_to_end(key)
+                return {'key': key, 'system': system, 'older': older, 'recent': recent, 'summary': self.summaries[key]}
+            previous, start = None, 0
+            for i in range(len(prefix_keys) - 2, -1, -1):
+                if prefix_keys[i] in self.summaries:
+                    previous, start = self.summaries[prefix_keys[i]], i + 1
+                    break
+        transcript = '\n\n'.join(f"{messages[i]['role']}: {messages[i].get('content') or ''}" for i in older[start:])
+        if previous:
+            transcript = f"Summary so far:\n{previous}\n\nNew turns:\n{transcript}"
+        return {
+            'key': key,
+            'system': system,
+            'older': older,
+            'recent': recent,
+            'summary': None,
+            'request': [
+                {'role': 'system', 'content': SUMMARY_PROMPT},
+                {'role': 'user', 'content': transcript}
+            ]
+        }
+
+    def _finish_summary(self, messages, plan, summary, before):
+        with self.lock:
+            self.summaries[plan['key']] = summary
+            self.summaries.move_to_end(plan['key'])
+            while len(self.summaries) > self.summary_cache_size:
+                self.summaries.popitem(last=False)
+        # The summary takes the place of the first turn it condenses
+        summary = {'role': 'system', 'content': f"Summary of the earlier conversation:\n{summary}"}
+        recent = self._fit_turns(messages, plan['system'], plan['recent'], [summary])
+        kept = keep_in_order(messages, plan['system'] + recent, {plan['older'][0]: summary})
+        return kept, self._report('summarize', before, prompt_tokens(kept))
+
+    def _report(self, strategy, before, after):
+        return {
+            'strategy': strategy,
+            'max_prompt_tokens': self.max_tokens,
+            'prompt_tokens': after,
+            'tokens_saved': before - after
+        }
+
+def split_system(messages):
+    # Indexes of the system messages and of the turns, so whatever is kept
+    # can be put back in the order it was sent
+    system = [i for i, m in enumerate(messages) if m.get('role') in ('system', 'developer')]
+    turns = [i for i, m in enumerate(messages) if m.get('role') not in ('system', 'developer')]
+    return system, turns
+
+def keep_in_order(messages, kept, inserted=None):
+    kept = set(kept)
+    inserted = inserted or {}
+    result = []
+    for i, message in enumerate(messages):
+        if i in inserted:
+            result.append(inserted[i])
+        if i in kept:
+            result.append(message)
+    return result
+
+def drop_oldest(system, turns, max_tokens):
+    # Keep the longest suffix of turns that fits; always keep the last turn
+    remaining = max_tokens - prompt_tokens(system)
+    start = len(turns)
+    while start > 0:
+        cost = message_tokens(turns[start - 1])
+        if remaining - cost < 0 and start < len(turns):
+            break
+        remaining -= cost
+        start -= 1
+    return turns[start:]
+
+def make_budget():
+    # CONTEXT_STRATEGY: drop_oldest (default), last_n, summarize, or off
+    strategy = os.getenv('CONTEXT_STRATEGY', 'drop_oldest')
+    if strategy == 'off':
+        return None
+    return ContextBudget(
+        max_tokens=int(os.getenv('CONTEXT_MAX_TOKENS', '16000')),
+        strategy=strategy,
+        keep_turns=int(os.getenv('CONTEXT_KEEP_TURNS', '10'))
+    )
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+def cache_key(model, messages):
+    # Canonical JSON so key order and whitespace don't change the hash
+    canonical = json.dumps(
+        {'model': model, 'messages': messages},
+        sort_keys=True,
+        separators=(',', ':'),
+        ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class Cache:
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self._get(key, time.time())
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self._set(key, value, time.time())
+
+    # Only the disk cache holds a connection that must be reopened after a fork
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def stats(self):
+        with self.lock:
+            size = self._size()
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self).__name__,
+            'size': size,
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+class MemoryCache(Cache):
+    def __init__(self, max_size=1024, ttl=300):
+        super().__init__(max_size, ttl)
+        self.entries = OrderedDict()
+
+    def _get(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if now - stored_at > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def _set(self, key, value, now):
+        self.entries[key] = (now, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def _size(self):
+        return len(self.entries)
+
+class DiskCache(Cache):
+    def __init__(self, path='chat_cache.sqlite3', max_size=1024, ttl=300):
+        super().__init__(max_size, ttl)
+        self.path = path
+        self.db = None
+        self.connect()
+
+    def connect(self):
+        with self.lock:
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value TEXT, stored_at REAL, used_at REAL)'
+            )
+            self.db.execute('CREATE INDEX IF NOT EXISTS cache_used_at ON cache (used_at)')
+            self.db.commit()
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+    def _get(self, key, now):
+        row = self.db.execute(
+            'SELECT value, stored_at FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, stored_at = row
+        if now - stored_at > self.ttl:
+            self.db.execute('DELETE FROM cache WHERE key = ?', (key,))
+            self.db.commit()
+            return None
+        self.db.execute('UPDATE cache SET used_at = ? WHERE key = ?', (now, key))
+        self.db.commit()
+        return json.loads(value)
+
+    def _set(self, key, value, now):
+        self.db.execute(
+            'INSERT OR REPLACE INTO cache (key, value, stored_at, used_at) VALUES (?, ?, ?, ?)',
+            (key, json.dumps(value), now, now)
+        )
+        # Evict least recently used rows beyond max_size
+        self.db.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_size,)
+        )
+        self.db.commit()
+
+    def _size(self):
+        return self.db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+def make_cache():
+    # CHAT_CACHE_BACKEND: memory (default), disk, or off
+    backend = os.getenv('CHAT_CACHE_BACKEND', 'memory')
+    max_size = int(os.getenv('CHAT_CACHE_SIZE', '1024'))
+    ttl = float(os.getenv('CHAT_CACHE_TTL', '300'))
+    if backend == 'off':
+        return None
+    if backend == 'disk':
+        return DiskCache(os.getenv('CHAT_CACHE_PATH', 'chat_cache.sqlite3'), max_size, ttl)
+    return MemoryCache(max_size, ttl)
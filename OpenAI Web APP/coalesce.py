@@ -0,0 +1,163 @@
+import asyncio
+import threading
+
+# Single-flight deduplication: identical requests that arrive while the
+# first one is still in flight wait on its result instead of calling
+# upstream again. Streams are run by one producer and replayed to every
+# subscriber from a shared buffer, so late joiners still see every delta.
+
+class Broadcast:
+    def __init__(self):
+        self.events = []
+        self.closed = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def publish(self, event):
+        with self.cond:
+            self.events.append(event)
+            self.cond.notify_all()
+
+    def close(self, error=None):
+        with self.cond:
+            self.error = error
+            self.closed = True
+            self.cond.notify_all()
+
+    def subscribe(self):
+        i = 0
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: i < len(self.events) or self.closed)
+                batch = self.events[i:]
+                closed = self.closed
+            i += len(batch)
+            yield from batch
+            if closed:
+                break
+        if self.error:
+            raise self.error
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.streams = {}
+
+    def do(self, key, fn):
+        with self.lock:
+            flight = self.calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.calls[key] = Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            flight.done.set()
+
+    def stream(self, key, make_events):
+        # The producer runs on its own thread so a disconnecting client
+        # never stalls the others waiting on the same stream
+        with self.lock:
+            broadcast = self.streams.get(key)
+            if broadcast is None:
+                broadcast = self.streams[key] = Broadcast()
+                threading.Thread(
+                    target=self._pump, args=(key, broadcast, make_events), daemon=True
+                ).start()
+        return broadcast.subscribe()
+
+    def _pump(self, key, broadcast, make_events):
+        error = None
+        try:
+            for event in make_events():
+                broadcast.publish(event)
+        except Exception as e:
+            error = e
+        finally:
+            with self.lock:
+                del self.streams[key]
+            broadcast.close(error)
+
+class AsyncBroadcast:
+    def __init__(self):
+        self.events = []
+        self.closed = False
+        self.error = None
+        self.cond = asyncio.Condition()
+        self.task = None
+
+    async def publish(self, event):
+        async with self.cond:
+            self.events.append(event)
+            self.cond.notify_all()
+
+    async def close(self, error=None):
+        async with self.cond:
+            self.error = error
+            self.closed = True
+            self.cond.notify_all()
+
+    async def subscribe(self):
+        i = 0
+        while True:
+            async with self.cond:
+                await self.cond.wait_for(lambda: i < len(self.events) or self.closed)
+                batch = self.events[i:]
+                closed = self.closed
+            i += len(batch)
+            for event in batch:
+                yield event
+            if closed:
+                break
+        if self.error:
+            raise self.error
+
+class AsyncSingleFlight:
+    def __init__(self):
+        self.calls = {}
+        self.streams = {}
+
+    async def do(self, key, fn):
+        # Run the call as its own task and shield it, so a cancelled
+        # caller doesn't cancel the result the others are waiting on
+        task = self.calls.get(key)
+        if task is None:
+            task = self.calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+        return await asyncio.shield(task)
+
+    def stream(self, key, make_events):
+        broadcast = self.streams.get(key)
+        if broadcast is None:
+            broadcast = self.streams[key] = AsyncBroadcast()
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, make_events))
+        return broadcast.subscribe()
+
+    async def _pump(self, key, broadcast, make_events):
+        error = None
+        try:
+            async for event in make_events():
+                await broadcast.publish(event)
+        except Exception as e:
+            error = e
+        finally:
+            self.streams.pop(key, None)
+            await broadcast.close(error)
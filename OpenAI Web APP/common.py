@@ -0,0 +1,31 @@
+import json
+
+MODEL = "o3-mini"
+
+def usage_to_dict(usage, context=None):
+    # Convert CompletionTokensDetails to dictionary
+    details = usage.completion_tokens_details
+    completion_tokens_details = {
+        'reasoning_tokens': getattr(details, 'reasoning_tokens', 0) or 0,
+        'accepted_prediction_tokens': getattr(details, 'accepted_prediction_tokens', 0) or 0,
+        'rejected_prediction_tokens': getattr(details, 'rejected_prediction_tokens', 0) or 0
+    }
+    
+    # Prompt tokens served from the upstream prompt cache
+    prompt_details = getattr(usage, 'prompt_tokens_details', None)
+    prompt_tokens_details = {
+        'cached_tokens': getattr(prompt_details, 'cached_tokens', 0) or 0
+    }
+    
+    result = {
+        'total_tokens': usage.total_tokens,
+        'prompt_tokens': getattr(usage, 'prompt_tokens', 0) or 0,
+        'completion_tokens_details': completion_tokens_details,
+        'prompt_tokens_details': prompt_tokens_details
+    }
+    if context:
+        result['context_budget'] = context
+    return result
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,166 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+def parse_messages(messages):
+    # Stored turns are plain {'role', 'content'} strings
+    if not isinstance(messages, list):
+        raise ValueError('messages must be a list')
+    parsed = []
+    for message in messages:
+        if not (isinstance(message, dict) and isinstance(message.get('role'), str) and isinstance(message.get('content'), str)):
+            raise ValueError('each message must be an object with a string role and content')
+        parsed.append({'role': message['role'], 'content': message['content']})
+    return parsed
+
+def parse_turn(content):
+    # The user turn posted to an existing conversation
+    if not isinstance(content, str):
+        raise ValueError('content must be a string')
+    return {'role': 'user', 'content': content}
+
+def parse_title(title):
+    if title is not None and not isinstance(title, str):
+        raise ValueError('title must be a string')
+    return title or 'Untitled Chat'
+
+class ConversationStore:
+    # Messages are stored one row per turn, so appending a turn never
+    # rewrites the rest of the history.
+    def __init__(self, path='conversations.sqlite3'):
+        self.path = path
+        self.db = None
+        self.lock = threading.Lock()
+        self.connect()
+
+    def connect(self):
+        with self.lock:
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+            self.db.executescript('''
+                PRAGMA journal_mode = WAL;
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id TEXT PRIMARY KEY,
+                    title TEXT,
+                    usage TEXT,
+                    created_at REAL,
+                    updated_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS messages (
+                    conversation_id TEXT,
+                    seq INTEGER,
+                    role TEXT,
+                    content TEXT,
+                    PRIMARY KEY (conversation_id, seq)
+                );
+                CREATE INDEX IF NOT EXISTS conversations_updated
+                    ON conversations (updated_at, id);
+            ''')
+
+    def close(self):
+        # A connection must not be used on both sides of a fork
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+    def ping(self):
+        with self.lock:
+            return self.db.execute('SELECT 1').fetchone() == (1,)
+
+    def create(self, title=None, messages=()):
+        conversation_id = uuid.uuid4().hex
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                'INSERT INTO conversations (id, title, usage, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (conversation_id, title or 'Untitled Chat', '{}', now, now)
+            )
+            self._insert(conversation_id, 0, messages)
+            self.db.commit()
+        return {'id': conversation_id, 'title': title or 'Untitled Chat', 'updated_at': now}
+
+    def list(self, limit=None, before=None, before_id=''):
+        # Most recently updated first. Pages continue after the
+        # (updated_at, id) of the previous page's last row.
+        query = 'SELECT id, title, updated_at FROM conversations'
+        params = []
+        if before is not None:
+            query += ' WHERE updated_at < ? OR (updated_at = ? AND id < ?)'
+            params += [before, before, before_id]
+        query += ' ORDER BY updated_at DESC, id DESC'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with self.lock:
+            rows = self.db.execute(query, params).fetchall()
+        return [{'id': row[0], 'title': row[1], 'updated_at': row[2]} for row in rows]
+
+    def get(self, conversation_id):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT title, usage, updated_at FROM conversations WHERE id = ?', (conversation_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            messages = self._messages(conversation_id)
+        return {
+            'id': conversation_id,
+            'title': row[0],
+            'usage': json.loads(row[1]),
+            'updated_at': row[2],
+            'messages': messages
+        }
+
+    def messages(self, conversation_id):
+        with self.lock:
+            if not self._exists(conversation_id):
+                return None
+            return self._messages(conversation_id)
+
+    def append(self, conversation_id, messages, usage=None):
+        with self.lock:
+            seq = self.db.execute(
+                'SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE conversation_id = ?',
+                (conversation_id,)
+            ).fetchone()[0]
+            self._insert(conversation_id, seq, messages)
+            self.db.execute(
+                'UPDATE conversations SET updated_at = ?, usage = COALESCE(?, usage) WHERE id = ?',
+                (time.time(), json.dumps(usage) if usage else None, conversation_id)
+            )
+            self.db.commit()
+
+    def rename(self, conversation_id, title):
+        with self.lock:
+            cursor = self.db.execute(
+                'UPDATE conversations SET title = ? WHERE id = ?', (title, conversation_id)
+            )
+            self.db.commit()
+        return cursor.rowcount > 0
+
+    def delete(self, conversation_id):
+        with self.lock:
+            cursor = self.db.execute('DELETE FROM conversations WHERE id = ?', (conversation_id,))
+            self.db.execute('DELETE FROM messages WHERE conversation_id = ?', (conversation_id,))
+            self.db.commit()
+        return cursor.rowcount > 0
+
+    def _exists(self, conversation_id):
+        return self.db.execute(
+            'SELECT 1 FROM conversations WHERE id = ?', (conversation_id,)
+        ).fetchone() is not None
+
+    def _messages(self, conversation_id):
+        rows = self.db.execute(
+            'SELECT role, content FROM messages WHERE conversation_id = ? ORDER BY seq',
+            (conversation_id,)
+        ).fetchall()
+        return [{'role': role, 'content': content} for role, content in rows]
+
+    def _insert(self, conversation_id, seq, messages):
+        self.db.executemany(
+            'INSERT INTO messages (conversation_id, seq, role, content) VALUES (?, ?, ?, ?)',
+            [(conversation_id, seq + i, m['role'], m['content']) for i, m in enumerate(messages)]
+        )
@@ -0,0 +1,84 @@
+# Production launcher. From this directory:
+#
+#   gunicorn                      # Flask app (app:app), threaded workers
+#   WEB_APP=asgi:app gunicorn     # Quart app on uvicorn workers
+#
+# The app is imported once in the master before forking (preload), so
+# load_dotenv(), the OpenAI client, tiktoken's tables and the bundled
+# assets are set up once and shared copy-on-write. SQLite connections are
+# closed before each fork and reopened in the worker (lifecycle.py).
+#
+# Each worker has its own response cache, request coalescing, metrics
+# and upstream admission limits, so prefer a few workers with many
+# threads, and divide UPSTREAM_RPM/UPSTREAM_TPM by the worker count.
+import multiprocessing
+import os
+import signal
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+wsgi_app = os.getenv('WEB_APP', 'app:app')
+bind = os.getenv('WEB_BIND', '0.0.0.0:' + os.getenv('PORT', '8000'))
+workers = int(os.getenv('WEB_CONCURRENCY', str(min(4, multiprocessing.cpu_count()))))
+# Each streaming completion holds a thread for its whole duration
+threads = int(os.getenv('WEB_THREADS', '32'))
+worker_class = os.getenv(
+    'WEB_WORKER_CLASS',
+    'uvicorn.workers.UvicornWorker' if wsgi_app.startswith('asgi') else 'gthread'
+)
+preload_app = os.getenv('WEB_PRELOAD', '1') == '1'
+
+# Idle keep-alive connections cost a socket, not a thread, under gthread.
+# Keep this above the idle timeout of any proxy in front (60s on most),
+# or it will reuse connections the server has already closed.
+keepalive = int(os.getenv('WEB_KEEPALIVE', '75'))
+# Silence before a worker is considered hung, not a request time limit
+timeout = int(os.getenv('WEB_TIMEOUT', '120'))
+# How long a stopping worker may spend finishing in-flight completions;
+# reasoning replies can take minutes
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '180'))
+# Recycle workers now and then (0 disables)
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.getenv('WEB_ACCESS_LOG') or None
+loglevel = os.getenv('WEB_LOG_LEVEL', 'info')
+
+def pre_fork(server, worker):
+    from lifecycle import lifecycle
+    lifecycle.before_fork()
+
+def post_fork(server, worker):
+    from lifecycle import lifecycle
+    lifecycle.after_fork()
+
+def post_worker_init(worker):
+    # Fail readiness as soon as the worker is asked to stop, then let the
+    # worker's own handling stop accepting and wait out in-flight requests
+    from lifecycle import lifecycle
+
+    if type(worker).__module__.startswith('uvicorn'):
+        # Uvicorn workers reset the signal handlers and install their own
+        # once serving starts, replacing any set here, so hook the server's
+        # exit handler instead, which is what SIGTERM ends up calling
+        from uvicorn.server import Server
+        handle_exit = Server.handle_exit
+
+        def drain_on_exit(self, sig, frame):
+            lifecycle.drain()
+            handle_exit(self, sig, frame)
+
+        Server.handle_exit = drain_on_exit
+        return
+
+    stop = signal.getsignal(signal.SIGTERM)
+
+    def drain(signum, frame):
+        lifecycle.drain()
+        if callable(stop):
+            stop(signum, frame)
+
+    signal.signal(signal.SIGTERM, drain)
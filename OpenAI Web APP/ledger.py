@@ -0,0 +1,269 @@
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+# Usage accounting per API key, or per client address for callers without
+# a known key. Keys are only trusted when they are listed in LEDGER_API_KEYS
+# or registered in the api_keys table (python ledger.py add-key KEY), so a
+# made-up key cannot buy a fresh quota. Behind a proxy, set
+# LEDGER_TRUSTED_PROXIES to the number of proxies so the client address is
+# read from X-Forwarded-For instead of being the proxy's.
+# Every upstream-billed completion is appended to usage_events. Alongside,
+# rolling-window aggregates are kept incrementally: each event is added to
+# one bucket per window (minute buckets for the hour, hourly for the day,
+# daily for the month), so the spend of a window is a sum over a fixed
+# number of buckets, however long the ledger grows. The buckets live in
+# SQLite too, so every worker process sees the same totals.
+#
+# Quotas cap total tokens per window: LEDGER_TOKENS_PER_HOUR/DAY/MONTH
+# for everyone (0 = unlimited), with per-account overrides in the quotas
+# table. They are checked before the upstream call; a request already
+# running when a quota is reached is allowed to finish.
+
+# name: (length, bucket size) in seconds
+WINDOWS = {
+    'hour': (3600, 60),
+    'day': (86400, 3600),
+    'month': (30 * 86400, 86400)
+}
+
+PRUNE_EVERY = 1000
+
+class QuotaExceeded(Exception):
+    def __init__(self, window, limit, retry_after):
+        super().__init__(f'token quota of {limit} per {window} exceeded')
+        self.window = window
+        self.limit = limit
+        self.retry_after = retry_after
+
+def hash_key(api_key):
+    # Keys are only ever stored hashed
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+def request_key(headers):
+    # The key from X-API-Key or a bearer token
+    authorization = headers.get('Authorization', '')
+    return headers.get('X-API-Key') or (authorization[7:].strip() if authorization.startswith('Bearer ') else '')
+
+def client_address(headers, remote_addr, trusted_proxies=0):
+    # Each trusted proxy appends the address it saw, so the client is that
+    # many entries from the right; anything further left is client-supplied
+    if trusted_proxies:
+        hops = [hop.strip() for hop in headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+        if len(hops) >= trusted_proxies:
+            return hops[-trusted_proxies]
+    return remote_addr or 'unknown'
+
+class Ledger:
+    def __init__(self, path='usage.sqlite3', quotas=None, api_keys=(), trusted_proxies=0):
+        self.path = path
+        # Default token limit per window name; missing or 0 is unlimited
+        self.quotas = {name: limit for name, limit in (quotas or {}).items() if limit}
+        self.api_keys = {hash_key(key) for key in api_keys}
+        self.trusted_proxies = trusted_proxies
+        self.writes = 0
+        self.db = None
+        self.lock = threading.Lock()
+        self.connect()
+
+    def connect(self):
+        with self.lock:
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+            self.db.executescript('''
+                PRAGMA journal_mode = WAL;
+                CREATE TABLE IF NOT EXISTS usage_events (
+                    id INTEGER PRIMARY KEY,
+                    account TEXT,
+                    at REAL,
+                    endpoint TEXT,
+                    model TEXT,
+                    prompt_tokens INTEGER,
+                    cached_tokens INTEGER,
+                    total_tokens INTEGER,
+                    reasoning_tokens INTEGER
+                );
+                CREATE TABLE IF NOT EXISTS usage_buckets (
+                    account TEXT,
+                    span INTEGER,
+                    start INTEGER,
+                    requests INTEGER,
+                    total_tokens INTEGER,
+                    reasoning_tokens INTEGER,
+                    PRIMARY KEY (account, span, start)
+                );
+                CREATE INDEX IF NOT EXISTS usage_buckets_expiry ON usage_buckets (span, start);
+                CREATE TABLE IF NOT EXISTS usage_totals (
+                    account TEXT PRIMARY KEY,
+                    requests INTEGER,
+                    prompt_tokens INTEGER,
+                    cached_tokens INTEGER,
+                    total_tokens INTEGER,
+                    reasoning_tokens INTEGER,
+                    first_at REAL,
+                    last_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS quotas (
+                    account TEXT,
+                    window TEXT,
+                    tokens INTEGER,
+                    PRIMARY KEY (account, window)
+                );
+                CREATE TABLE IF NOT EXISTS api_keys (
+                    key_hash TEXT PRIMARY KEY,
+                    label TEXT,
+                    created_at REAL
+                );
+            ''')
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+    def register_key(self, api_key, label=''):
+        key_hash = hash_key(api_key)
+        with self.lock:
+            self.db.execute(
+                'INSERT OR REPLACE INTO api_keys (key_hash, label, created_at) VALUES (?, ?, ?)',
+                (key_hash, label, time.time())
+            )
+            self.db.commit()
+        return 'key:' + key_hash
+
+    def known_key(self, key_hash):
+        if key_hash in self.api_keys:
+            return True
+        with self.lock:
+            return self.db.execute('SELECT 1 FROM api_keys WHERE key_hash = ?', (key_hash,)).fetchone() is not None
+
+    def account(self, headers, remote_addr):
+        # Unknown keys are ignored, so their callers share their address's quota
+        api_key = request_key(headers)
+        if api_key:
+            key_hash = hash_key(api_key)
+            if self.known_key(key_hash):
+                return 'key:' + key_hash
+        return 'addr:' + client_address(headers, remote_addr, self.trusted_proxies)
+
+    def record(self, account, endpoint, model, usage, now=None):
+        now = time.time() if now is None else now
+        prompt = usage.get('prompt_tokens', 0)
+        cached = usage.get('prompt_tokens_details', {}).get('cached_tokens', 0)
+        total = usage['total_tokens']
+        reasoning = usage['completion_tokens_details']['reasoning_tokens']
+        with self.lock:
+            self.db.execute(
+                'INSERT INTO usage_events (account, at, endpoint, model, prompt_tokens, cached_tokens, total_tokens, reasoning_tokens) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (account, now, endpoint, model, prompt, cached, total, reasoning)
+            )
+            self.db.executemany(
+                'INSERT INTO usage_buckets (account, span, start, requests, total_tokens, reasoning_tokens) VALUES (?, ?, ?, 1, ?, ?) '
+                'ON CONFLICT (account, span, start) DO UPDATE SET requests = requests + 1, '
+                'total_tokens = total_tokens + excluded.total_tokens, reasoning_tokens = reasoning_tokens + excluded.reasoning_tokens',
+                [(account, span, int(now // span * span), total, reasoning) for _, span in WINDOWS.values()]
+            )
+            self.db.execute(
+                'INSERT INTO usage_totals (account, requests, prompt_tokens, cached_tokens, total_tokens, reasoning_tokens, first_at, last_at) '
+                'VALUES (?, 1, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (account) DO UPDATE SET requests = requests + 1, '
+                'prompt_tokens = prompt_tokens + excluded.prompt_tokens, cached_tokens = cached_tokens + excluded.cached_tokens, '
+                'total_tokens = total_tokens + excluded.total_tokens, reasoning_tokens = reasoning_tokens + excluded.reasoning_tokens, '
+                'last_at = excluded.last_at',
+                (account, prompt, cached, total, reasoning, now, now)
+            )
+            self.writes += 1
+            if self.writes % PRUNE_EVERY == 0:
+                # Buckets that have left their window are never read again
+                for length, span in WINDOWS.values():
+                    self.db.execute('DELETE FROM usage_buckets WHERE span = ? AND start <= ?', (span, now - length))
+            self.db.commit()
+
+    def _window(self, account, length, span, now):
+        return self.db.execute(
+            'SELECT COALESCE(SUM(requests), 0), COALESCE(SUM(total_tokens), 0), COALESCE(SUM(reasoning_tokens), 0), MIN(start) '
+            'FROM usage_buckets WHERE account = ? AND span = ? AND start > ?',
+            (account, span, now - length)
+        ).fetchone()
+
+    def limits(self, account):
+        with self.lock:
+            rows = self.db.execute('SELECT window, tokens FROM quotas WHERE account = ?', (account,)).fetchall()
+        limits = dict(self.quotas)
+        for window, tokens in rows:
+            if tokens:
+                limits[window] = tokens
+            else:
+                limits.pop(window, None)
+        return limits
+
+    def check(self, account, now=None):
+        # Raises QuotaExceeded when any window's limit has been spent
+        limits = self.limits(account)
+        if not limits:
+            return
+        now = time.time() if now is None else now
+        for name, limit in limits.items():
+            if name not in WINDOWS:
+                continue
+            length, span = WINDOWS[name]
+            with self.lock:
+                _, total, _, oldest = self._window(account, length, span, now)
+            if total >= limit:
+                # Until the oldest bucket leaves the window
+                raise QuotaExceeded(name, limit, max(1, int(oldest + length - now + 1)))
+
+    def usage(self, account, now=None):
+        now = time.time() if now is None else now
+        limits = self.limits(account)
+        windows = {}
+        with self.lock:
+            for name, (length, span) in WINDOWS.items():
+                requests, total, reasoning, _ = self._window(account, length, span, now)
+                windows[name] = {
+                    'requests': requests,
+                    'total_tokens': total,
+                    'reasoning_tokens': reasoning,
+                    'limit': limits.get(name),
+                    'remaining': max(0, limits[name] - total) if name in limits else None
+                }
+            row = self.db.execute(
+                'SELECT requests, prompt_tokens, cached_tokens, total_tokens, reasoning_tokens, first_at, last_at '
+                'FROM usage_totals WHERE account = ?',
+                (account,)
+            ).fetchone()
+        totals = dict(zip(
+            ('requests', 'prompt_tokens', 'cached_tokens', 'total_tokens', 'reasoning_tokens', 'first_at', 'last_at'),
+            row or (0, 0, 0, 0, 0, None, None)
+        ))
+        return {'account': account, 'windows': windows, 'totals': totals}
+
+def make_ledger():
+    # LEDGER: on (default) or off
+    if os.getenv('LEDGER', 'on') == 'off':
+        return None
+    return Ledger(
+        os.getenv('LEDGER_DB', 'usage.sqlite3'),
+        quotas={
+            'hour': int(os.getenv('LEDGER_TOKENS_PER_HOUR', '0')),
+            'day': int(os.getenv('LEDGER_TOKENS_PER_DAY', '0')),
+            'month': int(os.getenv('LEDGER_TOKENS_PER_MONTH', '0'))
+        },
+        # LEDGER_API_KEYS: comma-separated keys accepted as account identities
+        api_keys=[key.strip() for key in os.getenv('LEDGER_API_KEYS', '').split(',') if key.strip()],
+        trusted_proxies=int(os.getenv('LEDGER_TRUSTED_PROXIES', '0'))
+    )
+
+if __name__ == '__main__':
+    # python ledger.py add-key KEY [LABEL]
+    if len(sys.argv) < 3 or sys.argv[1] != 'add-key':
+        sys.exit('usage: python ledger.py add-key KEY [LABEL]')
+    from dotenv import load_dotenv
+    load_dotenv()
+    ledger = Ledger(os.getenv('LEDGER_DB', 'usage.sqlite3'))
+    print(ledger.register_key(sys.argv[2], ' '.join(sys.argv[3:])))
+    ledger.close()
@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import Gauge
+
+# Worker process lifecycle under a preforking server (see gunicorn.conf.py).
+# Resources that must not cross a fork, such as SQLite connections, are
+# registered here: they are closed in the parent before each fork and
+# reopened in the worker. Once a worker is told to stop it reports itself
+# as draining on /healthz, so a load balancer stops sending it traffic
+# while the chat requests it is serving finish.
+
+REQUESTS_IN_FLIGHT = Gauge('chat_requests_in_flight', 'Chat requests being served by this worker')
+
+class Lifecycle:
+    def __init__(self):
+        self.started = time.time()
+        self.in_flight = 0
+        self.draining = False
+        self.closers = []
+        self.openers = []
+        self.lock = threading.Lock()
+
+    def on_fork(self, close, reopen):
+        self.closers.append(close)
+        self.openers.append(reopen)
+
+    def before_fork(self):
+        for close in self.closers:
+            close()
+
+    def after_fork(self):
+        self.started = time.time()
+        for reopen in self.openers:
+            reopen()
+
+    def drain(self):
+        self.draining = True
+
+    def _add(self, amount):
+        with self.lock:
+            self.in_flight += amount
+            REQUESTS_IN_FLIGHT.set(self.in_flight)
+
+    @contextmanager
+    def track(self):
+        self._add(1)
+        try:
+            yield
+        finally:
+            self._add(-1)
+
+    def stream(self, events):
+        # Counts a streamed response until it ends or the client goes away
+        with self.track():
+            yield from events
+
+    async def astream(self, events):
+        with self.track():
+            async for event in events:
+                yield event
+
+    def health(self, **checks):
+        # Each check returns a truthy value when ready, or raises
+        failed = {}
+        for name, check in checks.items():
+            try:
+                if not check():
+                    failed[name] = 'not ready'
+            except Exception as e:
+                failed[name] = str(e)
+        status = 'draining' if self.draining else 'unavailable' if failed else 'ok'
+        body = {
+            'status': status,
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.started, 1),
+            'in_flight': self.in_flight
+        }
+        if failed:
+            body['failed'] = failed
+        return status == 'ok', body
+
+lifecycle = Lifecycle()
@@ -0,0 +1,272 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+
+import openai
+from metrics import Counter, Gauge
+
+# Client-side admission for upstream calls: token buckets for requests and
+# tokens per minute, an AIMD concurrency cap that halves on 429s and grows
+# back slowly on success, and jittered exponential backoff on retryable
+# errors. Callers queue for at most max_wait before AdmissionTimeout.
+
+RETRIES = Counter('chat_upstream_retries_total', 'Upstream retries by error type', ('error',))
+CONCURRENCY_LIMIT = Gauge('chat_upstream_concurrency_limit', 'Current adaptive upstream concurrency limit')
+IN_FLIGHT = Gauge('chat_upstream_in_flight', 'Upstream calls currently in flight')
+
+RETRYABLE = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError
+)
+
+class AdmissionTimeout(Exception):
+    pass
+
+def is_overloaded(error):
+    return isinstance(error, openai.RateLimitError)
+
+def retry_after(error):
+    response = getattr(error, 'response', None)
+    try:
+        return float(response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    # Reservation style: reserve() debits immediately and returns how long
+    # the caller must wait, so sync and async callers can share a bucket
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, amount):
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+class AIMD:
+    def __init__(self, initial, minimum, maximum, decrease=0.5, cooldown=1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        CONCURRENCY_LIMIT.set(self.limit)
+
+    def _has_room(self):
+        return self.in_flight < int(self.limit)
+
+    def _adjust(self, overloaded):
+        self.in_flight -= 1
+        now = time.monotonic()
+        if overloaded:
+            # One decrease per cooldown, so a burst of 429s from the same
+            # window doesn't collapse the limit to the floor
+            if now - self.last_decrease >= self.cooldown:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                self.last_decrease = now
+        else:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        CONCURRENCY_LIMIT.set(self.limit)
+        IN_FLIGHT.set(self.in_flight)
+
+class AIMDLimiter(AIMD):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cond = threading.Condition()
+
+    def acquire(self, timeout):
+        with self.cond:
+            if not self.cond.wait_for(self._has_room, max(0.0, timeout)):
+                raise AdmissionTimeout('Upstream is saturated, try again shortly')
+            self.in_flight += 1
+            IN_FLIGHT.set(self.in_flight)
+
+    def release(self, overloaded=False):
+        with self.cond:
+            self._adjust(overloaded)
+            self.cond.notify_all()
+
+class AsyncAIMDLimiter(AIMD):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cond = asyncio.Condition()
+
+    async def acquire(self, timeout):
+        async with self.cond:
+            try:
+                await asyncio.wait_for(self.cond.wait_for(self._has_room), max(0.0, timeout))
+            except asyncio.TimeoutError:
+                raise AdmissionTimeout('Upstream is saturated, try again shortly')
+            self.in_flight += 1
+            IN_FLIGHT.set(self.in_flight)
+
+    async def release(self, overloaded=False):
+        async with self.cond:
+            self._adjust(overloaded)
+            self.cond.notify_all()
+
+class Gate:
+    def __init__(self, limiter, rpm, tpm, max_wait, max_retries, backoff_base, backoff_max):
+        self.limiter = limiter
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def reserve(self, tokens, deadline):
+        waits = [0.0]
+        if self.requests:
+            waits.append(self.requests.reserve(1))
+        if self.tokens:
+            waits.append(self.tokens.reserve(tokens))
+        wait = max(waits)
+        if time.monotonic() + wait > deadline:
+            self.refund(tokens, request=True)
+            raise AdmissionTimeout('Upstream rate limit reached, try again shortly')
+        return wait
+
+    def refund(self, tokens, request=False):
+        if self.tokens:
+            self.tokens.refund(tokens)
+        if request and self.requests:
+            self.requests.refund(1)
+
+    def settle(self, estimated, actual):
+        # Charge the token bucket for what the call really used
+        if self.tokens and actual is not None:
+            self.tokens.refund(estimated - actual)
+
+    def backoff(self, attempt, error):
+        hinted = retry_after(error)
+        if hinted is not None:
+            return min(self.backoff_max, hinted)
+        # Full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def should_retry(self, error, attempt, deadline):
+        if not isinstance(error, RETRYABLE) or attempt >= self.max_retries:
+            return None
+        delay = self.backoff(attempt, error)
+        # A retry that can't start before the deadline isn't attempted
+        if time.monotonic() + delay > deadline:
+            raise AdmissionTimeout('Upstream is overloaded, try again shortly') from error
+        RETRIES.inc(error=type(error).__name__)
+        return delay
+
+class UpstreamGate(Gate):
+    def _open(self, fn, tokens):
+        # One deadline covers queueing and every retry
+        attempt = 0
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            time.sleep(self.reserve(tokens, deadline))
+            try:
+                self.limiter.acquire(deadline - time.monotonic())
+            except AdmissionTimeout:
+                self.refund(tokens, request=True)
+                raise
+            try:
+                return fn()
+            except Exception as e:
+                self.limiter.release(is_overloaded(e))
+                self.refund(tokens)
+                delay = self.should_retry(e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    @contextmanager
+    def admit(self, fn, tokens):
+        # Holds a concurrency slot for the duration of the block, so a
+        # stream keeps its slot until it has been fully consumed
+        result = self._open(fn, tokens)
+        overloaded = False
+        try:
+            yield result
+        except Exception as e:
+            overloaded = is_overloaded(e)
+            raise
+        finally:
+            self.limiter.release(overloaded)
+
+    def call(self, fn, tokens):
+        with self.admit(fn, tokens) as result:
+            return result
+
+class AsyncUpstreamGate(Gate):
+    async def _open(self, fn, tokens):
+        # One deadline covers queueing and every retry
+        attempt = 0
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            await asyncio.sleep(self.reserve(tokens, deadline))
+            try:
+                await self.limiter.acquire(deadline - time.monotonic())
+            except AdmissionTimeout:
+                self.refund(tokens, request=True)
+                raise
+            try:
+                return await fn()
+            except Exception as e:
+                await self.limiter.release(is_overloaded(e))
+                self.refund(tokens)
+                delay = self.should_retry(e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    @asynccontextmanager
+    async def admit(self, fn, tokens):
+        result = await self._open(fn, tokens)
+        overloaded = False
+        try:
+            yield result
+        except Exception as e:
+            overloaded = is_overloaded(e)
+            raise
+        finally:
+            await self.limiter.release(overloaded)
+
+    async def call(self, fn, tokens):
+        async with self.admit(fn, tokens) as result:
+            return result
+
+def make_gate(asynchronous=False):
+    limiter_class = AsyncAIMDLimiter if asynchronous else AIMDLimiter
+    gate_class = AsyncUpstreamGate if asynchronous else UpstreamGate
+    limiter = limiter_class(
+        initial=int(os.getenv('UPSTREAM_INITIAL_CONCURRENCY', '16')),
+        minimum=int(os.getenv('UPSTREAM_MIN_CONCURRENCY', '1')),
+        maximum=int(os.getenv('UPSTREAM_MAX_CONCURRENCY', '128'))
+    )
+    return gate_class(
+        limiter,
+        rpm=int(os.getenv('UPSTREAM_RPM', '500')),
+        tpm=int(os.getenv('UPSTREAM_TPM', '2000000')),
+        max_wait=float(os.getenv('UPSTREAM_MAX_WAIT', '30')),
+        max_retries=int(os.getenv('UPSTREAM_MAX_RETRIES', '4')),
+        backoff_base=float(os.getenv('UPSTREAM_BACKOFF_BASE', '0.5')),
+        backoff_max=float(os.getenv('UPSTREAM_BACKOFF_MAX', '20'))
+    )
@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import threading
+import time
+
+# Minimal Prometheus-style metrics: counters, gauges and histograms,
+# rendered in the text exposition format served at /metrics.
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+
+registry = []
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self.lock:
+            return self.values.get(key, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{format_labels(self.labels, key)} {format_value(value)}')
+        return lines
+
+class Gauge:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+        registry.append(self)
+
+    def set(self, value):
+        self.value = value
+
+    def render(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge', f'{self.name} {format_value(self.value)}']
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, **labels):
+        # (bucket counts, sum, count) for one label set
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self.lock:
+            counts, total, count = self.values.get(key, [[0] * len(self.buckets), 0.0, 0])
+            return list(counts), total, count
+
+    def quantile(self, q, **labels):
+        # Upper bound of the bucket holding the q-th observation
+        counts, _, count = self.snapshot(**labels)
+        if not count:
+            return None
+        for bound, bucket_count in zip(self.buckets, counts):
+            if bucket_count >= q * count:
+                return bound
+        # Beyond the largest bucket
+        return None
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{format_labels(self.labels, key, [("le", bound)])} {bucket_count}')
+                lines.append(f'{self.name}_bucket{format_labels(self.labels, key, [("le", "+Inf")])} {count}')
+                lines.append(f'{self.name}_sum{format_labels(self.labels, key)} {format_value(total)}')
+                lines.append(f'{self.name}_count{format_labels(self.labels, key)} {count}')
+        return lines
+
+REQUESTS = Counter('chat_requests_total', 'Chat requests by endpoint and outcome', ('endpoint', 'outcome'))
+ERRORS = Counter('chat_errors_total', 'Failed chat requests by exception type', ('endpoint', 'exception'))
+TOKENS = Counter('chat_upstream_tokens_total', 'Tokens billed by upstream completions', ('kind',))
+REQUEST_SECONDS = Histogram('chat_request_duration_seconds', 'Total chat request latency', ('endpoint',))
+UPSTREAM_SECONDS = Histogram('chat_upstream_duration_seconds', 'Upstream completion latency', ('mode',))
+QUEUE_SECONDS = Histogram('chat_queue_duration_seconds', 'Time from request arrival to the upstream call', ('endpoint',))
+FIRST_TOKEN_SECONDS = Histogram('chat_time_to_first_token_seconds', 'Time from request arrival to the first streamed delta', ('endpoint',))
+
+request_log = logging.getLogger('chat.requests')
+if os.getenv('CHAT_REQUEST_LOG', '0') == '1':
+    request_log.setLevel(logging.INFO)
+    request_log.addHandler(logging.StreamHandler())
+    request_log.propagate = False
+
+def record_upstream(mode, seconds, usage):
+    UPSTREAM_SECONDS.observe(seconds, mode=mode)
+    if usage:
+        TOKENS.inc(usage['total_tokens'], kind='total')
+        TOKENS.inc(usage['completion_tokens_details']['reasoning_tokens'], kind='reasoning')
+        TOKENS.inc(usage['prompt_tokens'], kind='prompt')
+        TOKENS.inc(usage['prompt_tokens_details']['cached_tokens'], kind='cached')
+
+class Trace:
+    # Per-request timings, recorded into the histograms when finished
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.queue_seconds = None
+        self.first_token_seconds = None
+        self.model = None
+
+    def upstream_started(self):
+        self.queue_seconds = time.perf_counter() - self.started
+        QUEUE_SECONDS.observe(self.queue_seconds, endpoint=self.endpoint)
+
+    def first_token(self):
+        if self.first_token_seconds is None:
+            self.first_token_seconds = time.perf_counter() - self.started
+            FIRST_TOKEN_SECONDS.observe(self.first_token_seconds, endpoint=self.endpoint)
+
+    def finish(self, usage=None, cached=False, error=None):
+        elapsed = time.perf_counter() - self.started
+        outcome = 'error' if error else 'cached' if cached else 'ok'
+        REQUEST_SECONDS.observe(elapsed, endpoint=self.endpoint)
+        REQUESTS.inc(endpoint=self.endpoint, outcome=outcome)
+        if error:
+            ERRORS.inc(endpoint=self.endpoint, exception=type(error).__name__)
+        if request_log.isEnabledFor(logging.INFO):
+            request_log.info(json.dumps({
+                'endpoint': self.endpoint,
+                'outcome': outcome,
+                'model': self.model,
+                'seconds': round(elapsed, 4),
+                'queue_seconds': self.queue_seconds and round(self.queue_seconds, 4),
+                'first_token_seconds': self.first_token_seconds and round(self.first_token_seconds, 4),
+                'total_tokens': usage['total_tokens'] if usage else None,
+                'reasoning_tokens': usage['completion_tokens_details']['reasoning_tokens'] if usage else None,
+                'error': type(error).__name__ if error else None
+            }))
+
+def cache_lines(stats):
+    return [
+        '# HELP chat_cache_hits_total Response cache hits',
+        '# TYPE chat_cache_hits_total counter',
+        f"chat_cache_hits_total {stats['hits']}",
+        '# HELP chat_cache_misses_total Response cache misses',
+        '# TYPE chat_cache_misses_total counter',
+        f"chat_cache_misses_total {stats['misses']}",
+        '# HELP chat_cache_entries Response cache entries',
+        '# TYPE chat_cache_entries gauge',
+        f"chat_cache_entries {stats['size']}"
+    ]
+
+def render(extra=()):
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    lines.extend(extra)
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,340 @@
+import asyncio
+import os
+import time
+
+from budget import prompt_tokens
+from cache import cache_key
+from coalesce import SingleFlight, AsyncSingleFlight
+from common import usage_to_dict, sse
+from lifecycle import lifecycle
+from limiter import make_gate
+from metrics import Trace, record_upstream
+
+# The completion pipeline shared by app.py (Flask) and asgi.py (Quart):
+# assemble the prompt, fit it to the context budget, pick a model, then
+# answer from the cache, join an identical request already in flight, or
+# call upstream through the admission gate. Only the request that made
+# the upstream call is charged to its account in the ledger.
+
+class Pipeline:
+    def __init__(self, client, cache, budget, flights, gate, router, prompt, ledger, summary_model, completion_estimate):
+        self.client = client
+        self.cache = cache
+        self.budget = budget
+        self.flights = flights
+        self.gate = gate
+        self.router = router
+        self.prompt = prompt
+        self.ledger = ledger
+        self.summary_model = summary_model
+        self.completion_estimate = completion_estimate
+
+    def estimate_tokens(self, messages):
+        return prompt_tokens(messages) + self.completion_estimate
+
+    def route(self, messages, model, trace=None):
+        model, reason = self.router.choose(messages, model)
+        if trace:
+            trace.model = model
+        return model, reason, cache_key(model, messages)
+
+    def billable(self, account, usage):
+        return bool(self.ledger and account and usage)
+
+    def summary_request(self, messages):
+        return lambda: self.client.chat.completions.create(
+            model=self.summary_model,
+            messages=messages
+        )
+
+    def completion_request(self, model, messages, stream=False):
+        if stream:
+            return lambda: self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                stream_options={'include_usage': True}
+            )
+        return lambda: self.client.chat.completions.create(
+            model=model,
+            messages=messages
+        )
+
+    def result(self, response, model, context):
+        return {
+            'response': response.choices[0].message.content,
+            'model': model,
+            'usage': usage_to_dict(response.usage, context)
+        }
+
+    def upstream_finished(self, mode, model, started, usage):
+        seconds = time.perf_counter() - started
+        record_upstream(mode, seconds, usage)
+        self.router.record(model, seconds, usage)
+
+class ChatPipeline(Pipeline):
+    def summarize(self, messages, account=None):
+        tokens = self.estimate_tokens(messages)
+        started = time.perf_counter()
+        response = self.gate.call(self.summary_request(messages), tokens)
+        self.gate.settle(tokens, response.usage.total_tokens)
+        usage = usage_to_dict(response.usage)
+        record_upstream('summary', time.perf_counter() - started, usage)
+        if self.billable(account, usage):
+            self.ledger.record(account, 'summary', self.summary_model, usage)
+        return response.choices[0].message.content
+
+    def fit_context(self, messages, account=None):
+        # Trim or summarize long histories to the prompt token budget; a
+        # summary call is billed to the account whose history it condenses
+        if not self.budget:
+            return messages, None
+        return self.budget.fit(messages, lambda request: self.summarize(request, account))
+
+    def request_completion(self, key, model, messages, context, trace=None):
+        if trace:
+            trace.upstream_started()
+        tokens = self.estimate_tokens(messages)
+        started = time.perf_counter()
+        response = self.gate.call(self.completion_request(model, messages), tokens)
+        self.gate.settle(tokens, response.usage.total_tokens)
+        result = self.result(response, model, context)
+        self.upstream_finished('blocking', model, started, result['usage'])
+        if self.cache:
+            self.cache.set(key, result)
+        return result
+
+    def stream_events(self, key, model, messages, context, trace=None):
+        if trace:
+            trace.upstream_started()
+        tokens = self.estimate_tokens(messages)
+        started = time.perf_counter()
+        parts = []
+        usage = None
+        # The concurrency slot is held until the stream is fully consumed
+        with self.gate.admit(self.completion_request(model, messages, stream=True), tokens) as stream:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield ('delta', chunk.choices[0].delta.content)
+                if chunk.usage:
+                    usage = usage_to_dict(chunk.usage, context)
+                    yield ('usage', usage)
+        self.gate.settle(tokens, usage['total_tokens'] if usage else None)
+        self.upstream_finished('stream', model, started, usage)
+        if self.cache and usage:
+            self.cache.set(key, {'response': ''.join(parts), 'model': model, 'usage': usage})
+
+    def complete(self, messages, trace=None, model=None, account=None):
+        # Assembled first, so the budget counts the preamble and the cache
+        # key sees the same messages upstream does
+        messages, context = self.fit_context(self.prompt.assemble(messages), account)
+        model, reason, key = self.route(messages, model, trace)
+        cached = self.cache.get(key) if self.cache else None
+        if cached:
+            return dict(cached, cached=True)
+        # Identical in-flight requests share one upstream call. Only the request
+        # that made it is billed; the others get the result marked shared
+        calls = []
+        def call():
+            calls.append(True)
+            self.router.routed(model, reason)
+            return self.request_completion(key, model, messages, context, trace)
+        result = self.flights.do(key, call)
+        return result if calls else dict(result, shared=True)
+
+    def traced_complete(self, endpoint, messages, model=None, account=None):
+        trace = Trace(endpoint)
+        try:
+            with lifecycle.track():
+                result = self.complete(messages, trace, model, account)
+        except Exception as e:
+            trace.finish(error=e)
+            raise
+        trace.finish(result['usage'], cached=result.get('cached'))
+        if self.billable(account, result['usage']) and not (result.get('cached') or result.get('shared')):
+            self.ledger.record(account, endpoint, result['model'], result['usage'])
+        return result
+
+    def stream_completion(self, messages, trace, on_complete=None, model=None, account=None):
+        parts = []
+        usage = None
+        cached = None
+        calls = []
+        try:
+            messages, context = self.fit_context(self.prompt.assemble(messages), account)
+            model, reason, key = self.route(messages, model, trace)
+            yield sse('model', {'model': model})
+            cached = self.cache.get(key) if self.cache else None
+            if cached:
+                events = [('delta', cached['response']), ('usage', cached['usage'])]
+            else:
+                def produce():
+                    calls.append(True)
+                    self.router.routed(model, reason)
+                    return self.stream_events(key, model, messages, context, trace)
+                events = self.flights.stream(key, produce)
+            for event, data in events:
+                if event == 'delta':
+                    trace.first_token()
+                    parts.append(data)
+                    yield sse('delta', {'content': data})
+                elif event == 'usage':
+                    usage = data
+                    yield sse('usage', usage)
+            if on_complete and usage:
+                on_complete(''.join(parts), usage)
+        except Exception as e:
+            trace.finish(error=e)
+            yield sse('error', {'error': str(e)})
+        else:
+            trace.finish(usage, cached=bool(cached))
+            # Subscribers that joined another request's stream are not billed
+            if self.billable(account, usage) and calls:
+                self.ledger.record(account, trace.endpoint, model, usage)
+        yield sse('done', {})
+
+class AsyncChatPipeline(Pipeline):
+    # Same pipeline on the event loop. The cache, ledger and conversation
+    # store may be SQLite, so their calls run on a worker thread
+    async def summarize(self, messages, account=None):
+        tokens = self.estimate_tokens(messages)
+        started = time.perf_counter()
+        response = await self.gate.call(self.summary_request(messages), tokens)
+        self.gate.settle(tokens, response.usage.total_tokens)
+        usage = usage_to_dict(response.usage)
+        record_upstream('summary', time.perf_counter() - started, usage)
+        if self.billable(account, usage):
+            await asyncio.to_thread(self.ledger.record, account, 'summary', self.summary_model, usage)
+        return response.choices[0].message.content
+
+    async def fit_context(self, messages, account=None):
+        if not self.budget:
+            return messages, None
+        return await self.budget.afit(messages, lambda request: self.summarize(request, account))
+
+    async def cache_get(self, key):
+        if not self.cache:
+            return None
+        return await asyncio.to_thread(self.cache.get, key)
+
+    async def cache_set(self, key, value):
+        if self.cache:
+            await asyncio.to_thread(self.cache.set, key, value)
+
+    async def request_completion(self, key, model, messages, context, trace=None):
+        if trace:
+            trace.upstream_started()
+        tokens = self.estimate_tokens(messages)
+        started = time.perf_counter()
+        response = await self.gate.call(self.completion_request(model, messages), tokens)
+        self.gate.settle(tokens, response.usage.total_tokens)
+        result = self.result(response, model, context)
+        self.upstream_finished('blocking', model, started, result['usage'])
+        await self.cache_set(key, result)
+        return result
+
+    async def stream_events(self, key, model, messages, context, trace=None):
+        if trace:
+            trace.upstream_started()
+        tokens = self.estimate_tokens(messages)
+        started = time.perf_counter()
+        parts = []
+        usage = None
+        # The concurrency slot is held until the stream is fully consumed
+        async with self.gate.admit(self.completion_request(model, messages, stream=True), tokens) as stream:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield ('delta', chunk.choices[0].delta.content)
+                if chunk.usage:
+                    usage = usage_to_dict(chunk.usage, context)
+                    yield ('usage', usage)
+        self.gate.settle(tokens, usage['total_tokens'] if usage else None)
+        self.upstream_finished('stream', model, started, usage)
+        if usage:
+            await self.cache_set(key, {'response': ''.join(parts), 'model': model, 'usage': usage})
+
+    async def complete(self, messages, trace=None, model=None, account=None):
+        messages, context = await self.fit_context(self.prompt.assemble(messages), account)
+        model, reason, key = self.route(messages, model, trace)
+        cached = await self.cache_get(key)
+        if cached:
+            return dict(cached, cached=True)
+        calls = []
+        def call():
+            calls.append(True)
+            self.router.routed(model, reason)
+            return self.request_completion(key, model, messages, context, trace)
+        result = await self.flights.do(key, call)
+        return result if calls else dict(result, shared=True)
+
+    async def traced_complete(self, endpoint, messages, model=None, account=None):
+        trace = Trace(endpoint)
+        try:
+            with lifecycle.track():
+                result = await self.complete(messages, trace, model, account)
+        except Exception as e:
+            trace.finish(error=e)
+            raise
+        trace.finish(result['usage'], cached=result.get('cached'))
+        if self.billable(account, result['usage']) and not (result.get('cached') or result.get('shared')):
+            await asyncio.to_thread(self.ledger.record, account, endpoint, result['model'], result['usage'])
+        return result
+
+    async def stream_completion(self, messages, trace, on_complete=None, model=None, account=None):
+        parts = []
+        usage = None
+        cached = None
+        calls = []
+        try:
+            messages, context = await self.fit_context(self.prompt.assemble(messages), account)
+            model, reason, key = self.route(messages, model, trace)
+            yield sse('model', {'model': model})
+            cached = await self.cache_get(key)
+            if cached:
+                events = replay([('delta', cached['response']), ('usage', cached['usage'])])
+            else:
+                def produce():
+                    calls.append(True)
+                    self.router.routed(model, reason)
+                    return self.stream_events(key, model, messages, context, trace)
+                events = self.flights.stream(key, produce)
+            async for event, data in events:
+                if event == 'delta':
+                    trace.first_token()
+                    parts.append(data)
+                    yield sse('delta', {'content': data})
+                elif event == 'usage':
+                    usage = data
+                    yield sse('usage', usage)
+            if on_complete and usage:
+                await asyncio.to_thread(on_complete, ''.join(parts), usage)
+        except Exception as e:
+            trace.finish(error=e)
+            yield sse('error', {'error': str(e)})
+        else:
+            trace.finish(usage, cached=bool(cached))
+            if self.billable(account, usage) and calls:
+                await asyncio.to_thread(self.ledger.record, account, trace.endpoint, model, usage)
+        yield sse('done', {})
+
+async def replay(events):
+    for event in events:
+        yield event
+
+def make_pipeline(client, cache, budget, router, prompt, ledger, asynchronous=False):
+    pipeline_class = AsyncChatPipeline if asynchronous else ChatPipeline
+    flights = AsyncSingleFlight() if asynchronous else SingleFlight()
+    return pipeline_class(
+        client,
+        cache,
+        budget,
+        flights,
+        make_gate(asynchronous),
+        router,
+        prompt,
+        ledger,
+        summary_model=os.getenv('CONTEXT_SUMMARY_MODEL', 'gpt-4o-mini'),
+        completion_estimate=int(os.getenv('UPSTREAM_COMPLETION_ESTIMATE', '2000'))
+    )
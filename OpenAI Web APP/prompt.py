@@ -0,0 +1,99 @@
+import os
+import re
+
+# Prompt assembly. Upstream prompt caching only pays off when requests
+# share a byte-identical prefix, so every conversation is rebuilt the same
+# way before it is budgeted, cached or sent: the server's preamble and
+# tool instructions first, then the client's messages in their own order,
+# each reduced to a normalised {'role', 'content'} message. Message text
+# is kept as written apart from line endings and blank outer lines.
+# Participant names are not forwarded, and content parts other than text
+# (images, audio, files) are rejected with a ValueError rather than
+# dropped, since the models behind the router only receive text.
+
+ROLES = ('system', 'developer', 'user', 'assistant')
+ROLE_ALIASES = {
+    'human': 'user',
+    'ai': 'assistant',
+    'bot': 'assistant',
+    'model': 'assistant'
+}
+
+# Whole blank lines before the first and after the last line of text
+OUTER_BLANK_LINES = re.compile(r'\A(?:[ \t]*\n)+|(?:\n[ \t]*)+\Z')
+
+def normalize_role(role):
+    role = str(role or 'user').strip().lower()
+    role = ROLE_ALIASES.get(role, role)
+    # Anything else (tool results without a call, typos) is treated as the user's
+    return role if role in ROLES else 'user'
+
+def text_part(part):
+    if not isinstance(part, dict):
+        return str(part)
+    kind = part.get('type', 'text')
+    if kind != 'text':
+        raise ValueError(f'unsupported content part type {kind!r}, only text is accepted')
+    return part.get('text') or ''
+
+def normalize_content(content):
+    if isinstance(content, list):
+        content = '\n'.join(text_part(part) for part in content)
+    elif content is None:
+        content = ''
+    elif not isinstance(content, str):
+        content = str(content)
+    content = content.replace('\r\n', '\n').replace('\r', '\n')
+    if not content.strip():
+        return ''
+    # Indentation and trailing spaces (Markdown hard breaks) are kept
+    return OUTER_BLANK_LINES.sub('', content)
+
+def normalize_message(message):
+    if not isinstance(message, dict):
+        return {'role': 'user', 'content': normalize_content(message)}
+    return {
+        'role': normalize_role(message.get('role')),
+        'content': normalize_content(message.get('content'))
+    }
+
+def normalize_messages(messages):
+    # Routes call this up front so a bad message is a 400, not an upstream error
+    if messages is None:
+        return []
+    if not isinstance(messages, list):
+        raise ValueError('messages must be a list')
+    return [normalize_message(m) for m in messages]
+
+def read_setting(name):
+    # NAME holds the text itself, NAME_FILE a path to it
+    path = os.getenv(name + '_FILE')
+    if path:
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    return os.getenv(name, '')
+
+class PromptAssembler:
+    def __init__(self, preamble='', tools='', role='system'):
+        parts = [normalize_content(preamble), normalize_content(tools)]
+        text = '\n\n'.join(part for part in parts if part)
+        self.prefix = [{'role': role, 'content': text}] if text else []
+
+    def assemble(self, messages):
+        normalized = normalize_messages(messages)
+        # Empty turns add nothing but framing tokens; the last message is
+        # kept regardless, since it is what is being answered
+        if normalized:
+            normalized = [m for m in normalized[:-1] if m['content']] + normalized[-1:]
+        # Client system messages stay where they were sent: one partway
+        # through applies to the turns after it, not to the whole history
+        return self.prefix + normalized
+
+def make_prompt():
+    # PROMPT_PREAMBLE / PROMPT_TOOLS (or their _FILE variants) set the
+    # stable system text; PROMPT_ROLE is system (default) or developer
+    return PromptAssembler(
+        preamble=read_setting('PROMPT_PREAMBLE'),
+        tools=read_setting('PROMPT_TOOLS'),
+        role=os.getenv('PROMPT_ROLE', 'system')
+    )
@@ -0,0 +1,111 @@
+import os
+import re
+
+from budget import count_tokens
+from common import MODEL
+from metrics import Counter, Histogram
+
+# Model routing: a registry of the models clients may ask for, and a
+# policy for requests that don't name one. Under the "auto" policy, short
+# plain questions go to the fast model and anything that looks hard (long
+# prompts, code, maths, step-by-step reasoning) goes to the reasoning
+# model. Per-model latency and token metrics show whether the split pays.
+
+ROUTED = Counter('chat_model_requests_total', 'Upstream calls per model and routing reason', ('model', 'reason'))
+MODEL_SECONDS = Histogram('chat_model_duration_seconds', 'Upstream latency per model', ('model',))
+MODEL_TOKENS = Counter('chat_model_tokens_total', 'Upstream tokens per model', ('model', 'kind'))
+
+POLICIES = ('auto', 'fast', 'reasoning')
+
+# Code, maths and requests for careful reasoning
+HARD_PATTERN = (
+    r'```|\bprove\b|\bproof\b|\bderive\b|\bstep[- ]by[- ]step\b|\bdebug\b|\boptimi[sz]e\b'
+    r'|\balgorithm\b|\bcomplexity\b|\brefactor\b|\bequation\b|\bintegral\b|\btheorem\b'
+    r'|\btraceback\b|\d\s*[*/^]\s*\d'
+)
+
+class ModelRouter:
+    def __init__(self, fast, reasoning, extra=(), policy='auto', simple_max_tokens=300, hard_pattern=HARD_PATTERN):
+        self.fast = fast
+        self.reasoning = reasoning
+        # Order matters only for listing; the first two are the routing targets
+        self.models = list(dict.fromkeys([reasoning, fast, *extra]))
+        if policy not in POLICIES:
+            raise ValueError(f"unknown routing policy {policy!r}, expected one of: {', '.join(POLICIES)}")
+        self.policy = policy
+        self.simple_max_tokens = simple_max_tokens
+        self.hard = re.compile(hard_pattern, re.IGNORECASE)
+
+    def resolve(self, requested):
+        # Validates a client's model choice; None or "auto" leaves it to the policy
+        if requested in (None, '', 'auto'):
+            return None
+        if requested not in self.models:
+            raise ValueError(f"unknown model {requested!r}, expected one of: auto, {', '.join(self.models)}")
+        return requested
+
+    def is_hard(self, messages):
+        prompt = next((m.get('content') or '' for m in reversed(messages) if m.get('role') == 'user'), '')
+        return count_tokens(prompt) > self.simple_max_tokens or bool(self.hard.search(prompt))
+
+    def choose(self, messages, requested=None):
+        # (model, reason); the reason is counted by routed() once the
+        # request actually goes upstream, so cache hits aren't included
+        if requested:
+            model, reason = requested, 'requested'
+        elif self.policy == 'fast':
+            model, reason = self.fast, 'policy'
+        elif self.policy == 'reasoning':
+            model, reason = self.reasoning, 'policy'
+        elif self.is_hard(messages):
+            model, reason = self.reasoning, 'hard'
+        else:
+            model, reason = self.fast, 'simple'
+        return model, reason
+
+    def routed(self, model, reason):
+        ROUTED.inc(model=model, reason=reason)
+
+    def record(self, model, seconds, usage):
+        MODEL_SECONDS.observe(seconds, model=model)
+        if usage:
+            MODEL_TOKENS.inc(usage['total_tokens'], model=model, kind='total')
+            MODEL_TOKENS.inc(usage['completion_tokens_details']['reasoning_tokens'], model=model, kind='reasoning')
+            MODEL_TOKENS.inc(usage['prompt_tokens'], model=model, kind='prompt')
+            MODEL_TOKENS.inc(usage['prompt_tokens_details']['cached_tokens'], model=model, kind='cached')
+
+    def describe(self):
+        models = []
+        for name in self.models:
+            _, total_seconds, calls = MODEL_SECONDS.snapshot(model=name)
+            models.append({
+                'model': name,
+                'role': 'reasoning' if name == self.reasoning else 'fast' if name == self.fast else 'extra',
+                'calls': calls,
+                'mean_seconds': round(total_seconds / calls, 3) if calls else None,
+                'p95_seconds': MODEL_SECONDS.quantile(0.95, model=name),
+                'total_tokens': MODEL_TOKENS.get(model=name, kind='total'),
+                'reasoning_tokens': MODEL_TOKENS.get(model=name, kind='reasoning'),
+                'prompt_tokens': MODEL_TOKENS.get(model=name, kind='prompt'),
+                'cached_tokens': MODEL_TOKENS.get(model=name, kind='cached'),
+                'routed': {
+                    reason: ROUTED.get(model=name, reason=reason)
+                    for reason in ('requested', 'policy', 'simple', 'hard')
+                }
+            })
+        return {
+            'policy': self.policy,
+            'simple_max_tokens': self.simple_max_tokens,
+            'models': models
+        }
+
+def make_router():
+    extra = [name.strip() for name in os.getenv('CHAT_MODELS', '').split(',') if name.strip()]
+    return ModelRouter(
+        fast=os.getenv('ROUTER_FAST_MODEL', 'gpt-4o-mini'),
+        reasoning=os.getenv('ROUTER_REASONING_MODEL', MODEL),
+        extra=extra,
+        policy=os.getenv('ROUTER_POLICY', 'auto'),
+        simple_max_tokens=int(os.getenv('ROUTER_SIMPLE_MAX_TOKENS', '300')),
+        hard_pattern=os.getenv('ROUTER_HARD_PATTERN', HARD_PATTERN)
+    )
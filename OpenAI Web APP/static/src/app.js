@@ -0,0 +1,825 @@
+// Chat/App code
+// Conversations live on the server; the page only keeps the open
+// session's messages and sends each new user turn on its own.
+let currentConversation = [];
+let currentConversationId = null;
+let currentIsDraft = false;
+// Sessions fetched this page load, so reopening one renders at once
+const sessionCache = new Map();
+let loadCounter = 0;
+let messageList = null;
+let formatter = null;
+// Local IndexedDB copy of the history (history-db.js), null if unavailable
+let historyDB = null;
+// Sidebar paging: the last listed session is the cursor for the next page
+const HISTORY_PAGE = 30;
+let historyCursor = null;
+let historyDone = false;
+let historyLoading = false;
+// Uploaded files to send with the next message (see attachments.py)
+let pendingAttachments = [];
+// Pastes longer than this become an attachment instead of message text
+const PASTE_ATTACH_CHARS = 8000;
+
+// Request bodies above this size are gzipped when the browser can
+const COMPRESS_MIN_BYTES = 1024;
+
+// Helper: JSON request options, compressed when large enough to pay off
+async function jsonRequest(method, body) {
+  const headers = { "Content-Type": "application/json" };
+  if (!body) return { method, headers };
+  const json = JSON.stringify(body);
+  if (json.length < COMPRESS_MIN_BYTES || typeof CompressionStream === "undefined") {
+    return { method, headers, body: json };
+  }
+  const stream = new Blob([json]).stream().pipeThrough(new CompressionStream("gzip"));
+  headers["Content-Encoding"] = "gzip";
+  return { method, headers, body: await new Response(stream).arrayBuffer() };
+}
+
+// Helper: call the conversation API and parse the JSON reply. Callers
+// check .error, so every non-2xx reply carries one
+async function api(method, url, body) {
+  const response = await fetch(url, await jsonRequest(method, body));
+  const result = await response.json();
+  if (!response.ok && !result.error) result.error = `Request failed (${response.status})`;
+  return result;
+}
+
+// One-time import of sessions saved in localStorage by older versions.
+// Sessions that fail to import are kept and retried on the next load
+async function migrateLocalHistory() {
+  const legacy = JSON.parse(localStorage.getItem("fullChatHistory")) || [];
+  const failed = [];
+  for (const session of legacy) {
+    try {
+      const created = await api("POST", "/conversations", {
+        title: session.title,
+        messages: session.conversation
+      });
+      if (created.error) failed.push(session);
+    } catch (e) {
+      failed.push(session);
+    }
+  }
+  if (failed.length) {
+    localStorage.setItem("fullChatHistory", JSON.stringify(failed));
+  } else {
+    localStorage.removeItem("fullChatHistory");
+  }
+}
+
+// Load a session into the chat window. A cached copy is shown straight
+// away and only replaced if the server has a different transcript.
+async function loadSession(id) {
+  const load = ++loadCounter;
+  let cached = sessionCache.get(id);
+  if (!cached && historyDB) {
+    const stored = await historyDB.get(id);
+    if (stored && stored.messages.length && load === loadCounter) {
+      cached = stored;
+      sessionCache.set(id, stored);
+    }
+  }
+  if (cached) showSession(cached);
+  const session = await api("GET", `/conversations/${id}`);
+  if (session.error || load !== loadCounter) return;
+  if (historyDB) historyDB.save(session, true);
+  if (cached && cached.messages.length === session.messages.length) {
+    cached.usage = session.usage;
+    updateTokenInfo(session.usage);
+    return;
+  }
+  sessionCache.set(id, session);
+  showSession(session);
+}
+
+function showSession(session) {
+  currentConversationId = session.id;
+  currentConversation = session.messages;
+  currentIsDraft = false;
+  messageList.show(session.id, session.messages);
+  updateTokenInfo(session.usage);
+  highlightActiveSession();
+}
+
+// Highlight the active session
+function highlightActiveSession() {
+  document.querySelectorAll(".chat-session").forEach((item) => {
+    item.classList.remove("active");
+    if (item.dataset.id === currentConversationId) item.classList.add("active");
+  });
+}
+
+function historyItem(session) {
+  const li = document.createElement("li");
+  li.className = "chat-session";
+  li.dataset.id = session.id;
+
+  const titleSpan = document.createElement("span");
+  titleSpan.className = "session-title";
+  titleSpan.textContent = session.title || "Untitled Chat";
+  titleSpan.style.cursor = "pointer";
+  titleSpan.addEventListener("click", () => {
+    loadSession(session.id);
+  });
+  li.appendChild(titleSpan);
+
+  if (session.snippet) {
+    const snippet = document.createElement("div");
+    snippet.className = "session-snippet";
+    snippet.textContent = session.snippet;
+    li.appendChild(snippet);
+  }
+
+  const deleteBtn = document.createElement("button");
+  deleteBtn.textContent = "Delete";
+  deleteBtn.className = "delete-session-btn";
+
+  deleteBtn.addEventListener("click", async (e) => {
+    e.stopPropagation();
+    if (
+      confirm("Are you sure you want to delete this chat session?")
+    ) {
+      await api("DELETE", `/conversations/${session.id}`);
+      forgetSession(session.id);
+      if (session.id === currentConversationId) resetChat();
+    }
+  });
+
+  li.appendChild(deleteBtn);
+  return li;
+}
+
+// Add sessions to the sidebar list, or replace it when reset
+function fillHistory(sessions, reset) {
+  const historyList = document.getElementById("history-list");
+  if (reset) historyList.querySelectorAll(".chat-session").forEach((item) => item.remove());
+  const fragment = document.createDocumentFragment();
+  sessions.forEach((session) => {
+    if (reset || !historyList.querySelector(`[data-id="${session.id}"]`)) {
+      fragment.appendChild(historyItem(session));
+    }
+  });
+  // The paging sentinel stays last
+  historyList.insertBefore(fragment, document.getElementById("history-more"));
+  highlightActiveSession();
+}
+
+// Render the first page of chat history in the sidebar. The local copy is
+// painted first, then replaced by the server's page; later pages load as
+// the list is scrolled.
+async function renderHistory() {
+  if (historyDB) {
+    fillHistory(await historyDB.recent(HISTORY_PAGE), true);
+  }
+  await loadHistoryPage(true);
+}
+
+async function loadHistoryPage(reset) {
+  if (historyLoading || (historyDone && !reset)) return;
+  historyLoading = true;
+  try {
+    const params = new URLSearchParams({ limit: HISTORY_PAGE });
+    if (!reset && historyCursor) {
+      params.set("before", historyCursor.updated_at);
+      params.set("before_id", historyCursor.id);
+    }
+    const page = await api("GET", `/conversations?${params}`);
+    fillHistory(page, reset);
+    historyDone = page.length < HISTORY_PAGE;
+    if (page.length) historyCursor = page[page.length - 1];
+    if (historyDB) historyDB.saveMeta(page);
+  } finally {
+    historyLoading = false;
+  }
+}
+
+// Put a session at the top of the sidebar, e.g. after it got a new turn
+function touchHistoryItem(session) {
+  const historyList = document.getElementById("history-list");
+  const existing = historyList.querySelector(`[data-id="${session.id}"]`);
+  historyList.prepend(existing || historyItem(session));
+  highlightActiveSession();
+}
+
+function renameHistoryItem(id, title) {
+  const item = document.querySelector(`#history-list [data-id="${id}"] .session-title`);
+  if (item) item.textContent = title;
+}
+
+// Drop every copy of a session deleted on the server
+function forgetSession(id) {
+  sessionCache.delete(id);
+  messageList.forget(id);
+  if (historyDB) historyDB.remove(id);
+  document.querySelectorAll(`[data-id="${id}"]`).forEach((item) => item.remove());
+}
+
+// Bring the local copy up to date in the background: walk the server's
+// list page by page, fetch only sessions that changed since they were
+// last stored, and drop the ones deleted elsewhere. Indexing is
+// incremental, so a session that gained two turns indexes only those.
+async function syncHistory() {
+  if (!historyDB) return;
+  const seen = new Set();
+  let cursor = null;
+  while (true) {
+    const params = new URLSearchParams({ limit: 100 });
+    if (cursor) {
+      params.set("before", cursor.updated_at);
+      params.set("before_id", cursor.id);
+    }
+    const page = await api("GET", `/conversations?${params}`);
+    await historyDB.saveMeta(page);
+    for (const meta of page) {
+      seen.add(meta.id);
+      const stored = await historyDB.get(meta.id);
+      if (stored && stored.synced_at === meta.updated_at) continue;
+      await idle();
+      const session = await api("GET", `/conversations/${meta.id}`);
+      if (!session.error) await historyDB.save(session, true);
+    }
+    if (page.length < 100) break;
+    cursor = page[page.length - 1];
+  }
+  for (const id of await historyDB.ids()) {
+    if (!seen.has(id)) await historyDB.remove(id);
+  }
+}
+
+function idle() {
+  return new Promise((resolve) =>
+    window.requestIdleCallback ? requestIdleCallback(resolve, { timeout: 1000 }) : setTimeout(resolve, 50)
+  );
+}
+
+async function searchHistory(query) {
+  const results = document.getElementById("search-results");
+  const historyList = document.getElementById("history-list");
+  if (!query.trim() || !historyDB) {
+    results.hidden = true;
+    historyList.hidden = false;
+    return;
+  }
+  const sessions = await historyDB.search(query, 50);
+  // A newer keystroke may have changed the query meanwhile
+  if (document.getElementById("history-search").value !== query) return;
+  results.replaceChildren(...sessions.map(historyItem));
+  if (!sessions.length) {
+    const empty = document.createElement("li");
+    empty.className = "search-empty";
+    empty.textContent = "No matching chats";
+    results.appendChild(empty);
+  }
+  results.hidden = false;
+  historyList.hidden = true;
+  highlightActiveSession();
+}
+
+function resetChat() {
+  loadCounter++;
+  currentConversation = [];
+  currentConversationId = null;
+  currentIsDraft = false;
+  messageList.show(null, currentConversation);
+  updateTokenInfo({});
+  highlightActiveSession();
+}
+
+// Drop a conversation started in this view that the user chose not to keep
+async function discardDraft() {
+  if (currentConversationId && currentIsDraft) {
+    await api("DELETE", `/conversations/${currentConversationId}`);
+    forgetSession(currentConversationId);
+  }
+}
+
+// Create a new chat session
+async function newChat() {
+  if (currentIsDraft && currentConversation.length) {
+    if (
+      confirm(
+        "Do you want to save this conversation before starting a new one?"
+      )
+    ) {
+      const title = prompt(
+        "Enter a title for this chat session:",
+        "Chat " + new Date().toLocaleString()
+      );
+      await api("PATCH", `/conversations/${currentConversationId}`, {
+        title: title || "Untitled Chat"
+      });
+      renameHistoryItem(currentConversationId, title || "Untitled Chat");
+      if (historyDB) {
+        historyDB.save({ id: currentConversationId, title: title || "Untitled Chat" });
+      }
+    } else {
+      await discardDraft();
+    }
+  }
+  resetChat();
+}
+
+document.addEventListener("DOMContentLoaded", function () {
+  formatter = new Formatter(document.body.dataset.formatWorker);
+  messageList = new MessageList(
+    document.getElementById("chat-messages"),
+    formatMessage
+  );
+  loadModels();
+  HistoryDB.open()
+    .then((db) => {
+      historyDB = db;
+      return migrateLocalHistory();
+    })
+    .then(renderHistory)
+    .then(syncHistory);
+
+  // Next sidebar page when the end of the list scrolls into view
+  new IntersectionObserver(
+    (entries) => {
+      if (entries[0].isIntersecting && historyCursor) loadHistoryPage(false);
+    },
+    { root: document.getElementById("history-list") }
+  ).observe(document.getElementById("history-more"));
+
+  let searchTimer = null;
+  document.getElementById("history-search").addEventListener("input", (e) => {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => searchHistory(e.target.value), 100);
+  });
+
+  const sendButton = document.getElementById("send-button");
+  const userInput = document.getElementById("user-input");
+  const clearHistoryBtn = document.getElementById("clear-history");
+  const newChatBtn = document.getElementById("new-chat");
+  const playGameBtn = document.getElementById("play-game");
+
+  sendButton.addEventListener("click", function (e) {
+    e.preventDefault();
+    handleSend();
+  });
+
+  const fileInput = document.getElementById("file-input");
+  document.getElementById("attach-button").addEventListener("click", (e) => {
+    e.preventDefault();
+    fileInput.click();
+  });
+  fileInput.addEventListener("change", () => {
+    for (const file of fileInput.files) uploadAttachment(file, file.name);
+    fileInput.value = "";
+  });
+
+  // Only the relevant parts of a big paste are sent with each turn
+  userInput.addEventListener("paste", (e) => {
+    const text = e.clipboardData.getData("text");
+    if (text.length > PASTE_ATTACH_CHARS) {
+      e.preventDefault();
+      uploadAttachment(new Blob([text], { type: "text/plain" }), "pasted-text.txt");
+    }
+  });
+
+  userInput.addEventListener("keydown", function (e) {
+    if (e.key === "Enter" && !e.shiftKey) {
+      e.preventDefault();
+      handleSend();
+    }
+  });
+
+  // Auto-resize for textarea
+  userInput.addEventListener("input", function () {
+    this.style.height = "auto";
+    const maxHeight = 300;
+    if (this.scrollHeight > maxHeight) {
+      this.style.height = maxHeight + "px";
+      this.style.overflowY = "auto";
+    } else {
+      this.style.height = this.scrollHeight + "px";
+      this.style.overflowY = "hidden";
+    }
+  });
+
+  clearHistoryBtn.addEventListener("click", async function () {
+    if (confirm("Are you sure you want to clear this session?")) {
+      await discardDraft();
+      resetChat();
+    }
+  });
+
+  newChatBtn.addEventListener("click", function () {
+    newChat();
+  });
+
+  // Game modal open/close and advanced RPG game initialization
+  playGameBtn.addEventListener("click", function () {
+    document.getElementById("game-modal").style.display = "block";
+    startAdvancedRpg();
+  });
+  document.querySelector(".close-button").addEventListener("click", function () {
+    document.getElementById("game-modal").style.display = "none";
+  });
+  window.addEventListener("click", function (e) {
+    if (e.target == document.getElementById("game-modal")) {
+      document.getElementById("game-modal").style.display = "none";
+    }
+  });
+
+  // Particle background (static/src/particles.js)
+  startParticles("particles-js", {
+    count: 80,
+    area: 800,
+    color: "255, 255, 255",
+    opacity: 0.5,
+    size: 3,
+    speed: 4,
+    linkDistance: 150,
+    linkOpacity: 0.4,
+    repulseDistance: 100,
+    pushCount: 4,
+    retina: true
+  });
+});
+
+function handleSend() {
+  const userInput = document.getElementById("user-input");
+  const attached = pendingAttachments.filter((a) => a.id);
+  // Wait for uploads still in progress
+  if (pendingAttachments.some((a) => !a.id && !a.error)) return;
+  const message = userInput.value.trim() || (attached.length ? "Please look at the attached files." : "");
+  if (!message) return;
+  userInput.value = "";
+  userInput.style.height = "auto";
+  pendingAttachments = [];
+  renderAttachments();
+
+  const names = attached.map((a) => a.name).join(", ");
+  displayMessage("user", names ? `${message}\n\n\u{1F4CE} ${names}` : message);
+  currentConversation.push({ role: "user", content: message });
+
+  sendToServer(message, attached.map((a) => a.id));
+}
+
+// Uploads a file as the raw request body; the server parses it as it
+// arrives and keeps one copy per distinct content
+async function uploadAttachment(file, name) {
+  const attachment = { id: null, name, error: null };
+  pendingAttachments.push(attachment);
+  renderAttachments();
+  try {
+    const response = await fetch(`/attachments?name=${encodeURIComponent(name)}`, {
+      method: "POST",
+      headers: { "Content-Type": file.type || "text/plain" },
+      body: file
+    });
+    const result = await response.json();
+    if (!response.ok) throw new Error(result.error || "Upload failed");
+    attachment.id = result.id;
+    attachment.tokens = result.tokens;
+  } catch (e) {
+    attachment.error = e.message;
+  }
+  renderAttachments();
+}
+
+function renderAttachments() {
+  const list = document.getElementById("pending-attachments");
+  list.hidden = !pendingAttachments.length;
+  list.replaceChildren(
+    ...pendingAttachments.map((attachment) => {
+      const chip = document.createElement("span");
+      chip.className = "attachment-chip" + (attachment.error ? " failed" : attachment.id ? "" : " uploading");
+      chip.textContent = attachment.error
+        ? `${attachment.name}: ${attachment.error}`
+        : attachment.id
+          ? `${attachment.name} (${attachment.tokens} tokens)`
+          : `${attachment.name}\u2026`;
+      chip.title = attachment.name;
+      const remove = document.createElement("button");
+      remove.textContent = "\u00d7";
+      remove.title = "Remove";
+      remove.addEventListener("click", () => {
+        pendingAttachments = pendingAttachments.filter((a) => a !== attachment);
+        renderAttachments();
+      });
+      chip.appendChild(remove);
+      return chip;
+    })
+  );
+}
+
+async function sendToServer(content, attachmentIds) {
+  const loadingId = displayLoadingIndicator();
+  let replyEntry = null;
+  let replyStream = null;
+  let reply = "";
+  let usage = null;
+  let model = null;
+  let error = null;
+  try {
+    if (!currentConversationId) {
+      const created = await api("POST", "/conversations", {
+        title: "Chat " + new Date().toLocaleString()
+      });
+      currentConversationId = created.id;
+      currentIsDraft = true;
+      sessionCache.set(created.id, {
+        id: created.id,
+        messages: currentConversation,
+        usage: {}
+      });
+      messageList.remember(created.id);
+      touchHistoryItem(created);
+    }
+    const response = await fetch(
+      `/conversations/${currentConversationId}/chat/stream`,
+      await jsonRequest("POST", {
+        content: content,
+        model: document.getElementById("model-select").value,
+        attachments: attachmentIds || []
+      })
+    );
+    if (!response.ok || !response.body) {
+      throw new Error("Stream request failed");
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      // SSE frames are separated by a blank line
+      const frames = buffer.split("\n\n");
+      buffer = frames.pop();
+      for (const frame of frames) {
+        const { event, data } = parseSseFrame(frame);
+        if (event === "delta") {
+          if (!replyEntry) {
+            removeLoadingIndicator(loadingId);
+            const entry = messageList.append("assistant", "", true);
+            replyEntry = entry;
+            replyStream = formatter.stream((fragment, tail) =>
+              messageList.stream(entry, fragment, tail)
+            );
+          }
+          reply += data.content;
+          replyStream.push(data.content);
+        } else if (event === "model") {
+          model = data.model;
+        } else if (event === "usage") {
+          usage = data;
+        } else if (event === "error") {
+          error = data.error;
+        }
+      }
+    }
+    removeLoadingIndicator(loadingId);
+    const html = replyStream ? await replyStream.finish() : undefined;
+    if (error) {
+      // The server only stores turns that got a reply
+      currentConversation.pop();
+      if (replyEntry) messageList.finish(replyEntry, reply, html);
+      displayMessage("error", error);
+    } else {
+      currentConversation.push({
+        role: "assistant",
+        content: reply
+      });
+      if (replyEntry) {
+        messageList.finish(replyEntry, reply, html);
+      } else {
+        displayMessage("assistant", reply);
+      }
+      const cached = sessionCache.get(currentConversationId);
+      if (cached && usage) cached.usage = usage;
+      updateTokenInfo(usage, model);
+      touchHistoryItem({ id: currentConversationId });
+      if (historyDB) {
+        // Index just the new turns; the next sync refreshes updated_at
+        historyDB.save({
+          id: currentConversationId,
+          messages: currentConversation,
+          usage: usage || {},
+          updated_at: Date.now() / 1000
+        });
+      }
+    }
+  } catch (error) {
+    removeLoadingIndicator(loadingId);
+    currentConversation.pop();
+    if (replyEntry) messageList.finish(replyEntry, reply, await replyStream.finish());
+    displayMessage("error", "An error occurred while processing your request.");
+  }
+}
+
+function parseSseFrame(frame) {
+  let event = "message";
+  let data = "";
+  frame.split("\n").forEach((line) => {
+    if (line.startsWith("event:")) event = line.slice(6).trim();
+    else if (line.startsWith("data:")) data += line.slice(5).trim();
+  });
+  return { event, data: data ? JSON.parse(data) : {} };
+}
+
+function displayMessage(role, content) {
+  return messageList.append(role, content);
+}
+
+// Turn a message into HTML; called once per message by the message list,
+// which caches the result. Assistant replies are markdown and go through
+// the formatting worker; user and error text is shown as typed.
+function formatMessage(role, content) {
+  if (role === "assistant") {
+    return formatter.format(content);
+  }
+  return Highlight.escapeHtml(content);
+}
+
+function copyCode(button) {
+  const code = button.parentElement.parentElement.querySelector("code")
+    .textContent;
+  navigator.clipboard.writeText(code);
+  button.textContent = "Copied!";
+  setTimeout(() => {
+    button.textContent = "Copy";
+  }, 2000);
+}
+
+// Modified loading indicator to look like an assistant bubble
+function displayLoadingIndicator() {
+  const id = "loading-" + Date.now();
+  const messagesDiv = document.getElementById("chat-messages");
+  const loadingDiv = document.createElement("div");
+  loadingDiv.id = id;
+  loadingDiv.className = "message assistant loading";
+  loadingDiv.innerHTML =
+    '<div class="typing-indicator"><span></span><span></span><span></span></div>';
+  messagesDiv.appendChild(loadingDiv);
+  messagesDiv.scrollTop = messagesDiv.scrollHeight;
+  return id;
+}
+
+function removeLoadingIndicator(id) {
+  document.getElementById(id)?.remove();
+}
+
+// Models the server accepts, after "Auto" which leaves the choice to it
+async function loadModels() {
+  const select = document.getElementById("model-select");
+  try {
+    const { models } = await api("GET", "/models");
+    for (const { model, role } of models) {
+      const option = document.createElement("option");
+      option.value = model;
+      option.textContent = role === "extra" ? model : `${model} (${role})`;
+      select.appendChild(option);
+    }
+  } catch (e) {
+    console.error("Could not load models", e);
+  }
+}
+
+function updateTokenInfo(usage, model) {
+  if (!usage) usage = {};
+  const tokenInfo = document.getElementById("token-info");
+  tokenInfo.title = model ? `Last reply from ${model}` : "";
+  tokenInfo.innerHTML = `
+    <div class="token-detail" title="Total Tokens Used">
+      <svg width="16" height="16" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
+        <path d="M20 7h-4V3c0-.6-.4-1-1-1H9c-.6 0-1 .4-1 1v4H4c-.6 0-1 .4-1 1v6c0 .6.4 1 1 1h4v4c0 .6.4 1 1 1h6c.6 0 1-.4 1-1v-4h4c.6 0 1-.4 1-1V8c0-.6-.4-1-1-1z"/>
+      </svg>
+      <span>${usage.total_tokens || 0}</span>
+    </div>
+    <div class="token-detail" title="Reasoning Tokens">
+      <svg width="16" height="16" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
+        <path d="M12 2L2 7l10 5 10-5-10-5zM2 17l10 5 10-5M2 12l10 5 10-5"/>
+      </svg>
+      <span>${usage?.completion_tokens_details?.reasoning_tokens || 0}</span>
+    </div>
+    <div class="token-detail" title="Cached Prompt Tokens">
+      <svg width="16" height="16" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
+        <path d="M3 12a9 9 0 1 0 3-6.7L3 8M3 3v5h5"/>
+      </svg>
+      <span>${usage?.prompt_tokens_details?.cached_tokens || 0}</span>
+    </div>
+  `;
+}
+
+// Advanced RPG game code
+let playerMaxHP = 120;
+let playerHP = 120;
+let playerMaxMP = 50;
+let playerMP = 50;
+let enemyMaxHP = 100;
+let enemyHP = 100;
+let gameActive = false;
+
+function logRpg(message) {
+  const logDiv = document.getElementById("rpg-log");
+  logDiv.innerHTML += message + "<br>";
+  logDiv.scrollTop = logDiv.scrollHeight;
+}
+
+function updateRpgDisplay() {
+  document.getElementById("player-hp").textContent = playerHP;
+  document.getElementById("player-maxhp").textContent = playerMaxHP;
+  document.getElementById("player-mp").textContent = playerMP;
+  document.getElementById("player-maxmp").textContent = playerMaxMP;
+  document.getElementById("enemy-hp").textContent = enemyHP;
+  document.getElementById("enemy-maxhp").textContent = enemyMaxHP;
+}
+
+function startAdvancedRpg() {
+  // Reset stats and log
+  playerHP = playerMaxHP;
+  playerMP = playerMaxMP;
+  enemyHP = enemyMaxHP;
+  gameActive = true;
+  document.getElementById("rpg-log").innerHTML = "";
+  updateRpgDisplay();
+  logRpg("Battle start! Your enemy stands before you.");
+  document.getElementById("rpg-restart-btn").style.display = "none";
+}
+
+// Player action: Attack
+document.getElementById("attack-btn").addEventListener("click", function () {
+  if (!gameActive) return;
+  // Player attack: 15-25 damage
+  const damage = Math.floor(Math.random() * 11) + 15;
+  enemyHP = Math.max(enemyHP - damage, 0);
+  logRpg(`You attack the enemy for ${damage} damage.`);
+  updateRpgDisplay();
+  if (enemyHP === 0) { endBattle("win"); return; }
+  enemyTurn();
+});
+
+// Player action: Magic - consumes MP
+document.getElementById("magic-btn").addEventListener("click", function () {
+  if (!gameActive) return;
+  if (playerMP < 10) {
+    logRpg("Not enough MP to cast a spell!");
+    return;
+  }
+  playerMP -= 10;
+  // Magic attack: 20-35 damage
+  const damage = Math.floor(Math.random() * 16) + 20;
+  enemyHP = Math.max(enemyHP - damage, 0);
+  logRpg(`You cast a spell and deal ${damage} magic damage.`);
+  updateRpgDisplay();
+  if (enemyHP === 0) { endBattle("win"); return; }
+  enemyTurn();
+});
+
+// Player action: Heal - consumes MP
+document.getElementById("heal-btn").addEventListener("click", function () {
+  if (!gameActive) return;
+  if (playerMP < 8) {
+    logRpg("Not enough MP to heal!");
+    return;
+  }
+  playerMP -= 8;
+  // Heal: 18-28 HP restored
+  const healAmount = Math.floor(Math.random() * 11) + 18;
+  playerHP = Math.min(playerHP + healAmount, playerMaxHP);
+  logRpg(`You heal yourself for ${healAmount} HP.`);
+  updateRpgDisplay();
+  enemyTurn();
+});
+
+function enemyTurn() {
+  // Enemy takes its turn after a short delay
+  setTimeout(() => {
+    if (!gameActive) return;
+    // Enemy randomly decides between attack or a special move
+    let action = Math.random();
+    if (action < 0.8) {
+      // Basic attack: 10-20 damage
+      const damage = Math.floor(Math.random() * 11) + 10;
+      playerHP = Math.max(playerHP - damage, 0);
+      logRpg(`The enemy attacks you for ${damage} damage.`);
+    } else {
+      // Rare special attack: 25-35 damage
+      const damage = Math.floor(Math.random() * 11) + 25;
+      playerHP = Math.max(playerHP - damage, 0);
+      logRpg(`The enemy unleashes a powerful strike for ${damage} damage!`);
+    }
+    updateRpgDisplay();
+    if (playerHP === 0) { endBattle("lose"); }
+  }, 1000);
+}
+
+function endBattle(result) {
+  gameActive = false;
+  if (result === "win") {
+    logRpg("Congratulations, you defeated the enemy!");
+  } else {
+    logRpg("You have been defeated. Better luck next time!");
+  }
+  document.getElementById("rpg-restart-btn").style.display = "inline-block";
+}
+
+document.getElementById("rpg-restart-btn").addEventListener("click", function () {
+  startAdvancedRpg();
+});
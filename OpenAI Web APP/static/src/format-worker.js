@@ -0,0 +1,49 @@
+// Formatting worker: turns assistant replies into HTML off the main thread.
+// Bundled after highlight.js and markdown.js (see assets.py).
+//
+//   {id, op: "format", text}  -> {id, html}
+//   {id, op: "append", text}  -> {id, append, tail}, coalesced per task
+//   {id, op: "finish"}        -> {id, html, done: true}
+const streams = new Map();
+const dirty = new Set();
+let flushScheduled = false;
+
+function fallback(text) {
+  return `<div class="plain">${Highlight.escapeHtml(text)}</div>`;
+}
+
+// Deltas that arrive together are rendered once, not once per delta
+function flush() {
+  flushScheduled = false;
+  for (const id of dirty) {
+    const stream = streams.get(id);
+    if (stream) postMessage(Object.assign({ id }, stream.take()));
+  }
+  dirty.clear();
+}
+
+self.onmessage = (event) => {
+  const { id, op, text } = event.data;
+  if (op === "format") {
+    let html;
+    try {
+      html = Markdown.render(text);
+    } catch (error) {
+      html = fallback(text);
+    }
+    postMessage({ id, html });
+  } else if (op === "append") {
+    if (!streams.has(id)) streams.set(id, new Markdown.Stream());
+    streams.get(id).push(text);
+    dirty.add(id);
+    if (!flushScheduled) {
+      flushScheduled = true;
+      setTimeout(flush, 0);
+    }
+  } else if (op === "finish") {
+    const stream = streams.get(id);
+    streams.delete(id);
+    dirty.delete(id);
+    postMessage({ id, html: stream ? stream.finish() : "", done: true });
+  }
+};
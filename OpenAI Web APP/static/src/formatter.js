@@ -0,0 +1,67 @@
+// Main-thread side of the formatting worker. format() resolves to the HTML
+// of a whole message; stream() feeds a reply in as it arrives and reports
+// finished HTML to append plus the re-rendered block still being written.
+// Without a worker, messages are shown as escaped plain text.
+class Formatter {
+  constructor(url) {
+    this.callbacks = new Map();
+    this.nextId = 1;
+    this.worker = null;
+    try {
+      this.worker = new Worker(url);
+      this.worker.onmessage = (event) => {
+        const callback = this.callbacks.get(event.data.id);
+        if (callback) callback(event.data);
+      };
+    } catch (error) {
+      this.worker = null;
+    }
+  }
+
+  plain(text) {
+    return `<div class="plain">${Highlight.escapeHtml(text)}</div>`;
+  }
+
+  format(text) {
+    if (!this.worker) return Promise.resolve(this.plain(text));
+    const id = this.nextId++;
+    return new Promise((resolve) => {
+      this.callbacks.set(id, (data) => {
+        this.callbacks.delete(id);
+        resolve(data.html);
+      });
+      this.worker.postMessage({ id, op: "format", text });
+    });
+  }
+
+  stream(onUpdate) {
+    let text = "";
+    if (!this.worker) {
+      return {
+        push: (delta) => {
+          text += delta;
+          onUpdate("", this.plain(text));
+        },
+        finish: () => Promise.resolve(this.plain(text))
+      };
+    }
+    const id = this.nextId++;
+    let resolveFinish = null;
+    this.callbacks.set(id, (data) => {
+      if (data.done) {
+        this.callbacks.delete(id);
+        resolveFinish(data.html);
+      } else {
+        onUpdate(data.append, data.tail);
+      }
+    });
+    return {
+      push: (delta) => this.worker.postMessage({ id, op: "append", text: delta }),
+      finish: () =>
+        new Promise((resolve) => {
+          resolveFinish = resolve;
+          this.worker.postMessage({ id, op: "finish" });
+        })
+    };
+  }
+}
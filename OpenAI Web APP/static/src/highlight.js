@@ -0,0 +1,176 @@
+// Small syntax highlighter for the languages the chat detects. It emits
+// Prism-style "token <type>" spans, so highlight.css styles its output.
+const Highlight = (function () {
+  const STRING = /"(?:\\[\s\S]|[^"\\\n])*"|'(?:\\[\s\S]|[^'\\\n])*'/;
+  const NUMBER = /\b0[xX][\da-fA-F]+\b|(?:\b\d+(?:\.\d*)?|\B\.\d+)(?:[eE][+-]?\d+)?/;
+  const FUNCTION = /\b[A-Za-z_$][\w$]*(?=\s*\()/;
+  const OPERATOR = /[-+*\/%=!<>&|^~?:]+/;
+  const PUNCTUATION = /[{}[\];(),.]/;
+
+  function words(list) {
+    return new RegExp("\\b(?:" + list.split(" ").join("|") + ")\\b");
+  }
+
+  function cLike(keywords, literals) {
+    return [
+      ["comment", /\/\/.*|\/\*[\s\S]*?\*\//],
+      ["string", /`[^`]*`/],
+      ["string", STRING],
+      ["keyword", words(keywords)],
+      ["boolean", words(literals)],
+      ["class-name", /\b[A-Z]\w*/],
+      ["function", FUNCTION],
+      ["number", NUMBER],
+      ["operator", OPERATOR],
+      ["punctuation", PUNCTUATION]
+    ];
+  }
+
+  const SQL_KEYWORDS = "select from where and or not insert into values update set delete create table drop alter add join left right inner outer on group by order having limit offset as distinct union all primary key foreign references index view case when then else end is null in like between exists";
+
+  const grammars = {
+    python: [
+      ["comment", /#.*/],
+      ["string", /(?:[rbufRBUF]{1,2})?(?:"""[\s\S]*?"""|'''[\s\S]*?''')/],
+      ["string", /(?:[rbufRBUF]{1,2})?(?:"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')/],
+      ["decorator", /@[\w.]+/],
+      ["keyword", words("and as assert async await break class continue def del elif else except finally for from global if import in is lambda nonlocal not or pass raise return try while with yield")],
+      ["boolean", words("True False None")],
+      ["builtin", words("print len range open int str float list dict set tuple bool type isinstance super enumerate zip map filter sorted min max sum abs")],
+      ["function", FUNCTION],
+      ["number", NUMBER],
+      ["operator", OPERATOR],
+      ["punctuation", PUNCTUATION]
+    ],
+    javascript: [
+      ["comment", /\/\/.*|\/\*[\s\S]*?\*\//],
+      ["string", /`(?:\\[\s\S]|[^`\\])*`/],
+      ["string", STRING],
+      ["keyword", words("async await break case catch class const continue debugger default delete do else export extends finally for from function if import in instanceof let new of return static super switch this throw try typeof var void while with yield")],
+      ["boolean", words("true false null undefined NaN")],
+      ["class-name", /\b[A-Z][\w$]*/],
+      ["function", FUNCTION],
+      ["number", NUMBER],
+      ["operator", OPERATOR],
+      ["punctuation", PUNCTUATION]
+    ],
+    java: [
+      ["comment", /\/\/.*|\/\*[\s\S]*?\*\//],
+      ["string", STRING],
+      ["decorator", /@\w+/],
+      ["keyword", words("abstract assert break case catch class continue default do else enum extends final finally for if implements import instanceof interface new package private protected public return static super switch synchronized this throw throws try void volatile while var boolean byte char double float int long short")],
+      ["boolean", words("true false null")],
+      ["class-name", /\b[A-Z]\w*/],
+      ["function", FUNCTION],
+      ["number", NUMBER],
+      ["operator", OPERATOR],
+      ["punctuation", PUNCTUATION]
+    ],
+    bash: [
+      ["comment", /(?:^|\s)#.*/],
+      ["string", STRING],
+      ["variable", /\$(?:\{[^}]*\}|\w+|[@#?$!*-])/],
+      ["keyword", words("if then else elif fi for in do done while until case esac function return local export select")],
+      ["builtin", words("echo cd pwd ls cat grep sed awk printf read source exit set unset alias sudo mkdir rm cp mv chmod")],
+      ["number", /\b\d+\b/],
+      ["operator", /&&|\|\||[|&;<>]/],
+      ["punctuation", /[{}[\]()]/]
+    ]
+  };
+  grammars.c = grammars.cpp = cLike(
+    "auto break case char const continue default do double else enum extern float for goto if inline int long register return short signed sizeof static struct switch typedef union unsigned void volatile while class namespace template typename public private protected virtual using new delete try catch throw this operator include define",
+    "true false NULL nullptr"
+  );
+  grammars.csharp = cLike(
+    "abstract as base bool break byte case catch char class const continue decimal default delegate do double else enum event explicit extern finally fixed float for foreach if implicit in int interface internal is lock long namespace new object operator out override params private protected public readonly ref return sealed short sizeof static string struct switch this throw try typeof uint ulong using var virtual void while async await",
+    "true false null"
+  );
+  grammars.go = cLike(
+    "break case chan const continue default defer else fallthrough for func go goto if import interface map package range return select struct switch type var",
+    "true false nil iota"
+  );
+  grammars.rust = cLike(
+    "as async await break const continue crate dyn else enum extern fn for if impl in let loop match mod move mut pub ref return self Self static struct super trait type unsafe use where while",
+    "true false None Some Ok Err"
+  );
+  grammars.sql = [
+    ["comment", /--.*|\/\*[\s\S]*?\*\//],
+    ["string", STRING],
+    ["keyword", words(SQL_KEYWORDS + " " + SQL_KEYWORDS.toUpperCase())],
+    ["function", FUNCTION],
+    ["number", NUMBER],
+    ["operator", /[-+*\/%=<>!|]+/],
+    ["punctuation", /[;(),.]/]
+  ];
+  grammars.json = [
+    ["string", /"(?:\\.|[^"\\\n])*"/],
+    ["boolean", words("true false null")],
+    ["number", /-?\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b/],
+    ["punctuation", /[{}[\],:]/]
+  ];
+  grammars.shell = grammars.sh = grammars.bash;
+  grammars.js = grammars.ts = grammars.typescript = grammars.javascript;
+  grammars.py = grammars.python;
+
+  // One alternation per grammar; the capture group that matched tells us
+  // which rule won, and earlier rules take priority at the same offset
+  const compiled = {};
+  function compile(language) {
+    const rules = grammars[language];
+    if (!rules) return null;
+    if (!compiled[language]) {
+      compiled[language] = {
+        types: rules.map((rule) => rule[0]),
+        pattern: new RegExp(rules.map((rule) => "(" + rule[1].source + ")").join("|"), "gm")
+      };
+    }
+    return compiled[language];
+  }
+
+  function escapeHtml(text) {
+    return text
+      .replace(/&/g, "&amp;")
+      .replace(/</g, "&lt;")
+      .replace(/>/g, "&gt;")
+      .replace(/"/g, "&quot;")
+      .replace(/'/g, "&#039;");
+  }
+
+  function highlight(code, language) {
+    const grammar = compile(language);
+    if (!grammar) return escapeHtml(code);
+    const pattern = grammar.pattern;
+    let html = "";
+    let last = 0;
+    let match;
+    pattern.lastIndex = 0;
+    while ((match = pattern.exec(code))) {
+      if (!match[0]) {
+        pattern.lastIndex++;
+        continue;
+      }
+      const type = grammar.types[match.slice(1).findIndex((group) => group !== undefined)];
+      html += escapeHtml(code.slice(last, match.index));
+      html += `<span class="token ${type}">${escapeHtml(match[0])}</span>`;
+      last = match.index + match[0].length;
+    }
+    return html + escapeHtml(code.slice(last));
+  }
+
+  function languageOf(element) {
+    const match = element.className.match(/\blanguage-([\w-]+)/);
+    return match ? match[1] : null;
+  }
+
+  function highlightElement(element) {
+    if (element.dataset.highlighted) return;
+    element.innerHTML = highlight(element.textContent, languageOf(element));
+    element.dataset.highlighted = "true";
+  }
+
+  function highlightAll(root) {
+    (root || document).querySelectorAll('code[class*="language-"]').forEach(highlightElement);
+  }
+
+  return { highlight, highlightElement, highlightAll, escapeHtml, languages: Object.keys(grammars) };
+})();
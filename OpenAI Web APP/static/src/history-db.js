@@ -0,0 +1,178 @@
+// IndexedDB copy of the conversation history: one record per session plus
+// an inverted index of (term, session) postings over message content. The
+// server stays the source of truth; this copy makes the sidebar paint
+// instantly and lets search run locally. Indexing is incremental: each
+// record remembers how many of its messages have been indexed.
+const HistoryDB = (function () {
+  function request(req) {
+    return new Promise((resolve, reject) => {
+      req.onsuccess = () => resolve(req.result);
+      req.onerror = () => reject(req.error);
+    });
+  }
+
+  function complete(tx) {
+    return new Promise((resolve, reject) => {
+      tx.oncomplete = () => resolve();
+      tx.onerror = tx.onabort = () => reject(tx.error);
+    });
+  }
+
+  function tokenize(text) {
+    return new Set((text.toLowerCase().match(/[\p{L}\p{N}_]{2,}/gu) || []).map((term) => term.slice(0, 32)));
+  }
+
+  function snippet(messages, terms) {
+    for (const message of messages) {
+      const lower = message.content.toLowerCase();
+      for (const term of terms) {
+        const at = lower.indexOf(term);
+        if (at !== -1) {
+          const start = Math.max(0, at - 40);
+          return (start ? "\u2026" : "") + message.content.slice(start, at + term.length + 60).replace(/\s+/g, " ");
+        }
+      }
+    }
+    return "";
+  }
+
+  class Store {
+    constructor(db) {
+      this.db = db;
+    }
+
+    static open(name) {
+      if (!window.indexedDB) return Promise.resolve(null);
+      return new Promise((resolve) => {
+        const req = indexedDB.open(name || "chat-history", 1);
+        req.onupgradeneeded = () => {
+          const db = req.result;
+          const sessions = db.createObjectStore("sessions", { keyPath: "id" });
+          sessions.createIndex("updated_at", "updated_at");
+          const postings = db.createObjectStore("postings", { keyPath: ["term", "id"] });
+          postings.createIndex("id", "id");
+        };
+        req.onsuccess = () => resolve(new Store(req.result));
+        // Private browsing and blocked storage fall back to server-only
+        req.onerror = () => resolve(null);
+      });
+    }
+
+    get(id) {
+      return request(this.db.transaction("sessions").objectStore("sessions").get(id));
+    }
+
+    ids() {
+      return request(this.db.transaction("sessions").objectStore("sessions").getAllKeys());
+    }
+
+    // Newest sessions first, without their messages
+    recent(limit) {
+      const index = this.db.transaction("sessions").objectStore("sessions").index("updated_at");
+      const sessions = [];
+      return new Promise((resolve, reject) => {
+        const cursor = index.openCursor(null, "prev");
+        cursor.onsuccess = () => {
+          const current = cursor.result;
+          if (!current || sessions.length >= limit) {
+            resolve(sessions);
+            return;
+          }
+          const { id, title, updated_at } = current.value;
+          sessions.push({ id, title, updated_at });
+          current.continue();
+        };
+        cursor.onerror = () => reject(cursor.error);
+      });
+    }
+
+    // Titles and timestamps from a sidebar page. synced_at is left alone,
+    // so a changed updated_at marks the messages as stale.
+    saveMeta(list) {
+      const tx = this.db.transaction("sessions", "readwrite");
+      const sessions = tx.objectStore("sessions");
+      for (const meta of list) {
+        const existing = sessions.get(meta.id);
+        existing.onsuccess = () => {
+          const record = existing.result || { id: meta.id, messages: [], indexed: 0, usage: {}, synced_at: null };
+          record.title = meta.title;
+          record.updated_at = meta.updated_at;
+          sessions.put(record);
+        };
+      }
+      return complete(tx);
+    }
+
+    // Store a session (fields not given are kept) and index any messages
+    // not indexed yet. Pass synced when the messages came from the server.
+    save(session, synced) {
+      const tx = this.db.transaction(["sessions", "postings"], "readwrite");
+      const sessions = tx.objectStore("sessions");
+      const postings = tx.objectStore("postings");
+      const existing = sessions.get(session.id);
+      existing.onsuccess = () => {
+        const record = Object.assign(
+          { messages: [], indexed: 0, usage: {}, title: "Untitled Chat", synced_at: null },
+          existing.result,
+          session
+        );
+        // Transcripts only grow; anything else means starting over
+        if (record.indexed > record.messages.length) record.indexed = 0;
+        const terms = new Set();
+        for (const message of record.messages.slice(record.indexed)) {
+          tokenize(message.content).forEach((term) => terms.add(term));
+        }
+        terms.forEach((term) => postings.put({ term, id: record.id }));
+        record.indexed = record.messages.length;
+        if (synced) record.synced_at = record.updated_at;
+        sessions.put(record);
+      };
+      return complete(tx);
+    }
+
+    remove(id) {
+      const tx = this.db.transaction(["sessions", "postings"], "readwrite");
+      tx.objectStore("sessions").delete(id);
+      const cursor = tx.objectStore("postings").index("id").openKeyCursor(IDBKeyRange.only(id));
+      cursor.onsuccess = () => {
+        if (cursor.result) {
+          tx.objectStore("postings").delete(cursor.result.primaryKey);
+          cursor.result.continue();
+        }
+      };
+      return complete(tx);
+    }
+
+    // Sessions containing every query term; the last term also matches
+    // as a prefix, so results update while the user is still typing
+    async search(query, limit) {
+      const terms = [...tokenize(query)];
+      if (!terms.length) return [];
+      const tx = this.db.transaction(["sessions", "postings"]);
+      const postings = tx.objectStore("postings");
+      let ids = null;
+      for (let i = 0; i < terms.length; i++) {
+        const term = terms[i];
+        const upper = i === terms.length - 1 ? term + "\uffff" : term;
+        const keys = await request(postings.getAllKeys(IDBKeyRange.bound([term, ""], [upper, "\uffff"])));
+        const found = new Set(keys.map((key) => key[1]));
+        ids = ids === null ? found : new Set([...ids].filter((id) => found.has(id)));
+        if (!ids.size) return [];
+      }
+      const sessions = tx.objectStore("sessions");
+      const records = await Promise.all([...ids].map((id) => request(sessions.get(id))));
+      return records
+        .filter(Boolean)
+        .sort((a, b) => (b.updated_at || 0) - (a.updated_at || 0))
+        .slice(0, limit || 50)
+        .map((record) => ({
+          id: record.id,
+          title: record.title,
+          updated_at: record.updated_at,
+          snippet: snippet(record.messages, terms)
+        }));
+    }
+  }
+
+  return Store;
+})();
@@ -0,0 +1,254 @@
+// Markdown to HTML for assistant replies, used inside the formatting
+// worker. Handles fenced code (highlighted with highlight.js), headings,
+// lists, quotes, tables, rules and paragraphs, with inline code, emphasis
+// and links. Everything else is escaped, so the output is safe to insert.
+const Markdown = (function () {
+  const escapeHtml = Highlight.escapeHtml;
+
+  const FENCE = /^ {0,3}(`{3,}|~{3,})\s*([^\s`]*)/;
+  const HEADING = /^ {0,3}(#{1,6})\s+(.*?)(?:\s+#+)?\s*$/;
+  const RULE = /^ {0,3}([-*_])(?:\s*\1){2,}\s*$/;
+  const QUOTE = /^ {0,3}>\s?/;
+  const LIST_ITEM = /^( {0,3})([-*+]|\d{1,9}[.)])\s+/;
+  const TABLE_DIVIDER = /^\s*\|?\s*:?-+:?\s*(?:\|\s*:?-+:?\s*)*\|?\s*$/;
+
+  const LANGUAGE_ALIASES = {
+    py: "python", python3: "python", js: "javascript", node: "javascript",
+    jsx: "javascript", ts: "typescript", sh: "bash", shell: "bash", zsh: "bash",
+    console: "bash", "c++": "cpp", cs: "csharp", "c#": "csharp", golang: "go",
+    rs: "rust", yml: "yaml", htm: "html", xml: "html"
+  };
+
+  // Each matching pattern scores a point; the best score wins
+  const LANGUAGE_PATTERNS = {
+    python: [/^\s*(?:from\s+[\w.]+\s+)?import\s+\w+/m, /\bdef\s+\w+\s*\(.*\)\s*:/, /\bclass\s+\w+(?:\(.*\))?:/, /^\s*@\w+/m, /\bprint\s*\(/, /\bself\b/, /\belif\b|\bNone\b/],
+    javascript: [/\b(?:const|let|var)\s+\w+\s*=/, /\bfunction\s*\w*\s*\(/, /=>/, /\bconsole\.\w+\(/, /\bdocument\.|\bwindow\./, /\brequire\(|\bexport\s+(?:default|const|function)/],
+    typescript: [/\binterface\s+\w+\s*{/, /:\s*(?:string|number|boolean)\b/, /\btype\s+\w+\s*=/],
+    java: [/\bpublic\s+(?:static\s+)?(?:class|void|int)\b/, /\bSystem\.out\.print/, /\bString\[\]\s+args\b/, /\bprivate\s+\w+\s+\w+;/],
+    cpp: [/#include\s*<\w+(?:\.h)?>/, /\bstd::/, /\bint\s+main\s*\(/, /\bcout\s*<</],
+    csharp: [/\busing\s+System\b/, /\bnamespace\s+\w+/, /\bConsole\.Write/],
+    go: [/^package\s+\w+/m, /\bfunc\s+\w*\s*\(/, /\bfmt\.\w+\(/, /:=/],
+    rust: [/\bfn\s+\w+\s*\(/, /\blet\s+mut\b/, /\bprintln!\(/, /\bimpl\b|\bpub\s+fn\b/],
+    bash: [/^\s*(?:sudo|apt(?:-get)?|pip|npm|cd|ls|mkdir|export|echo|curl|git)\b/m, /\$\{?\w+\}?/, /\bfi\b|\bdone\b|\besac\b/],
+    sql: [/\bSELECT\b[\s\S]+\bFROM\b/i, /\bINSERT\s+INTO\b/i, /\bCREATE\s+TABLE\b/i, /\bWHERE\b/i],
+    json: [/^\s*[{\[]/, /"[\w-]+"\s*:/, /^\s*[}\]]\s*$/m],
+    html: [/<\/?(?:div|span|html|body|head|p|a|script)\b/i, /<!DOCTYPE/i],
+    css: [/^\s*[.#]?[\w-]+\s*{[^}]*:[^}]*}/m, /\b(?:color|margin|padding|display)\s*:/]
+  };
+
+  function normalizeLanguage(name) {
+    const lower = (name || "").toLowerCase();
+    return LANGUAGE_ALIASES[lower] || lower;
+  }
+
+  function detectLanguage(code) {
+    const shebang = code.match(/^#!.*?\b(?:env\s+)?(python[23]?|node|bash|sh|zsh|ruby)\b/);
+    if (shebang) return normalizeLanguage(shebang[1]);
+    let best = "plaintext";
+    let bestScore = 0;
+    for (const [language, patterns] of Object.entries(LANGUAGE_PATTERNS)) {
+      const score = patterns.reduce((total, pattern) => total + (pattern.test(code) ? 1 : 0), 0);
+      if (score > bestScore) {
+        best = language;
+        bestScore = score;
+      }
+    }
+    return best;
+  }
+
+  function codeBlock(code, info) {
+    const language = normalizeLanguage(info) || detectLanguage(code);
+    const label = escapeHtml(language);
+    return `<div class="code-block"><div class="code-header">` +
+      `<span class="code-language">${label}</span>` +
+      `<button class="copy-button" onclick="copyCode(this)">Copy</button></div>` +
+      `<pre><code class="language-${label.replace(/[^\w-]/g, "")}" data-highlighted="true">` +
+      `${Highlight.highlight(code, language)}</code></pre></div>`;
+  }
+
+  // Inline spans. Code spans are cut out first so nothing inside them is
+  // interpreted; the rest is escaped before the emphasis rules run.
+  function inline(text) {
+    return text.split(/(`+[^`]*?`+)/).map((part, index) => {
+      if (index % 2 === 1) {
+        return `<code class="inline-code">${escapeHtml(part.replace(/^`+\s?|\s?`+$/g, ""))}</code>`;
+      }
+      return escapeHtml(part)
+        .replace(/\[([^\]]+)\]\((https?:\/\/[^\s)]+)\)/g, '<a href="$2" target="_blank" rel="noopener noreferrer">$1</a>')
+        .replace(/\*\*(?=\S)([\s\S]*?\S)\*\*|__(?=\S)([\s\S]*?\S)__/g, (m, a, b) => `<strong>${a || b}</strong>`)
+        .replace(/(^|[^*\w])\*(?=\S)([^*]*?\S)\*(?!\w)|(^|\W)_(?=\S)([^_]*?\S)_(?!\w)/g,
+          (m, p1, a, p2, b) => `${p1 || p2 || ""}<em>${a || b}</em>`)
+        .replace(/~~(?=\S)([\s\S]*?\S)~~/g, "<del>$1</del>");
+    }).join("");
+  }
+
+  function splitRow(line) {
+    return line.trim().replace(/^\||\|$/g, "").split("|").map((cell) => cell.trim());
+  }
+
+  function table(lines) {
+    const header = splitRow(lines[0]);
+    const aligns = splitRow(lines[1]).map((cell) =>
+      cell.startsWith(":") && cell.endsWith(":") ? "center" : cell.endsWith(":") ? "right" : cell.startsWith(":") ? "left" : ""
+    );
+    const cell = (tag, text, i) =>
+      `<${tag}${aligns[i] ? ` style="text-align:${aligns[i]}"` : ""}>${inline(text)}</${tag}>`;
+    let html = "<table><thead><tr>" + header.map((text, i) => cell("th", text, i)).join("") + "</tr></thead><tbody>";
+    for (const line of lines.slice(2)) {
+      html += "<tr>" + splitRow(line).map((text, i) => cell("td", text, i)).join("") + "</tr>";
+    }
+    return html + "</tbody></table>";
+  }
+
+  function startsBlock(line) {
+    return FENCE.test(line) || HEADING.test(line) || RULE.test(line) || QUOTE.test(line) || LIST_ITEM.test(line);
+  }
+
+  function list(lines, start) {
+    const first = lines[start].match(LIST_ITEM);
+    const ordered = /\d/.test(first[2]);
+    const items = [];
+    let i = start;
+    while (i < lines.length) {
+      const match = lines[i].match(LIST_ITEM);
+      if (match && /\d/.test(match[2]) === ordered && match[1].length <= first[1].length) {
+        items.push([lines[i].slice(match[0].length)]);
+        i++;
+      } else if (items.length && lines[i].trim() && /^\s{2,}/.test(lines[i])) {
+        // Indented continuation or nested list
+        items[items.length - 1].push(lines[i].replace(/^\s{2,4}/, ""));
+        i++;
+      } else if (items.length && lines[i].trim() && !startsBlock(lines[i])) {
+        // Lazy continuation of the item's paragraph
+        items[items.length - 1].push(lines[i].trim());
+        i++;
+      } else {
+        break;
+      }
+    }
+    const tag = ordered ? "ol" : "ul";
+    const number = parseInt(first[2], 10);
+    const attrs = ordered && number !== 1 ? ` start="${number}"` : "";
+    const body = items.map((item) =>
+      item.length === 1 ? `<li>${inline(item[0])}</li>` : `<li>${render(item.join("\n"))}</li>`
+    ).join("");
+    return { html: `<${tag}${attrs}>${body}</${tag}>`, next: i };
+  }
+
+  function render(text) {
+    const lines = text.replace(/\r\n?/g, "\n").split("\n");
+    let html = "";
+    let i = 0;
+    while (i < lines.length) {
+      const line = lines[i];
+      let match;
+      if (!line.trim()) {
+        i++;
+      } else if ((match = line.match(FENCE))) {
+        const marker = match[1];
+        const code = [];
+        i++;
+        while (i < lines.length && !(lines[i].trim().startsWith(marker) && /^[`~]+$/.test(lines[i].trim()))) {
+          code.push(lines[i]);
+          i++;
+        }
+        i++;
+        html += codeBlock(code.join("\n"), match[2]);
+      } else if ((match = line.match(HEADING))) {
+        const level = match[1].length;
+        html += `<h${level}>${inline(match[2])}</h${level}>`;
+        i++;
+      } else if (RULE.test(line)) {
+        html += "<hr>";
+        i++;
+      } else if (QUOTE.test(line)) {
+        const quoted = [];
+        while (i < lines.length && lines[i].trim() && QUOTE.test(lines[i])) {
+          quoted.push(lines[i].replace(QUOTE, ""));
+          i++;
+        }
+        html += `<blockquote>${render(quoted.join("\n"))}</blockquote>`;
+      } else if (LIST_ITEM.test(line)) {
+        const result = list(lines, i);
+        html += result.html;
+        i = result.next;
+      } else if (line.includes("|") && i + 1 < lines.length && TABLE_DIVIDER.test(lines[i + 1]) && lines[i + 1].includes("-")) {
+        const rows = [line, lines[i + 1]];
+        i += 2;
+        while (i < lines.length && lines[i].includes("|") && lines[i].trim()) {
+          rows.push(lines[i]);
+          i++;
+        }
+        html += table(rows);
+      } else {
+        const paragraph = [line.trim()];
+        i++;
+        while (i < lines.length && lines[i].trim() && !startsBlock(lines[i])) {
+          paragraph.push(lines[i].trim());
+          i++;
+        }
+        html += `<p>${paragraph.map(inline).join("<br>")}</p>`;
+      }
+    }
+    return html;
+  }
+
+  // Incremental rendering of a streamed reply. Text up to the last block
+  // boundary (a blank line or a closed fence) is final and is rendered
+  // exactly once; only the block still being written is re-rendered.
+  class Stream {
+    constructor() {
+      this.text = "";
+      this.html = "";
+      this.pending = "";
+      this.stable = 0;
+      this.scanned = 0;
+      this.fence = null;
+    }
+
+    push(delta) {
+      this.text += delta;
+      let boundary = this.stable;
+      let newline;
+      while ((newline = this.text.indexOf("\n", this.scanned)) !== -1) {
+        const lineStart = this.scanned;
+        const line = this.text.slice(lineStart, newline);
+        this.scanned = newline + 1;
+        if (this.fence) {
+          const trimmed = line.trim();
+          if (trimmed.startsWith(this.fence) && /^[`~]+$/.test(trimmed)) {
+            this.fence = null;
+            boundary = this.scanned;
+          }
+        } else {
+          const match = line.match(FENCE);
+          if (match) {
+            this.fence = match[1];
+            boundary = lineStart;
+          } else if (!line.trim()) {
+            boundary = this.scanned;
+          }
+        }
+      }
+      if (boundary > this.stable) {
+        const fragment = render(this.text.slice(this.stable, boundary));
+        this.html += fragment;
+        this.pending += fragment;
+        this.stable = boundary;
+      }
+    }
+
+    // HTML finished since the last take, plus the current unfinished block
+    take() {
+      const update = { append: this.pending, tail: render(this.text.slice(this.stable)) };
+      this.pending = "";
+      return update;
+    }
+
+    finish() {
+      return this.html + render(this.text.slice(this.stable));
+    }
+  }
+
+  return { render, detectLanguage, Stream };
+})();
@@ -0,0 +1,267 @@
+// Virtualized message list for the chat window. Only the messages in or
+// near the viewport are in the DOM; the rest are stood in for by two
+// spacers sized from measured (or estimated) heights. Each message is
+// formatted once and its HTML cached, and the entries of recently viewed
+// sessions are kept, so switching back to one does no formatting at all.
+// format(role, content) may return the HTML or a promise of it; until it
+// resolves the message is shown as plain text.
+class MessageList {
+  constructor(container, format, options) {
+    this.container = container;
+    this.format = format;
+    this.options = Object.assign({ overscan: 800, sessions: 20, stickyDistance: 40 }, options);
+    this.topSpacer = this.spacer();
+    this.bottomSpacer = this.spacer();
+    this.sessions = new Map();
+    this.key = null;
+    this.entries = [];
+    this.messages = [];
+    this.offsets = [0];
+    this.dirty = false;
+    this.start = 0;
+    this.end = 0;
+    this.stick = true;
+    this.frame = null;
+    this.container.replaceChildren(this.topSpacer, this.bottomSpacer);
+
+    this.container.addEventListener("scroll", () => {
+      const c = this.container;
+      this.stick = c.scrollHeight - c.scrollTop - c.clientHeight < this.options.stickyDistance;
+      this.schedule();
+    });
+    window.addEventListener("resize", () => this.schedule());
+  }
+
+  spacer() {
+    const div = document.createElement("div");
+    div.className = "message-spacer";
+    return div;
+  }
+
+  entry(role, content, streaming) {
+    // Rough height until the message has been in the DOM once
+    const lines = content.split("\n").length + content.length / 80;
+    return {
+      role,
+      content,
+      html: null,
+      formatting: false,
+      streamed: streaming ? "" : null,
+      tail: "",
+      height: 40 + lines * 24,
+      node: null,
+      shown: false
+    };
+  }
+
+  // Show a session's messages. Entries are reused when the same messages
+  // array was shown before under this key.
+  show(key, messages) {
+    let cached = key === null ? null : this.sessions.get(key);
+    if (!cached || cached.messages !== messages) {
+      cached = { messages, entries: messages.map((m) => this.entry(m.role, m.content)) };
+    }
+    this.entries.forEach((entry) => (entry.node = null));
+    this.key = key;
+    this.messages = messages;
+    this.entries = cached.entries;
+    this.remember(key);
+    this.start = this.end = 0;
+    this.dirty = true;
+    this.stick = true;
+    this.container.replaceChildren(this.topSpacer, this.bottomSpacer);
+    this.render();
+  }
+
+  // Keep the current entries under key, e.g. once a draft has an id
+  remember(key) {
+    this.key = key;
+    if (key === null) return;
+    this.sessions.delete(key);
+    this.sessions.set(key, { messages: this.messages, entries: this.entries });
+    if (this.sessions.size > this.options.sessions) {
+      this.sessions.delete(this.sessions.keys().next().value);
+    }
+  }
+
+  forget(key) {
+    this.sessions.delete(key);
+  }
+
+  append(role, content, streaming) {
+    const entry = this.entry(role, content, streaming);
+    this.entries.push(entry);
+    this.dirty = true;
+    this.render();
+    return entry;
+  }
+
+  // Streamed replies grow by finished fragments, which are appended, and
+  // a tail for the block still being written, which is replaced
+  stream(entry, fragment, tail) {
+    entry.streamed += fragment;
+    entry.tail = tail;
+    if (entry.node) {
+      const [stableDiv, tailDiv] = entry.node.firstChild.children;
+      if (fragment) stableDiv.insertAdjacentHTML("beforeend", fragment);
+      tailDiv.innerHTML = tail;
+    }
+    this.schedule();
+  }
+
+  // Final content of a message, with its HTML when already formatted
+  finish(entry, content, html) {
+    entry.content = content;
+    entry.streamed = null;
+    entry.html = html === undefined ? null : html;
+    if (entry.node) this.fill(entry.node.firstChild, entry);
+    this.schedule();
+  }
+
+  html(entry) {
+    if (entry.html === null && !entry.formatting) {
+      const content = entry.content;
+      const result = this.format(entry.role, content);
+      if (typeof result === "string") {
+        entry.html = result;
+      } else {
+        entry.formatting = true;
+        result.then((html) => {
+          entry.formatting = false;
+          if (entry.content !== content) return;
+          entry.html = html;
+          if (entry.node) {
+            entry.node.firstChild.innerHTML = html;
+            this.schedule();
+          }
+        });
+      }
+    }
+    return entry.html;
+  }
+
+  fill(contentDiv, entry) {
+    if (entry.streamed !== null) {
+      contentDiv.innerHTML = `<div class="stream-done">${entry.streamed}</div><div class="stream-tail">${entry.tail}</div>`;
+      return;
+    }
+    const html = this.html(entry);
+    if (html === null) contentDiv.textContent = entry.content;
+    else contentDiv.innerHTML = html;
+  }
+
+  createNode(entry) {
+    const node = document.createElement("div");
+    node.className = `message ${entry.role}`;
+    // Only animate a message the first time it appears
+    if (entry.shown) node.classList.add("restored");
+    entry.shown = true;
+    const contentDiv = document.createElement("div");
+    contentDiv.className = "content";
+    this.fill(contentDiv, entry);
+    node.appendChild(contentDiv);
+    return node;
+  }
+
+  schedule() {
+    if (this.frame === null) {
+      this.frame = requestAnimationFrame(() => this.render());
+    }
+  }
+
+  updateOffsets() {
+    if (!this.dirty) return;
+    const offsets = new Array(this.entries.length + 1);
+    offsets[0] = 0;
+    for (let i = 0; i < this.entries.length; i++) {
+      offsets[i + 1] = offsets[i] + this.entries[i].height;
+    }
+    this.offsets = offsets;
+    this.dirty = false;
+  }
+
+  // Index of the entry covering y
+  indexAt(y) {
+    let low = 0;
+    let high = this.entries.length;
+    while (low < high) {
+      const mid = (low + high) >> 1;
+      if (this.offsets[mid + 1] <= y) low = mid + 1;
+      else high = mid;
+    }
+    return low;
+  }
+
+  render() {
+    if (this.frame !== null) {
+      cancelAnimationFrame(this.frame);
+      this.frame = null;
+    }
+    const c = this.container;
+    // Measuring can change heights and so the visible range; a couple of
+    // passes settles it
+    for (let pass = 0; pass < 3; pass++) {
+      this.updateOffsets();
+      this.sizeSpacers();
+      if (this.stick) c.scrollTop = c.scrollHeight;
+      const start = this.indexAt(c.scrollTop - this.options.overscan);
+      const end = Math.min(this.entries.length, this.indexAt(c.scrollTop + c.clientHeight + this.options.overscan) + 1);
+      this.mount(start, end);
+      const shift = this.measure();
+      this.updateOffsets();
+      this.sizeSpacers();
+      if (this.stick) c.scrollTop = c.scrollHeight;
+      else if (shift) c.scrollTop += shift;
+      if (!shift && start === this.start && end === this.end) break;
+    }
+  }
+
+  mount(start, end) {
+    for (let i = this.start; i < this.end; i++) {
+      if ((i < start || i >= end) && this.entries[i] && this.entries[i].node) {
+        this.entries[i].node.remove();
+        this.entries[i].node = null;
+      }
+    }
+    let previous = this.topSpacer;
+    for (let i = start; i < end; i++) {
+      const entry = this.entries[i];
+      if (!entry.node) entry.node = this.createNode(entry);
+      if (previous.nextSibling !== entry.node) previous.after(entry.node);
+      previous = entry.node;
+    }
+    this.start = start;
+    this.end = end;
+  }
+
+  // Record real heights of the mounted messages. Returns how far the
+  // content above the viewport moved, so the caller can keep it steady.
+  measure() {
+    let shift = 0;
+    const top = this.container.scrollTop;
+    for (let i = this.start; i < this.end; i++) {
+      const entry = this.entries[i];
+      const style = getComputedStyle(entry.node);
+      const height = entry.node.offsetHeight + parseFloat(style.marginTop) + parseFloat(style.marginBottom);
+      if (height !== entry.height) {
+        if (this.offsets[i] < top) shift += height - entry.height;
+        entry.height = height;
+        this.dirty = true;
+      }
+    }
+    return shift;
+  }
+
+  sizeSpacers() {
+    const total = this.offsets[this.entries.length];
+    const start = Math.min(this.start, this.entries.length);
+    const end = Math.min(this.end, this.entries.length);
+    this.topSpacer.style.height = this.offsets[start] + "px";
+    this.bottomSpacer.style.height = total - this.offsets[end] + "px";
+  }
+
+  scrollToBottom() {
+    this.stick = true;
+    this.render();
+  }
+}
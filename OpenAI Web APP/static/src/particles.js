@@ -0,0 +1,126 @@
+// Canvas particle background: drifting dots joined by faint lines when
+// they are close, pushed away from the pointer, with a few more added on
+// click. Takes the same shape of options the page used with particles.js.
+function startParticles(containerId, options) {
+  const container = document.getElementById(containerId);
+  if (!container) return;
+  const canvas = document.createElement("canvas");
+  canvas.style.width = "100%";
+  canvas.style.height = "100%";
+  canvas.style.display = "block";
+  container.appendChild(canvas);
+  const context = canvas.getContext("2d");
+
+  const settings = Object.assign({
+    count: 80,
+    area: 800,
+    color: "255, 255, 255",
+    opacity: 0.5,
+    size: 3,
+    speed: 4,
+    linkDistance: 150,
+    linkOpacity: 0.4,
+    repulseDistance: 100,
+    pushCount: 4
+  }, options);
+
+  const particles = [];
+  const pointer = { x: null, y: null };
+  let ratio = 1;
+  let width = 0;
+  let height = 0;
+
+  function spawn(x, y) {
+    const angle = Math.random() * Math.PI * 2;
+    const velocity = (settings.speed / 2) * (0.5 + Math.random() / 2);
+    particles.push({
+      x: x === undefined ? Math.random() * width : x,
+      y: y === undefined ? Math.random() * height : y,
+      vx: Math.cos(angle) * velocity,
+      vy: Math.sin(angle) * velocity,
+      radius: Math.random() * settings.size * ratio
+    });
+  }
+
+  function resize() {
+    ratio = settings.retina && window.devicePixelRatio > 1 ? window.devicePixelRatio : 1;
+    width = canvas.width = container.offsetWidth * ratio;
+    height = canvas.height = container.offsetHeight * ratio;
+    // Keep the density constant: count particles per area x area square
+    const wanted = Math.round((settings.count * (width / ratio) * (height / ratio)) / (settings.area * settings.area));
+    while (particles.length < wanted) spawn();
+    particles.length = Math.min(particles.length, wanted);
+  }
+
+  function step() {
+    const linkDistance = settings.linkDistance * ratio;
+    const repulseDistance = settings.repulseDistance * ratio;
+    context.clearRect(0, 0, width, height);
+
+    for (const p of particles) {
+      p.x += p.vx * ratio;
+      p.y += p.vy * ratio;
+      if (pointer.x !== null) {
+        const dx = p.x - pointer.x;
+        const dy = p.y - pointer.y;
+        const distance = Math.hypot(dx, dy);
+        if (distance > 0 && distance < repulseDistance) {
+          const force = (repulseDistance - distance) / repulseDistance;
+          p.x += (dx / distance) * force * 10 * ratio;
+          p.y += (dy / distance) * force * 10 * ratio;
+        }
+      }
+      // Leaving one edge brings the particle back on the opposite one
+      if (p.x < -p.radius) p.x = width + p.radius;
+      else if (p.x > width + p.radius) p.x = -p.radius;
+      if (p.y < -p.radius) p.y = height + p.radius;
+      else if (p.y > height + p.radius) p.y = -p.radius;
+    }
+
+    context.lineWidth = ratio;
+    for (let i = 0; i < particles.length; i++) {
+      const a = particles[i];
+      for (let j = i + 1; j < particles.length; j++) {
+        const b = particles[j];
+        const dx = a.x - b.x;
+        if (dx > linkDistance || dx < -linkDistance) continue;
+        const distance = Math.hypot(dx, a.y - b.y);
+        if (distance < linkDistance) {
+          context.strokeStyle = `rgba(${settings.color}, ${settings.linkOpacity * (1 - distance / linkDistance)})`;
+          context.beginPath();
+          context.moveTo(a.x, a.y);
+          context.lineTo(b.x, b.y);
+          context.stroke();
+        }
+      }
+    }
+
+    context.fillStyle = `rgba(${settings.color}, ${settings.opacity})`;
+    context.beginPath();
+    for (const p of particles) {
+      context.moveTo(p.x + p.radius, p.y);
+      context.arc(p.x, p.y, p.radius, 0, Math.PI * 2);
+    }
+    context.fill();
+    requestAnimationFrame(step);
+  }
+
+  canvas.addEventListener("mousemove", (e) => {
+    const bounds = canvas.getBoundingClientRect();
+    pointer.x = (e.clientX - bounds.left) * ratio;
+    pointer.y = (e.clientY - bounds.top) * ratio;
+  });
+  canvas.addEventListener("mouseleave", () => {
+    pointer.x = pointer.y = null;
+  });
+  canvas.addEventListener("click", (e) => {
+    const bounds = canvas.getBoundingClientRect();
+    for (let i = 0; i < settings.pushCount; i++) {
+      spawn((e.clientX - bounds.left) * ratio, (e.clientY - bounds.top) * ratio);
+    }
+  });
+  window.addEventListener("resize", resize);
+
+  resize();
+  requestAnimationFrame(step);
+}
@@ -0,0 +1,116 @@
+import pytest
+
+from attachments import AttachmentStore, AttachmentTooLarge, ChunkParser, terms
+
+def parse(name, data, step=None, **kwargs):
+    parser = ChunkParser(name, **kwargs)
+    step = step or len(data)
+    for i in range(0, len(data), step):
+        parser.feed(data[i:i + step])
+    return parser, parser.finish()
+
+@pytest.fixture
+def store():
+    store = AttachmentStore(':memory:', chunk_tokens=40, context_tokens=60)
+    yield store
+    store.close()
+
+def upload(store, name, text):
+    parser = store.parser(name)
+    parser.feed(text.encode('utf-8'))
+    return store.save(parser)
+
+def test_terms_split_identifiers():
+    assert terms('parseHTTPRequest snake_case x') == ['parse', 'httprequest', 'snake', 'case']
+
+def test_chunks_do_not_depend_on_how_the_upload_is_split():
+    text = ''.join(f'línea {i}: café ☕ {"word " * 20}\n' for i in range(40)).encode('utf-8')
+    whole, whole_chunks = parse('notes.txt', text, chunk_tokens=50)
+    # One byte at a time cuts multi-byte characters in half
+    _, byte_chunks = parse('notes.txt', text, step=1, chunk_tokens=50)
+    assert byte_chunks == whole_chunks
+    assert len(whole_chunks) > 1
+    assert whole.id == parse('other.txt', text, step=7, chunk_tokens=50)[0].id
+
+def test_chunks_cover_every_line_in_order():
+    lines = [f'line {i} ' + 'x ' * 10 for i in range(1, 51)]
+    _, chunks = parse('a.txt', '\n'.join(lines).encode(), chunk_tokens=40)
+    assert chunks[0][0] == 1
+    assert chunks[-1][1] == 50
+    for (_, end, _), (start, _, _) in zip(chunks, chunks[1:]):
+        assert start == end + 1
+    assert '\n'.join(text for _, _, text in chunks) == '\n'.join(lines)
+
+def test_csv_chunks_repeat_the_header_and_keep_quoted_rows_whole():
+    rows = ['id,note'] + [f'{i},"first line {i}\nsecond line {i}"' for i in range(30)]
+    _, chunks = parse('data.csv', '\n'.join(rows).encode(), chunk_tokens=40)
+    assert len(chunks) > 1
+    for _, _, text in chunks:
+        assert text.startswith('id,note\n')
+        body = text.split('\n', 1)[1]
+        assert body.count('"') % 2 == 0
+
+def test_parser_rejects_oversized_binary_and_empty_uploads():
+    with pytest.raises(AttachmentTooLarge):
+        parse('a.txt', b'x' * 11, max_bytes=10)
+    with pytest.raises(ValueError):
+        parse('a.bin', b'abc\0def')
+    with pytest.raises(ValueError):
+        parse('a.txt', b'\xff\xfe\xfa')
+    with pytest.raises(ValueError):
+        parse('a.txt', b'\n\n  \n')
+
+def test_save_deduplicates_by_content(store):
+    first = upload(store, 'a.txt', 'hello world\n')
+    second = upload(store, 'b.txt', 'hello world\n')
+    assert first['id'] == second['id']
+    assert not first['deduplicated'] and second['deduplicated']
+    assert store.db.execute('SELECT COUNT(*) FROM chunks').fetchone()[0] == 1
+
+def test_resolve_validates_ids(store):
+    saved = upload(store, 'a.txt', 'hello\n')
+    assert store.resolve(None) == []
+    assert store.resolve([saved['id'], saved['id']]) == [saved['id']]
+    for bad in ('abc', [1], ['missing']):
+        with pytest.raises(ValueError):
+            store.resolve(bad)
+
+def test_links_are_per_conversation(store):
+    a = upload(store, 'a.txt', 'alpha\n')['id']
+    b = upload(store, 'b.txt', 'beta\n')['id']
+    store.link('c1', [a])
+    store.link('c1', [a, b])
+    store.link('c2', [b])
+    assert sorted(store.linked('c1')) == sorted([a, b])
+    store.unlink('c1')
+    assert store.linked('c1') == []
+    assert store.linked('c2') == [b]
+
+def test_excerpts_pick_matching_chunks_within_budget(store):
+    paragraphs = [f'paragraph {i} about gardening and soil ' * 3 for i in range(20)]
+    paragraphs[13] = 'the flux capacitor needs plutonium to reach full power ' * 2
+    saved = upload(store, 'manual.txt', '\n\n'.join(paragraphs))
+    excerpts = store.excerpts([saved['id']], 'how much plutonium does the flux capacitor need?')
+    assert excerpts
+    assert 'plutonium' in excerpts[0][3]
+    tokens = {chunk['start']: chunk['tokens'] for chunk in store.index(saved['id'])[1]}
+    assert sum(tokens.values()) > store.context_tokens
+    assert sum(tokens[start] for _, start, _, _ in excerpts) <= store.context_tokens
+
+def test_small_files_are_sent_whole(store):
+    saved = upload(store, 'a.txt', 'tiny file\n')
+    assert [text for _, _, _, text in store.excerpts([saved['id']], 'unrelated')] == ['tiny file']
+
+def test_inject_changes_only_the_last_user_turn(store):
+    saved = upload(store, 'a.txt', 'the secret is 42\n')
+    messages = [
+        {'role': 'user', 'content': 'hi'},
+        {'role': 'assistant', 'content': 'hello'},
+        {'role': 'user', 'content': 'what is the secret?'}
+    ]
+    injected = store.inject(messages, [saved['id']])
+    assert injected[:2] == messages[:2]
+    assert 'the secret is 42' in injected[2]['content']
+    assert injected[2]['content'].endswith('what is the secret?')
+    assert messages[2]['content'] == 'what is the secret?'
+    assert store.inject(messages, []) is messages
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from batch import parse_items, parse_timeout, run_batch, arun_batch
+
+def result(text):
+    return {
+        'response': text,
+        'usage': {
+            'total_tokens': 3,
+            'prompt_tokens': 2,
+            'completion_tokens_details': {'reasoning_tokens': 1},
+            'prompt_tokens_details': {'cached_tokens': 1}
+        }
+    }
+
+def decode(lines):
+    return [json.loads(line) for line in lines]
+
+def test_parse_items():
+    items = parse_items({'conversations': [[{'role': 'user', 'content': 'a'}], {'id': 'x', 'messages': []}]}, 5)
+    assert items == [(0, [{'role': 'user', 'content': 'a'}]), ('x', [])]
+    with pytest.raises(ValueError):
+        parse_items({'conversations': []}, 5)
+    with pytest.raises(ValueError):
+        parse_items({'conversations': [[]] * 6}, 5)
+
+@pytest.mark.parametrize('value', ['abc', 0, -1, 601, float('nan'), float('inf')])
+def test_parse_timeout_rejects_out_of_range(value):
+    with pytest.raises(ValueError):
+        parse_timeout(value, 120, 600)
+
+def test_parse_timeout_default():
+    assert parse_timeout(None, 120, 600) == 120
+    assert parse_timeout('30', 120, 600) == 30.0
+
+def test_run_batch_reports_every_item_and_totals():
+    def complete(messages):
+        if messages == 'bad':
+            raise RuntimeError('boom')
+        return result(messages)
+    items = [('a', 'one'), ('b', 'bad'), ('c', 'two')]
+    with ThreadPoolExecutor(2) as pool:
+        lines = decode(run_batch(items, complete, pool, 5))
+    summary = lines.pop()
+    assert sorted(line['id'] for line in lines) == ['a', 'b', 'c']
+    assert [line['error'] for line in lines if 'error' in line] == ['boom']
+    assert (summary['completed'], summary['failed']) == (2, 1)
+    assert summary['usage']['total_tokens'] == 6
+    assert summary['usage']['completion_tokens_details']['reasoning_tokens'] == 2
+    assert summary['usage']['prompt_tokens_details']['cached_tokens'] == 2
+
+def test_run_batch_times_out_slow_items_only():
+    release = threading.Event()
+    def complete(messages):
+        if messages == 'slow':
+            release.wait(5)
+        return result(messages)
+    items = [(0, 'slow'), (1, 'fast')]
+    with ThreadPoolExecutor(2) as pool:
+        started = time.monotonic()
+        lines = decode(run_batch(items, complete, pool, 0.2))
+        elapsed = time.monotonic() - started
+        release.set()
+    assert elapsed < 2
+    by_id = {line['id']: line for line in lines[:-1]}
+    assert by_id[0]['error'] == 'timed out after 0.2s'
+    assert by_id[1]['response'] == 'fast'
+
+def test_run_batch_timeout_starts_when_the_item_runs():
+    # With one worker the second item queues behind the first; queueing
+    # does not count towards its timeout
+    def complete(messages):
+        time.sleep(0.15)
+        return result(messages)
+    with ThreadPoolExecutor(1) as pool:
+        lines = decode(run_batch([(0, 'a'), (1, 'b')], complete, pool, 0.25))
+    assert lines[-1]['completed'] == 2
+
+def test_run_batch_cancels_queued_items_when_closed():
+    calls = []
+    def complete(messages):
+        calls.append(messages)
+        time.sleep(0.05)
+        return result(messages)
+    with ThreadPoolExecutor(1) as pool:
+        lines = run_batch([(i, str(i)) for i in range(10)], complete, pool, 5)
+        next(lines)
+        lines.close()
+    assert len(calls) < 10
+
+def test_arun_batch_times_out_per_item():
+    async def complete(messages):
+        if messages == 'slow':
+            await asyncio.sleep(5)
+        if messages == 'bad':
+            raise RuntimeError('boom')
+        return result(messages)
+    async def main():
+        return [line async for line in arun_batch([(0, 'slow'), (1, 'fast'), (2, 'bad')], complete, asyncio.Semaphore(3), 0.1)]
+    lines = decode(asyncio.run(main()))
+    summary = lines.pop()
+    by_id = {line['id']: line for line in lines}
+    assert by_id[0]['error'] == 'timed out after 0.1s'
+    assert by_id[1]['response'] == 'fast'
+    assert by_id[2]['error'] == 'boom'
+    assert (summary['completed'], summary['failed']) == (1, 2)
+
+def test_arun_batch_limits_concurrency():
+    running = []
+    peak = []
+    async def complete(messages):
+        running.append(messages)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(messages)
+        return result(messages)
+    async def main():
+        return [line async for line in arun_batch([(i, str(i)) for i in range(8)], complete, asyncio.Semaphore(2), 5)]
+    lines = decode(asyncio.run(main()))
+    assert lines[-1]['completed'] == 8
+    assert max(peak) == 2
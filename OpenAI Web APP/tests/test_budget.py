@@ -0,0 +1,92 @@
+import asyncio
+
+from budget import ContextBudget, message_tokens, prompt_tokens
+
+def turn(role, words, tag=''):
+    return {'role': role, 'content': ' '.join(f'{role}{tag}-{i}' for i in range(words))}
+
+def conversation(turns=8, words=40):
+    messages = [{'role': 'system', 'content': 'be brief'}]
+    for i in range(turns):
+        messages.append(turn('user' if i % 2 == 0 else 'assistant', words, i))
+    return messages
+
+def test_under_budget_is_unchanged():
+    messages = conversation(2)
+    budget = ContextBudget(max_tokens=prompt_tokens(messages))
+    fitted, report = budget.fit(messages)
+    assert fitted is messages
+    assert report['strategy'] is None
+    assert report['tokens_saved'] == 0
+
+def test_drop_oldest_fits_and_keeps_the_last_turn():
+    messages = conversation()
+    budget = ContextBudget(max_tokens=prompt_tokens(messages[:1] + messages[-3:]))
+    fitted, report = budget.fit(messages)
+    assert fitted == messages[:1] + messages[-3:]
+    assert report['strategy'] == 'drop_oldest'
+    assert report['prompt_tokens'] == prompt_tokens(fitted) <= budget.max_tokens
+    # Even when nothing fits, the message being answered is sent
+    fitted, _ = ContextBudget(max_tokens=1).fit(messages)
+    assert fitted == [messages[0], messages[-1]]
+
+def test_trimming_keeps_system_messages_in_place():
+    messages = conversation(6)
+    instruction = {'role': 'developer', 'content': 'answer in French from here on'}
+    messages.insert(5, instruction)
+    kept = [messages[0], messages[4], instruction, messages[5 + 1], messages[5 + 2]]
+    budget = ContextBudget(max_tokens=prompt_tokens(kept))
+    fitted, _ = budget.fit(messages)
+    assert fitted == kept
+
+def test_last_n_keeps_the_last_turns():
+    messages = conversation()
+    budget = ContextBudget(max_tokens=prompt_tokens(messages) - 1, strategy='last_n', keep_turns=3)
+    fitted, report = budget.fit(messages)
+    assert fitted == messages[:1] + messages[-3:]
+    assert report['strategy'] == 'last_n'
+
+def test_summary_replaces_older_turns_and_is_cached():
+    messages = conversation(8)
+    budget = ContextBudget(max_tokens=prompt_tokens(messages) - 1, strategy='summarize', keep_turns=2)
+    requests = []
+    def summarize(request):
+        requests.append(request)
+        return 'the story so far'
+    fitted, report = budget.fit(messages, summarize)
+    assert report['strategy'] == 'summarize'
+    assert fitted[0] == messages[0]
+    assert fitted[1]['role'] == 'system' and 'the story so far' in fitted[1]['content']
+    assert fitted[2:] == messages[-2:]
+    # The same history reuses the cached summary
+    assert budget.fit(messages, summarize)[0] == fitted
+    assert len(requests) == 1
+
+def test_summary_extends_a_cached_prefix():
+    messages = conversation(8)
+    budget = ContextBudget(max_tokens=prompt_tokens(messages) - 1, strategy='summarize', keep_turns=2)
+    requests = []
+    def summarize(request):
+        requests.append(request)
+        return f'summary {len(requests)}'
+    budget.fit(messages, summarize)
+    longer = messages + [turn('user', 40, 8), turn('assistant', 40, 9)]
+    budget.fit(longer, summarize)
+    # Only the turns that left the recent window are sent, after the old summary
+    transcript = requests[1][-1]['content']
+    assert transcript.startswith('Summary so far:\nsummary 1')
+    assert messages[1]['content'] not in transcript
+    assert messages[-1]['content'] in transcript
+
+def test_afit_matches_fit():
+    messages = conversation(8)
+    budget = ContextBudget(max_tokens=prompt_tokens(messages) - 1, strategy='summarize', keep_turns=2)
+    async def summarize(request):
+        return 'async summary'
+    fitted, _ = asyncio.run(budget.afit(messages, summarize))
+    assert 'async summary' in fitted[1]['content']
+    assert fitted[2:] == messages[-2:]
+
+def test_message_tokens_counts_framing():
+    assert message_tokens({'role': 'user', 'content': ''}) > 0
+    assert prompt_tokens([]) > 0
@@ -0,0 +1,73 @@
+import pytest
+
+import cache as cache_module
+from cache import MemoryCache, DiskCache, cache_key
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, 'time', clock)
+    return clock
+
+@pytest.fixture(params=['memory', 'disk'])
+def make(request, tmp_path):
+    def make(max_size=2, ttl=60):
+        if request.param == 'disk':
+            return DiskCache(str(tmp_path / 'cache.sqlite3'), max_size, ttl)
+        return MemoryCache(max_size, ttl)
+    return make
+
+def test_key_ignores_key_order():
+    a = cache_key('m', [{'role': 'user', 'content': 'hi'}])
+    b = cache_key('m', [{'content': 'hi', 'role': 'user'}])
+    assert a == b
+    assert a != cache_key('other', [{'role': 'user', 'content': 'hi'}])
+
+def test_round_trip_and_stats(make, clock):
+    cache = make()
+    assert cache.get('a') is None
+    cache.set('a', {'response': 'x'})
+    assert cache.get('a') == {'response': 'x'}
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 1, 1)
+    assert stats['hit_rate'] == 0.5
+
+def test_evicts_least_recently_used(make, clock):
+    cache = make(max_size=2)
+    cache.set('a', 1)
+    clock.now += 1
+    cache.set('b', 2)
+    clock.now += 1
+    # Reading a makes b the least recently used
+    assert cache.get('a') == 1
+    clock.now += 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['size'] == 2
+
+def test_expires_after_ttl(make, clock):
+    cache = make(ttl=60)
+    cache.set('a', 1)
+    clock.now += 60
+    assert cache.get('a') == 1
+    clock.now += 1
+    assert cache.get('a') is None
+    assert cache.stats()['size'] == 0
+
+def test_disk_cache_survives_reconnect(tmp_path, clock):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = DiskCache(path)
+    cache.set('a', {'response': 'x'})
+    cache.close()
+    cache.connect()
+    assert cache.get('a') == {'response': 'x'}
+    assert DiskCache(path).get('a') == {'response': 'x'}
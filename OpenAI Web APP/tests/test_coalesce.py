@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from coalesce import SingleFlight, AsyncSingleFlight
+
+def test_concurrent_calls_share_one_result():
+    flights = SingleFlight()
+    calls = []
+    release = threading.Event()
+    def fn():
+        calls.append(True)
+        release.wait(5)
+        return {'response': 'x'}
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do('k', fn))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert results == [{'response': 'x'}] * 5
+    # The key is free again once the flight lands
+    assert flights.do('k', lambda: 'again') == 'again'
+
+def test_followers_see_the_leaders_error():
+    flights = SingleFlight()
+    started = threading.Event()
+    def fn():
+        started.set()
+        time.sleep(0.05)
+        raise RuntimeError('upstream down')
+    errors = []
+    def follow():
+        started.wait(5)
+        try:
+            flights.do('k', fn)
+        except RuntimeError as e:
+            errors.append(e)
+    follower = threading.Thread(target=follow)
+    follower.start()
+    with pytest.raises(RuntimeError):
+        flights.do('k', fn)
+    follower.join(5)
+    assert [str(e) for e in errors] == ['upstream down']
+
+def test_stream_replays_every_event_to_late_subscribers():
+    flights = SingleFlight()
+    produced = []
+    gate = threading.Event()
+    def events():
+        produced.append(True)
+        yield ('delta', 'a')
+        gate.wait(5)
+        yield ('delta', 'b')
+        yield ('usage', {'total_tokens': 2})
+    first = flights.stream('k', events)
+    assert next(first) == ('delta', 'a')
+    # Joins after the first delta was published
+    second = flights.stream('k', events)
+    gate.set()
+    expected = [('delta', 'a'), ('delta', 'b'), ('usage', {'total_tokens': 2})]
+    assert [('delta', 'a')] + list(first) == expected
+    assert list(second) == expected
+    assert len(produced) == 1
+
+def test_stream_error_reaches_subscribers():
+    flights = SingleFlight()
+    def events():
+        yield ('delta', 'a')
+        raise RuntimeError('cut off')
+    stream = flights.stream('k', events)
+    assert next(stream) == ('delta', 'a')
+    with pytest.raises(RuntimeError):
+        list(stream)
+
+def test_async_calls_share_one_result():
+    flights = AsyncSingleFlight()
+    calls = []
+    async def fn():
+        calls.append(True)
+        await asyncio.sleep(0.05)
+        return 'x'
+    async def main():
+        return await asyncio.gather(*[flights.do('k', fn) for _ in range(5)])
+    assert asyncio.run(main()) == ['x'] * 5
+    assert len(calls) == 1
+
+def test_async_cancelled_caller_does_not_cancel_the_flight():
+    flights = AsyncSingleFlight()
+    async def fn():
+        await asyncio.sleep(0.05)
+        return 'x'
+    async def main():
+        first = asyncio.ensure_future(flights.do('k', fn))
+        second = asyncio.ensure_future(flights.do('k', fn))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+    assert asyncio.run(main()) == 'x'
+
+def test_async_stream_replays_to_late_subscribers():
+    flights = AsyncSingleFlight()
+    produced = []
+    async def events():
+        produced.append(True)
+        yield ('delta', 'a')
+        await asyncio.sleep(0.02)
+        yield ('delta', 'b')
+    async def collect(stream):
+        return [event async for event in stream]
+    async def main():
+        first = flights.stream('k', events)
+        await asyncio.sleep(0.01)
+        second = flights.stream('k', events)
+        return await asyncio.gather(collect(first), collect(second))
+    first, second = asyncio.run(main())
+    assert first == second == [('delta', 'a'), ('delta', 'b')]
+    assert len(produced) == 1
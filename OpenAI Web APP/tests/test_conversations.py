@@ -0,0 +1,74 @@
+import pytest
+
+import conversations
+from conversations import ConversationStore, parse_messages, parse_turn, parse_title
+
+@pytest.fixture
+def store():
+    store = ConversationStore(':memory:')
+    yield store
+    store.close()
+
+def test_parse_messages_keeps_role_and_content():
+    parsed = parse_messages([{'role': 'user', 'content': 'hi', 'name': 'x'}])
+    assert parsed == [{'role': 'user', 'content': 'hi'}]
+
+@pytest.mark.parametrize('messages', [
+    None,
+    'hi',
+    [{'role': 'user'}],
+    [{'role': 'user', 'content': ['hi']}],
+    [{'role': 1, 'content': 'hi'}],
+    ['hi']
+])
+def test_parse_messages_rejects_malformed(messages):
+    with pytest.raises(ValueError):
+        parse_messages(messages)
+
+def test_parse_turn_and_title():
+    assert parse_turn('hi') == {'role': 'user', 'content': 'hi'}
+    assert parse_title(None) == 'Untitled Chat'
+    assert parse_title('') == 'Untitled Chat'
+    assert parse_title('Notes') == 'Notes'
+    with pytest.raises(ValueError):
+        parse_turn(5)
+    with pytest.raises(ValueError):
+        parse_title(['Notes'])
+
+def test_append_keeps_turn_order(store):
+    created = store.create('Chat', [{'role': 'system', 'content': 'be brief'}])
+    store.append(created['id'], [{'role': 'user', 'content': 'a'}, {'role': 'assistant', 'content': 'b'}], {'total_tokens': 3})
+    store.append(created['id'], [{'role': 'user', 'content': 'c'}])
+    conversation = store.get(created['id'])
+    assert [m['content'] for m in conversation['messages']] == ['be brief', 'a', 'b', 'c']
+    # A turn without usage keeps the last recorded usage
+    assert conversation['usage'] == {'total_tokens': 3}
+
+def test_missing_conversation(store):
+    assert store.get('nope') is None
+    assert store.messages('nope') is None
+    assert not store.rename('nope', 'x')
+    assert not store.delete('nope')
+
+def test_delete_removes_messages(store):
+    created = store.create('Chat', [{'role': 'user', 'content': 'a'}])
+    assert store.delete(created['id'])
+    assert store.messages(created['id']) is None
+    assert store.db.execute('SELECT COUNT(*) FROM messages').fetchone()[0] == 0
+
+def test_keyset_pages_cover_every_conversation_once(store, monkeypatch):
+    # Several conversations share an updated_at, so paging has to break
+    # ties on id to neither skip nor repeat rows
+    times = iter([100.0, 100.0, 100.0, 200.0, 200.0, 300.0, 400.0])
+    monkeypatch.setattr(conversations.time, 'time', lambda: next(times))
+    ids = [store.create(f'Chat {i}')['id'] for i in range(7)]
+    seen = []
+    page = store.list(2)
+    while page:
+        seen.extend(page)
+        last = page[-1]
+        page = store.list(2, last['updated_at'], last['id'])
+    assert sorted(c['id'] for c in seen) == sorted(ids)
+    assert len(seen) == len(ids)
+    keys = [(c['updated_at'], c['id']) for c in seen]
+    assert keys == sorted(keys, reverse=True)
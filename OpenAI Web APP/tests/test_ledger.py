@@ -0,0 +1,80 @@
+import pytest
+
+from ledger import Ledger, QuotaExceeded, client_address, hash_key, request_key
+
+def usage(total, reasoning=0, prompt=0, cached=0):
+    return {
+        'total_tokens': total,
+        'prompt_tokens': prompt,
+        'completion_tokens_details': {'reasoning_tokens': reasoning},
+        'prompt_tokens_details': {'cached_tokens': cached}
+    }
+
+@pytest.fixture
+def ledger():
+    ledger = Ledger(':memory:', quotas={'hour': 100, 'day': 0}, api_keys=['listed'])
+    yield ledger
+    ledger.close()
+
+def test_request_key_and_client_address():
+    assert request_key({'X-API-Key': 'a'}) == 'a'
+    assert request_key({'Authorization': 'Bearer b '}) == 'b'
+    assert request_key({'Authorization': 'Basic c'}) == ''
+    headers = {'X-Forwarded-For': 'spoofed, 1.1.1.1, 10.0.0.1'}
+    assert client_address(headers, '10.0.0.2') == '10.0.0.2'
+    assert client_address(headers, '10.0.0.2', trusted_proxies=1) == '10.0.0.1'
+    assert client_address(headers, '10.0.0.2', trusted_proxies=2) == '1.1.1.1'
+    assert client_address({}, '10.0.0.2', trusted_proxies=1) == '10.0.0.2'
+
+def test_only_known_keys_are_accounts(ledger):
+    assert ledger.account({'X-API-Key': 'listed'}, '1.2.3.4') == 'key:' + hash_key('listed')
+    # A made-up key falls back to the caller's address
+    assert ledger.account({'X-API-Key': 'made-up'}, '1.2.3.4') == 'addr:1.2.3.4'
+    account = ledger.register_key('registered')
+    assert ledger.account({'Authorization': 'Bearer registered'}, '1.2.3.4') == account
+
+def test_usage_aggregates_windows_and_totals(ledger):
+    ledger.record('a', '/chat', 'm', usage(30, reasoning=10, prompt=20, cached=5), now=7230)
+    ledger.record('a', '/chat', 'm', usage(20), now=7290)
+    ledger.record('b', '/chat', 'm', usage(99), now=7290)
+    report = ledger.usage('a', now=7300)
+    assert report['windows']['hour'] == {
+        'requests': 2, 'total_tokens': 50, 'reasoning_tokens': 10, 'limit': 100, 'remaining': 50
+    }
+    assert report['windows']['day']['limit'] is None
+    assert report['totals']['requests'] == 2
+    assert report['totals']['cached_tokens'] == 5
+    assert (report['totals']['first_at'], report['totals']['last_at']) == (7230, 7290)
+
+def test_buckets_leave_the_window_whole(ledger):
+    # Minute buckets: the event at 7230 is counted in the 7200 bucket, which
+    # leaves the hour window once it starts an hour or more ago
+    ledger.record('a', '/chat', 'm', usage(40), now=7230)
+    assert ledger.usage('a', now=10799)['windows']['hour']['total_tokens'] == 40
+    assert ledger.usage('a', now=10800)['windows']['hour']['total_tokens'] == 0
+    assert ledger.usage('a', now=10800)['windows']['day']['total_tokens'] == 40
+
+def test_check_raises_once_the_quota_is_spent(ledger):
+    ledger.record('a', '/chat', 'm', usage(60), now=7230)
+    ledger.check('a', now=7300)
+    ledger.record('a', '/chat', 'm', usage(40), now=7300)
+    with pytest.raises(QuotaExceeded) as raised:
+        ledger.check('a', now=8000)
+    assert raised.value.window == 'hour'
+    assert raised.value.limit == 100
+    # Until the 7200 bucket leaves the window
+    assert raised.value.retry_after == 7200 + 3600 - 8000 + 1
+    ledger.check('b', now=8000)
+    ledger.check('a', now=10800)
+
+def test_per_account_quota_overrides(ledger):
+    ledger.db.execute("INSERT INTO quotas (account, window, tokens) VALUES ('a', 'hour', 0), ('b', 'day', 10)")
+    ledger.db.commit()
+    assert ledger.limits('a') == {}
+    assert ledger.limits('b') == {'hour': 100, 'day': 10}
+    ledger.record('a', '/chat', 'm', usage(500), now=7230)
+    ledger.check('a', now=7300)
+    ledger.record('b', '/chat', 'm', usage(10), now=7230)
+    with pytest.raises(QuotaExceeded) as raised:
+        ledger.check('b', now=7300)
+    assert raised.value.window == 'day'
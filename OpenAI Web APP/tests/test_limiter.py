@@ -0,0 +1,151 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+import limiter
+from limiter import (
+    AIMDLimiter, AsyncAIMDLimiter, AdmissionTimeout, TokenBucket,
+    UpstreamGate, AsyncUpstreamGate
+)
+
+def rate_limited(retry_after=None):
+    headers = {'retry-after': str(retry_after)} if retry_after is not None else {}
+    response = httpx.Response(429, headers=headers, request=httpx.Request('POST', 'http://upstream'))
+    return openai.RateLimitError('rate limited', response=response, body=None)
+
+def always_rate_limited(retry_after=None):
+    raise rate_limited(retry_after)
+
+def make_gate(max_wait=5.0, max_retries=3, backoff=0.01, rpm=0, tpm=0, limit=4):
+    return UpstreamGate(AIMDLimiter(limit, 1, 16), rpm, tpm, max_wait, max_retries, backoff, backoff)
+
+def test_token_bucket_reserves_and_refunds():
+    bucket = TokenBucket(60)
+    assert bucket.reserve(60) == 0.0
+    # Empty: one more token is a second away at 60 per minute
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+    bucket.refund(1)
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+
+def test_aimd_grows_on_success_and_halves_on_overload():
+    aimd = AIMDLimiter(8, 1, 10, cooldown=60)
+    aimd.acquire(1)
+    aimd.release()
+    assert aimd.limit == pytest.approx(8 + 1 / 8)
+    for _ in range(3):
+        aimd.acquire(1)
+        aimd.release(overloaded=True)
+    # One decrease per cooldown however many 429s arrive together
+    assert aimd.limit == pytest.approx((8 + 1 / 8) / 2)
+    assert aimd.in_flight == 0
+
+def test_aimd_respects_bounds():
+    aimd = AIMDLimiter(2, 2, 2, cooldown=0)
+    aimd.acquire(1)
+    aimd.release(overloaded=True)
+    assert aimd.limit == 2
+    aimd.acquire(1)
+    aimd.release()
+    assert aimd.limit == 2
+
+def test_acquire_times_out_when_saturated():
+    aimd = AIMDLimiter(1, 1, 1)
+    aimd.acquire(1)
+    with pytest.raises(AdmissionTimeout):
+        aimd.acquire(0.05)
+    aimd.release()
+    aimd.acquire(0.05)
+
+def test_gate_retries_retryable_errors():
+    gate = make_gate()
+    attempts = []
+    def fn():
+        attempts.append(True)
+        if len(attempts) < 3:
+            raise rate_limited()
+        return 'ok'
+    assert gate.call(fn, 10) == 'ok'
+    assert len(attempts) == 3
+    assert gate.limiter.in_flight == 0
+
+def test_gate_gives_up_after_max_retries():
+    gate = make_gate(max_retries=2)
+    attempts = []
+    def fn():
+        attempts.append(True)
+        raise rate_limited()
+    with pytest.raises(openai.RateLimitError):
+        gate.call(fn, 10)
+    assert len(attempts) == 3
+
+def test_gate_does_not_retry_other_errors():
+    gate = make_gate()
+    attempts = []
+    def fn():
+        attempts.append(True)
+        raise ValueError('bad request')
+    with pytest.raises(ValueError):
+        gate.call(fn, 10)
+    assert len(attempts) == 1
+
+def test_retries_share_one_deadline():
+    gate = make_gate(max_wait=0.3, max_retries=100, backoff=0.1)
+    started = time.monotonic()
+    with pytest.raises(AdmissionTimeout):
+        gate.call(always_rate_limited, 10)
+    assert time.monotonic() - started < 0.5
+
+def test_retry_after_longer_than_the_deadline_is_not_waited_for():
+    gate = UpstreamGate(AIMDLimiter(4, 1, 16), 0, 0, 1.0, 3, 0.01, 30)
+    started = time.monotonic()
+    with pytest.raises(AdmissionTimeout):
+        gate.call(lambda: always_rate_limited(retry_after=10), 10)
+    assert time.monotonic() - started < 0.5
+
+def test_rate_limit_beyond_the_deadline_is_refused():
+    gate = make_gate(max_wait=0.1, rpm=60)
+    for _ in range(60):
+        gate.requests.reserve(1)
+    with pytest.raises(AdmissionTimeout):
+        gate.call(lambda: 'ok', 10)
+    # The refused request gave its reservation back
+    assert gate.requests.tokens == pytest.approx(0.0, abs=0.1)
+
+def test_settle_charges_actual_tokens():
+    gate = make_gate(tpm=1000)
+    gate.call(lambda: 'ok', 500)
+    gate.settle(500, 100)
+    assert gate.tokens.tokens == pytest.approx(900, abs=1)
+
+def test_async_gate_retries_and_releases():
+    gate = AsyncUpstreamGate(AsyncAIMDLimiter(4, 1, 16), 0, 0, 5.0, 3, 0.01, 0.01)
+    attempts = []
+    async def fn():
+        attempts.append(True)
+        if len(attempts) < 2:
+            raise rate_limited()
+        return 'ok'
+    async def main():
+        return await gate.call(fn, 10)
+    assert asyncio.run(main()) == 'ok'
+    assert len(attempts) == 2
+    assert gate.limiter.in_flight == 0
+
+def test_async_retries_share_one_deadline():
+    gate = AsyncUpstreamGate(AsyncAIMDLimiter(4, 1, 16), 0, 0, 0.3, 100, 0.1, 0.1)
+    async def fn():
+        raise rate_limited()
+    started = time.monotonic()
+    with pytest.raises(AdmissionTimeout):
+        asyncio.run(gate.call(fn, 10))
+    assert time.monotonic() - started < 0.5
+
+def test_make_gate_reads_the_environment(monkeypatch):
+    monkeypatch.setenv('UPSTREAM_INITIAL_CONCURRENCY', '3')
+    monkeypatch.setenv('UPSTREAM_RPM', '0')
+    gate = limiter.make_gate()
+    assert gate.limiter.limit == 3
+    assert gate.requests is None
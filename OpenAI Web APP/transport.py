@@ -0,0 +1,145 @@
+import gzip
+import json
+import os
+import zlib
+
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge, UnsupportedMediaType
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+DECOMPRESS_ERRORS = (zlib.error, brotli.error) if brotli else (zlib.error,)
+
+def _bounded_brotli():
+    # brotli before 1.2 can't cap its output, so a small br body could
+    # expand without limit; such versions only compress responses
+    try:
+        brotli.Decompressor().process(b'', output_buffer_limit=1)
+    except (AttributeError, TypeError):
+        return False
+    return True
+
+BROTLI_REQUESTS = bool(brotli) and _bounded_brotli()
+
+# Payload encodings for the API. Request bodies may be JSON or MessagePack
+# and may be gzip, deflate or brotli compressed (Content-Encoding).
+# Buffered responses are compressed for clients that accept it, and JSON
+# ones are sent as MessagePack to clients that ask for it in Accept.
+# Streamed responses (SSE, batch NDJSON) are left alone, since they are
+# flushed one small event at a time.
+
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+COMPRESSIBLE_TYPES = ('application/json', 'application/msgpack', 'text/html', 'text/plain')
+
+def parse_header_list(header):
+    # Lower-cased values of a comma-separated header, without those at q=0
+    values = set()
+    for part in header.split(','):
+        value, _, params = part.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q=') and not quality[2:].strip().strip('0.'):
+            continue
+        if value.strip():
+            values.add(value.strip().lower())
+    return values
+
+def is_json(mimetype):
+    return mimetype == 'application/json' or (mimetype.startswith('application/') and mimetype.endswith('+json'))
+
+class Transport:
+    def __init__(self, min_size=1024, max_body=32 * 1024 * 1024, gzip_level=6, brotli_quality=5):
+        self.min_size = min_size
+        self.max_body = max_body
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _too_large(self):
+        return RequestEntityTooLarge(f'Decompressed body exceeds {self.max_body} bytes')
+
+    def _inflate(self, body, wbits):
+        decompressor = zlib.decompressobj(wbits)
+        data = decompressor.decompress(body, self.max_body + 1)
+        if len(data) > self.max_body or decompressor.unconsumed_tail:
+            raise self._too_large()
+        return data
+
+    def decompress(self, body, content_encoding):
+        # Codings are listed in the order they were applied
+        codings = [c.strip().lower() for c in content_encoding.split(',') if c.strip()]
+        for coding in reversed(codings):
+            try:
+                if coding in ('gzip', 'x-gzip'):
+                    body = self._inflate(body, 16 + zlib.MAX_WBITS)
+                elif coding == 'deflate':
+                    # zlib-wrapped as the spec says, or raw as some clients send it
+                    try:
+                        body = self._inflate(body, zlib.MAX_WBITS)
+                    except zlib.error:
+                        body = self._inflate(body, -zlib.MAX_WBITS)
+                elif coding == 'br' and BROTLI_REQUESTS:
+                    body = brotli.Decompressor().process(body, output_buffer_limit=self.max_body + 1)
+                    if len(body) > self.max_body:
+                        raise self._too_large()
+                elif coding != 'identity':
+                    raise UnsupportedMediaType(f'Unsupported Content-Encoding: {coding}')
+            except DECOMPRESS_ERRORS as e:
+                raise BadRequest(f'Malformed {coding} body: {e}')
+        return body
+
+    def decode(self, body, mimetype, content_encoding='', force=False):
+        # Request body to Python objects, raising the HTTP error to send back
+        body = self.decompress(body, content_encoding)
+        if mimetype in MSGPACK_TYPES:
+            if msgpack is None:
+                raise UnsupportedMediaType('MessagePack bodies need the msgpack package')
+            try:
+                return msgpack.unpackb(body, raw=False)
+            except Exception as e:
+                raise BadRequest(f'Malformed MessagePack body: {e}')
+        if not (force or is_json(mimetype)):
+            raise UnsupportedMediaType('Expected application/json or application/msgpack')
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            raise BadRequest(f'Malformed JSON body: {e}')
+
+    def encode(self, body, mimetype, accept='', accept_encoding=''):
+        # Returns (body, headers, vary) for a buffered response
+        headers = {}
+        vary = []
+        if mimetype == 'application/json':
+            vary.append('Accept')
+            if msgpack and parse_header_list(accept) & set(MSGPACK_TYPES):
+                body = msgpack.packb(json.loads(body), use_bin_type=True)
+                mimetype = headers['Content-Type'] = 'application/msgpack'
+        if mimetype not in COMPRESSIBLE_TYPES:
+            return body, headers, vary
+        vary.append('Accept-Encoding')
+        if len(body) < self.min_size:
+            return body, headers, vary
+        accepted = parse_header_list(accept_encoding)
+        if 'br' in accepted and brotli:
+            compressed, encoding = brotli.compress(body, quality=self.brotli_quality), 'br'
+        elif 'gzip' in accepted:
+            compressed, encoding = gzip.compress(body, compresslevel=self.gzip_level, mtime=0), 'gzip'
+        else:
+            return body, headers, vary
+        if len(compressed) < len(body):
+            body = compressed
+            headers['Content-Encoding'] = encoding
+        return body, headers, vary
+
+def make_transport():
+    return Transport(
+        min_size=int(os.getenv('TRANSPORT_MIN_SIZE', '1024')),
+        max_body=int(os.getenv('TRANSPORT_MAX_BODY', str(32 * 1024 * 1024))),
+        gzip_level=int(os.getenv('TRANSPORT_GZIP_LEVEL', '6')),
+        brotli_quality=int(os.getenv('TRANSPORT_BROTLI_QUALITY', '5'))
+    )